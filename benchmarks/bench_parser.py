@@ -0,0 +1,111 @@
+"""
+Micro-benchmark for MetadataParser.extract_metadata.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_parser [--count 100000] [--baseline REV]
+    python -m benchmarks.bench_parser --pool [--workers N] [--start-method spawn]
+
+--baseline loads core/parser.py as it was at a git revision and times it on
+the same corpus, to show the per-file cost before and after a change.
+
+--pool times extract_many in-process against a process pool over growing
+batches, plus the pool's start-up on its own, to calibrate
+core.parser.PARALLEL_MIN_BATCH and PARALLEL_MIN_BATCH_SPAWN.
+"""
+import argparse
+import contextlib
+import io
+import multiprocessing
+import os
+import subprocess
+import time
+import types
+
+from benchmarks.corpus import generate_filenames
+from core import parser as parser_module
+from core.parser import MetadataParser
+
+# Batch sizes timed by --pool
+POOL_COUNTS = (2000, 10000, 40000, 100000, 200000)
+
+PARSER_KWARGS = dict(id_min_len=10, id_max_len=10, standard_project_name="会计作业")
+
+
+def load_parser_at(rev: str):
+    """Returns the MetadataParser class from core/parser.py at a git revision"""
+    source = subprocess.run(
+        ["git", "show", f"{rev}:core/parser.py"],
+        check=True, capture_output=True, text=True
+    ).stdout
+    module = types.ModuleType(f"parser_{rev}")
+    exec(compile(source, f"{rev}:core/parser.py", "exec"), module.__dict__)
+    return module.MetadataParser
+
+
+def time_parser(parser_cls, paths, repeat: int = 3) -> float:
+    """Best-of-repeat time per file, in microseconds"""
+    parser = parser_cls(**PARSER_KWARGS)
+    best = float("inf")
+    # Older parsers print diagnostics; keep them out of the terminal
+    with contextlib.redirect_stdout(io.StringIO()):
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for path in paths:
+                parser.extract_metadata(path)
+            best = min(best, time.perf_counter() - start)
+    return best / len(paths) * 1e6
+
+
+def time_pool(counts, workers: int):
+    """Prints in-process vs process pool extract_many times per batch size, and the pool's start-up"""
+    thresholds = parser_module.PARALLEL_MIN_BATCH, parser_module.PARALLEL_MIN_BATCH_SPAWN
+    # Let extract_many use the pool at every size
+    parser_module.PARALLEL_MIN_BATCH = parser_module.PARALLEL_MIN_BATCH_SPAWN = 0
+    try:
+        # Start-up: a pool that parses one file per worker
+        start = time.perf_counter()
+        MetadataParser(**PARSER_KWARGS).extract_many(["/submissions/x.pdf"] * workers, workers=workers, chunk_size=1)
+        print(f"pool start-up ({multiprocessing.get_start_method()}, {workers} workers): "
+              f"{(time.perf_counter() - start) * 1000:.0f} ms")
+        for count in counts:
+            paths = ["/submissions/" + name for name in generate_filenames(count)]
+            start = time.perf_counter()
+            MetadataParser(**PARSER_KWARGS).extract_many(paths, workers=1)
+            serial = time.perf_counter() - start
+            start = time.perf_counter()
+            MetadataParser(**PARSER_KWARGS).extract_many(paths, workers=workers)
+            pooled = time.perf_counter() - start
+            print(f"{count:8d} files: in-process {serial * 1000:7.0f} ms, pool {pooled * 1000:7.0f} ms "
+                  f"({serial / pooled:.2f}x)")
+    finally:
+        parser_module.PARALLEL_MIN_BATCH, parser_module.PARALLEL_MIN_BATCH_SPAWN = thresholds
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--count", type=int, default=100000, help="number of synthetic filenames")
+    ap.add_argument("--repeat", type=int, default=3)
+    ap.add_argument("--baseline", metavar="REV", help="also time core/parser.py at this git revision")
+    ap.add_argument("--pool", action="store_true", help="time extract_many with and without a process pool")
+    ap.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="pool size for --pool")
+    ap.add_argument("--start-method", choices=multiprocessing.get_all_start_methods(),
+                    help="process start method for --pool (default: the platform's)")
+    args = ap.parse_args()
+
+    if args.pool:
+        if args.start_method:
+            multiprocessing.set_start_method(args.start_method)
+        time_pool(POOL_COUNTS, args.workers)
+        return
+
+    paths = ["/submissions/" + name for name in generate_filenames(args.count)]
+
+    current = time_parser(MetadataParser, paths, args.repeat)
+    print(f"current:  {current:8.2f} us/file")
+    if args.baseline:
+        before = time_parser(load_parser_at(args.baseline), paths, args.repeat)
+        print(f"{args.baseline}: {before:8.2f} us/file  ({before / current:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+Startup-time benchmark for the GUI.
+
+Usage (from the repository root):
+    python -m benchmarks.bench_startup [--runs 7] [--offscreen] [--json] [--baseline REV]
+
+Each run starts a fresh interpreter that imports ui.app, builds MainWindow and
+shows it, and reports (all in milliseconds):
+
+    qt_import     importing PyQt6.QtWidgets
+    app_import    importing ui.app on top of that (core modules included)
+    window        MainWindow()
+    first_paint   process start -> first paint event of the window
+    ready         process start -> work deferred past the first paint is done
+
+The median of the runs is printed; --json prints it as one JSON object so the
+numbers can be tracked across releases. --baseline exports the tree at a git
+revision (git archive) and measures it the same way.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+METRICS = ["qt_import", "app_import", "window", "first_paint", "ready"]
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _child(root: str, spawned: float):
+    """Runs in the measured interpreter; prints one JSON line with the timings"""
+    sys.path.insert(0, root)
+    start = time.perf_counter()
+    from PyQt6.QtCore import QEvent, QObject, QTimer
+    from PyQt6.QtWidgets import QApplication
+    qt_imported = time.perf_counter()
+    import ui.app
+    app_imported = time.perf_counter()
+
+    app = QApplication(sys.argv[:1])
+    built = time.perf_counter()
+    window = ui.app.MainWindow()
+    window_built = time.perf_counter()
+
+    marks = {}
+
+    class PaintWatcher(QObject):
+        def eventFilter(self, obj, event):
+            if event.type() == QEvent.Type.Paint and "paint" not in marks:
+                marks["paint"] = time.time()
+                # Older trees have no startup_done: "ready" is then the next loop iteration
+                if getattr(window, "startup_done", True):
+                    QTimer.singleShot(0, lambda: marks.setdefault("ready", time.time()))
+            return False
+
+    watcher = PaintWatcher()
+    window.installEventFilter(watcher)
+    window.show()
+    deadline = time.time() + 30
+    while "ready" not in marks and time.time() < deadline:
+        app.processEvents()
+        if "paint" in marks and "queued" not in marks and getattr(window, "startup_done", False):
+            # Queued behind the window's own finish_startup
+            marks["queued"] = True
+            QTimer.singleShot(0, lambda: marks.setdefault("ready", time.time()))
+
+    print(json.dumps({
+        "qt_import": (qt_imported - start) * 1e3,
+        "app_import": (app_imported - qt_imported) * 1e3,
+        "window": (window_built - built) * 1e3,
+        "first_paint": (marks.get("paint", float("nan")) - spawned) * 1e3,
+        "ready": (marks.get("ready", float("nan")) - spawned) * 1e3,
+    }))
+
+
+def measure(root: str, runs: int, offscreen: bool) -> dict:
+    """Median of each metric over runs fresh interpreters (after one warm-up run)"""
+    env = dict(os.environ)
+    # Measure with cached bytecode, as installed copies run: the warm-up run writes it
+    env.pop("PYTHONDONTWRITEBYTECODE", None)
+    if offscreen:
+        env["QT_QPA_PLATFORM"] = "offscreen"
+    samples = {m: [] for m in METRICS}
+    for i in range(runs + 1):
+        spawned = time.time()
+        out = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--child", root, str(spawned)],
+            check=True, capture_output=True, text=True, env=env
+        ).stdout
+        if i == 0:
+            continue # Warm-up: writes __pycache__, fills the OS file cache
+        result = json.loads(out.strip().splitlines()[-1])
+        for m in METRICS:
+            samples[m].append(result[m])
+    return {m: statistics.median(values) for m, values in samples.items()}
+
+
+def export_tree(rev: str, dest: str):
+    """Extracts the repository at a git revision into dest"""
+    archive = subprocess.run(["git", "archive", rev], check=True, capture_output=True, cwd=REPO_ROOT).stdout
+    subprocess.run(["tar", "-x", "-C", dest], input=archive, check=True)
+
+
+def main():
+    if len(sys.argv) == 4 and sys.argv[1] == "--child":
+        _child(sys.argv[2], float(sys.argv[3]))
+        return
+
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--runs", type=int, default=7, help="measured runs (median is reported)")
+    ap.add_argument("--offscreen", action="store_true", help="use the offscreen Qt platform (no display needed)")
+    ap.add_argument("--json", action="store_true", help="print the medians as JSON")
+    ap.add_argument("--baseline", metavar="REV", help="also measure the tree at this git revision")
+    args = ap.parse_args()
+
+    results = {"current": measure(REPO_ROOT, args.runs, args.offscreen)}
+    if args.baseline:
+        with tempfile.TemporaryDirectory() as tmp:
+            export_tree(args.baseline, tmp)
+            results[args.baseline] = measure(tmp, args.runs, args.offscreen)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'':12}" + "".join(f"{m:>13}" for m in METRICS))
+    for name, medians in results.items():
+        print(f"{name:12}" + "".join(f"{medians[m]:10.1f} ms" for m in METRICS))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Synthetic filename corpora that look like real homework submissions:
+mixed Chinese/English names, student IDs, project names, class names,
+"副本"/"Copy" artifacts and inconsistent separators.
+"""
+import os
+import random
+from typing import List
+
+SURNAMES = "张王李赵刘陈杨黄周吴徐孙胡朱高林何郭马罗"
+GIVEN_NAMES = ["三", "四", "五", "六", "伟", "芳", "娜", "敏", "静", "小明", "晓红", "子涵", "浩然", "欣怡"]
+ENGLISH_NAMES = ["Wang Wu", "Li Lei", "Han Meimei", "Tom Smith", "Alice", "Zhang San", "Chen Jing"]
+PROJECTS = ["会计作业", "项目管理", "财务报表分析", "Accounting Assignment", "Project Report"]
+NOISE = ["样本", "副本", "练习", "大综合", "Copy (2)", "Stage3", "final", "v2"]
+CLASSES = ["一班", "3班", "Class 2", "十二班"]
+SEPARATORS = ["-", "_", " ", "", "——", "+"]
+EXTENSIONS = [".docx", ".pdf", ".xlsx", ".pptx", ".zip"]
+
+
+def generate_filenames(count: int, seed: int = 0, id_len: int = 10) -> List[str]:
+    """
+    Generates count synthetic filenames (with extension). Deterministic for a given seed.
+    """
+    rng = random.Random(seed)
+    base_id = 10 ** (id_len - 1)
+    filenames = []
+    for i in range(count):
+        parts = []
+        if rng.random() < 0.85:
+            parts.append(str(base_id + rng.randrange(base_id)))
+        if rng.random() < 0.75:
+            parts.append(rng.choice(SURNAMES) + rng.choice(GIVEN_NAMES))
+        else:
+            parts.append(rng.choice(ENGLISH_NAMES))
+        parts.append(rng.choice(PROJECTS))
+        if rng.random() < 0.4:
+            parts.append(rng.choice(NOISE))
+        if rng.random() < 0.15:
+            parts.append(rng.choice(CLASSES))
+        rng.shuffle(parts)
+        filenames.append(rng.choice(SEPARATORS).join(parts) + rng.choice(EXTENSIONS))
+    return filenames
+
+
+def materialize_corpus(root: str, count: int, seed: int = 0, files_per_dir: int = 1000) -> List[str]:
+    """
+    Creates count empty files named like generate_filenames under root, spread
+    over subdirectories of files_per_dir files (like one folder per class).
+    Repeated names within a directory get a " (n)" suffix.
+
+    Returns:
+        The created paths.
+    """
+    paths = []
+    names = generate_filenames(count, seed)
+    for d, start in enumerate(range(0, count, files_per_dir)):
+        directory = os.path.join(root, f"class_{d:04d}")
+        os.makedirs(directory, exist_ok=True)
+        seen = set()
+        for name in names[start:start + files_per_dir]:
+            stem, ext = os.path.splitext(name)
+            n = 2
+            while name in seen:
+                name = f"{stem} ({n}){ext}"
+                n += 1
+            seen.add(name)
+            path = os.path.join(directory, name)
+            open(path, "w").close()
+            paths.append(path)
+    return paths
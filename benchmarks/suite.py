@@ -0,0 +1,158 @@
+"""
+Benchmark suite for the scanner, parser, detectors and renamer.
+
+Usage (from the repository root):
+    python -m benchmarks.suite [--sizes 1k,10k,100k] [--output results.json] [--compare old.json]
+
+For each size a synthetic corpus of empty files is created on tmpfs
+(/dev/shm when available, so disk speed does not enter the numbers) and
+each stage of a preview + rename is timed:
+
+    scan_directory    walking the tree (generator, paths only)
+    snapshot          DirectorySnapshot (walk + stat, what the GUI uses)
+    token_index       TokenIndex build + stats() + id_length()
+    extract_metadata  MetadataParser.extract_metadata, in-process
+    extract_many      MetadataParser.extract_many (process pool for large batches)
+    generate_new_name MetadataParser.generate_new_name
+    plan_renames      conflict/cycle planning of the batch
+    rename            execute_plan with a journal, on tmpfs
+    undo              RenameJournal.undo_batch of that rename
+
+CPU-bound stages report the best of --repeat runs. Results are written as
+JSON (with the git commit) so two runs can be compared with --compare.
+1m is supported but takes several minutes and a few GB of RAM.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.corpus import materialize_corpus
+from core.detect import TokenIndex
+from core.journal import RenameJournal
+from core.parser import MetadataParser
+from core.planner import plan_renames, execute_plan
+from core.scanner import DirectorySnapshot, scan_directory
+
+SIZES = {"1k": 1000, "10k": 10000, "100k": 100000, "1m": 1000000}
+FORMAT = "{student_id}-{name}-{project}"
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _best_of(repeat: int, fn) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def _timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def run_size(count: int, repeat: int, workdir: str) -> dict:
+    """Times every stage on a fresh corpus of count files; returns {stage: seconds}"""
+    root = tempfile.mkdtemp(prefix="corpus-", dir=workdir)
+    try:
+        paths = materialize_corpus(root, count)
+        times = {}
+        times["scan_directory"] = _best_of(repeat, lambda: sum(1 for _ in scan_directory(root)))
+        snapshot, times["snapshot"] = _timed(lambda: DirectorySnapshot(root))
+
+        def detect():
+            index = TokenIndex(snapshot)
+            return index, index.stats(), index.id_length()
+        (_, stats, id_length), times["token_index"] = _timed(detect)
+
+        parser = MetadataParser(
+            id_min_len=id_length.min_len,
+            id_max_len=id_length.max_len,
+            standard_project_name=stats.project,
+            excluded_tokens=stats.common_tokens
+        )
+        files = snapshot.paths
+        times["extract_metadata"] = _best_of(repeat, lambda: [parser.extract_metadata(p) for p in files])
+        metas, times["extract_many"] = _timed(lambda: parser.extract_many(files))
+        new_names = []
+        times["generate_new_name"] = _best_of(
+            repeat, lambda: new_names.__setitem__(slice(None), [parser.generate_new_name(m, FORMAT) for m in metas]))
+
+        plan, times["plan_renames"] = _timed(lambda: plan_renames(list(zip(files, new_names))))
+        journal = RenameJournal(os.path.join(root, "journal.jsonl"))
+        _, times["rename"] = _timed(lambda: execute_plan(plan, journal=journal, description=root))
+        batch = journal.undoable_batches()[0]
+        _, times["undo"] = _timed(lambda: journal.undo_batch(batch))
+        return times
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+def _metadata() -> dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT,
+                                capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def print_results(results: dict, baseline: dict = None):
+    for size, times in results["sizes"].items():
+        count = SIZES[size]
+        print(f"\n{size} files")
+        for stage, seconds in times.items():
+            line = f"  {stage:18} {seconds * 1e3:10.1f} ms {seconds / count * 1e6:9.2f} us/file"
+            before = (baseline or {}).get("sizes", {}).get(size, {}).get(stage)
+            if before:
+                line += f"   was {before * 1e3:10.1f} ms ({before / seconds:.2f}x)"
+            print(line)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--sizes", default="1k,10k,100k", help=f"comma-separated, from {', '.join(SIZES)}")
+    ap.add_argument("--repeat", type=int, default=3, help="runs per CPU-bound stage (best is kept)")
+    ap.add_argument("--output", metavar="FILE", help="write the results as JSON")
+    ap.add_argument("--compare", metavar="FILE", help="JSON results of an earlier run to compare with")
+    ap.add_argument("--workdir", help="where to create the corpora (default: /dev/shm, else the temp dir)")
+    args = ap.parse_args()
+
+    sizes = [s.strip().lower() for s in args.sizes.split(",") if s.strip()]
+    unknown = [s for s in sizes if s not in SIZES]
+    if unknown:
+        ap.error(f"unknown size(s): {', '.join(unknown)}")
+    workdir = args.workdir or ("/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir())
+
+    results = {"meta": _metadata(), "workdir": workdir, "sizes": {}}
+    for size in sizes:
+        print(f"[BENCH] {size} files in {workdir} ...", file=sys.stderr)
+        results["sizes"][size] = run_size(SIZES[size], args.repeat, workdir)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+    print_results(results, baseline)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,9 @@
+import multiprocessing
+import sys
+
+from core.cli import main
+
+if __name__ == "__main__":
+    # Needed for the parser's process pool in frozen (PyInstaller) builds
+    multiprocessing.freeze_support()
+    sys.exit(main())
@@ -0,0 +1,330 @@
+"""
+Files inside .zip archives, scanned and renamed without extracting them.
+
+A member is seen as a virtual file below its archive: "作业.zip/2021001张三.pdf"
+(joined with os.sep), so the parser and the planner handle it like any
+other path. Listing an archive only reads its central directory.
+
+Renaming rewrites the archive once for all its members: each member's
+compressed bytes are copied as they are under the new name (no
+decompression, no recompression), COPY_CHUNK bytes at a time, into a
+temporary file that then replaces the archive. Memory use does not depend
+on the size of the archive or of its members. zipfile only reads the
+archive; the headers of the new one are written here, so nothing relies on
+zipfile's private writing internals.
+"""
+import logging
+import os
+import shutil
+import struct
+import time
+import zipfile
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from core.scanner import FileEntry
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_EXTENSION = ".zip"
+# Bytes copied at a time when rewriting an archive
+COPY_CHUNK = 1024 * 1024
+
+# Zip format details zipfile does not export (APPNOTE.TXT 4.3)
+_FLAG_ENCRYPTED = 0x01
+_FLAG_DATA_DESCRIPTOR = 0x08 # Sizes and CRC follow the data instead of the local header
+_FLAG_UTF8 = 0x800
+_LOCAL_HEADER = struct.Struct("<4s2B4HL2L2H")
+_LOCAL_HEADER_SIGNATURE = b"PK\003\004"
+_CENTRAL_HEADER = struct.Struct("<4s4B4HL2L5H2L")
+_CENTRAL_HEADER_SIGNATURE = b"PK\001\002"
+_END_RECORD = struct.Struct("<4s4H2LH")
+_END_RECORD_SIGNATURE = b"PK\005\006"
+_ZIP64_END_RECORD = struct.Struct("<4sQ2H2L4Q")
+_ZIP64_END_RECORD_SIGNATURE = b"PK\006\006"
+_ZIP64_LOCATOR = struct.Struct("<4sLQL")
+_ZIP64_LOCATOR_SIGNATURE = b"PK\006\007"
+_DATA_DESCRIPTOR_SIGNATURE = 0x08074b50
+_ZIP64_EXTRA = 0x0001
+_ZIP64_VERSION = 45 # "Version needed to extract" for ZIP64 records
+_MAX_16 = 0xFFFF
+_MAX_32 = 0xFFFFFFFF # Also the placeholder for a value stored in a ZIP64 field
+# Counts and sizes/offsets from which the ZIP64 records are used
+_ZIP64_COUNT_LIMIT = _MAX_16
+_ZIP64_LIMIT = _MAX_32
+
+
+def is_archive(name: str) -> bool:
+    return name.lower().endswith(ARCHIVE_EXTENSION)
+
+
+def member_name(info: zipfile.ZipInfo) -> str:
+    """
+    The member's name. Archives made on Chinese Windows store GBK names
+    without the UTF-8 flag, which zipfile decodes as cp437; those are
+    decoded again (UTF-8 first, then GBK).
+    """
+    name = info.filename
+    if info.flag_bits & _FLAG_UTF8 or name.isascii():
+        return name
+    raw = name.encode("cp437")
+    for encoding in ("utf-8", "gbk"):
+        try:
+            return raw.decode(encoding)
+        except UnicodeDecodeError:
+            pass
+    return name
+
+
+def member_path(archive: str, name: str) -> str:
+    """Virtual path of member name ("/"-separated) of archive"""
+    return os.path.join(archive, *name.split("/"))
+
+
+def split_member_path(path: str) -> Optional[Tuple[str, str]]:
+    """(archive path, member name) if path is a virtual path inside an archive, else None"""
+    lowered = path.lower()
+    marker = ARCHIVE_EXTENSION + os.sep
+    i = lowered.find(marker)
+    while i != -1:
+        archive = path[:i + len(ARCHIVE_EXTENSION)]
+        if os.path.isfile(archive):
+            return archive, path[i + len(marker):].replace(os.sep, "/")
+        i = lowered.find(marker, i + 1)
+    return None
+
+
+def list_members(archive: str, ignore_hidden: bool = True) -> List[FileEntry]:
+    """
+    The files in archive as FileEntry records (archive set, inode 0, mtime
+    from the member's timestamp), in archive order. Directory members,
+    and with ignore_hidden the "__MACOSX/" resource forks and dot files,
+    are left out.
+
+    Raises:
+        OSError if the archive cannot be read, zipfile.BadZipFile if it is
+        not a zip archive.
+    """
+    entries = []
+    with zipfile.ZipFile(archive) as zf:
+        for info in zf.infolist():
+            if info.is_dir():
+                continue
+            name = member_name(info)
+            if ignore_hidden and any(part.startswith(".") or part == "__MACOSX" for part in name.split("/")):
+                continue
+            path = member_path(archive, name)
+            stem, extension = os.path.splitext(os.path.basename(path))
+            try:
+                mtime = time.mktime(info.date_time + (0, 0, -1))
+            except (OverflowError, ValueError):
+                mtime = 0.0
+            entries.append(FileEntry(path, os.path.dirname(path), os.path.basename(path), stem, extension,
+                                     0, info.file_size, mtime, archive=archive))
+    return entries
+
+
+def listdir(directory: str) -> List[str]:
+    """os.listdir, also for virtual directories inside an archive (for plan_renames)"""
+    try:
+        return os.listdir(directory)
+    except OSError:
+        split = split_member_path(directory + os.sep)
+        if split is None:
+            raise
+    archive, prefix = split
+    names = set()
+    with zipfile.ZipFile(archive) as zf:
+        for info in zf.infolist():
+            name = member_name(info)
+            if name.startswith(prefix) and len(name) > len(prefix):
+                names.add(name[len(prefix):].split("/", 1)[0]) # A file, or a folder on the way to one
+    return list(names)
+
+
+def _strip_zip64(extra: bytes) -> bytes:
+    """extra without its ZIP64 field: _copy_member writes a fresh one when needed"""
+    out = []
+    i = 0
+    while i + 4 <= len(extra):
+        field_id, size = struct.unpack_from("<HH", extra, i)
+        if field_id != _ZIP64_EXTRA:
+            out.append(extra[i:i + 4 + size])
+        i += 4 + size
+    return b"".join(out)
+
+
+def _copy_bytes(src, dst, count: int):
+    while count > 0:
+        chunk = src.read(min(COPY_CHUNK, count))
+        if not chunk:
+            raise zipfile.BadZipFile("Truncated member data")
+        dst.write(chunk)
+        count -= len(chunk)
+
+
+def _dos_time(date_time: Tuple[int, ...]) -> Tuple[int, int]:
+    """(time, date) fields of a header"""
+    year, month, day, hour, minute, second = date_time[:6]
+    return (hour << 11) | (minute << 5) | (second // 2), ((year - 1980) << 9) | (month << 5) | day
+
+
+def _encoded_name(info: zipfile.ZipInfo, name: str) -> Tuple[bytes, int]:
+    """(stored name bytes, flag bits) for info stored as name"""
+    flags = info.flag_bits & ~_FLAG_UTF8
+    if name == info.filename:
+        # Unchanged: the bytes as stored, whatever their encoding (zipfile decoded them as cp437)
+        if info.flag_bits & _FLAG_UTF8:
+            return name.encode("utf-8"), flags | _FLAG_UTF8
+        return name.encode("cp437"), flags
+    if name.isascii():
+        return name.encode("ascii"), flags
+    return name.encode("utf-8"), flags | _FLAG_UTF8
+
+
+def _copy_member(info: zipfile.ZipInfo, name: str, src, out) -> bytes:
+    """
+    Writes info's local header under name and copies its compressed bytes
+    from src. Returns its central directory record.
+    """
+    # Where the member's compressed bytes start in the source
+    src.seek(info.header_offset)
+    header = _LOCAL_HEADER.unpack(src.read(_LOCAL_HEADER.size))
+    if header[0] != _LOCAL_HEADER_SIGNATURE:
+        raise zipfile.BadZipFile(f"Bad local header for {info.filename}")
+    src.seek(header[10] + header[11], os.SEEK_CUR)
+
+    raw_name, flags = _encoded_name(info, name)
+    extra = _strip_zip64(info.extra)
+    offset = out.tell()
+    # Sizes and CRC are known, so they go in the local header. Encrypted
+    # members keep their data descriptor: their password check may use it.
+    keep_descriptor = bool(flags & _FLAG_ENCRYPTED and flags & _FLAG_DATA_DESCRIPTOR)
+    if not keep_descriptor:
+        flags &= ~_FLAG_DATA_DESCRIPTOR
+    dos_time, dos_date = _dos_time(info.date_time)
+
+    zip64 = info.file_size >= _ZIP64_LIMIT or info.compress_size >= _ZIP64_LIMIT
+    crc, compress_size, file_size = (0, 0, 0) if keep_descriptor else (info.CRC, info.compress_size, info.file_size)
+    local_extra = extra
+    if zip64:
+        local_extra = struct.pack("<2H2Q", _ZIP64_EXTRA, 16, file_size, compress_size) + extra
+        compress_size = file_size = _MAX_32
+    extract_version = max(info.extract_version, _ZIP64_VERSION) if zip64 else info.extract_version
+    out.write(_LOCAL_HEADER.pack(_LOCAL_HEADER_SIGNATURE, extract_version, info.reserved, flags,
+                                 info.compress_type, dos_time, dos_date, crc, compress_size, file_size,
+                                 len(raw_name), len(local_extra)))
+    out.write(raw_name)
+    out.write(local_extra)
+    _copy_bytes(src, out, info.compress_size)
+    if keep_descriptor:
+        out.write(struct.pack("<2L2Q" if zip64 else "<4L", _DATA_DESCRIPTOR_SIGNATURE,
+                              info.CRC, info.compress_size, info.file_size))
+
+    # Central directory record: values that do not fit in 32 bits go into a ZIP64 field
+    fields = []
+    compress_size, file_size = info.compress_size, info.file_size
+    if file_size >= _ZIP64_LIMIT:
+        fields.append(file_size)
+        file_size = _MAX_32
+    if compress_size >= _ZIP64_LIMIT:
+        fields.append(compress_size)
+        compress_size = _MAX_32
+    if offset >= _ZIP64_LIMIT:
+        fields.append(offset)
+        offset = _MAX_32
+    if fields:
+        extra = struct.pack(f"<2H{len(fields)}Q", _ZIP64_EXTRA, 8 * len(fields), *fields) + extra
+        extract_version = max(extract_version, _ZIP64_VERSION)
+    create_version = max(info.create_version, _ZIP64_VERSION) if fields else info.create_version
+    return _CENTRAL_HEADER.pack(
+        _CENTRAL_HEADER_SIGNATURE, create_version, info.create_system, extract_version, info.reserved,
+        flags, info.compress_type, dos_time, dos_date, info.CRC, compress_size, file_size,
+        len(raw_name), len(extra), len(info.comment), 0, info.internal_attr, info.external_attr, offset
+    ) + raw_name + extra + info.comment
+
+
+def _write_end_records(out, count: int, directory_start: int, comment: bytes):
+    """Writes the end of central directory record, after a ZIP64 one if the values need it"""
+    directory_size = out.tell() - directory_start
+    if count >= _ZIP64_COUNT_LIMIT or directory_start >= _ZIP64_LIMIT or directory_size >= _ZIP64_LIMIT:
+        zip64_start = out.tell()
+        out.write(_ZIP64_END_RECORD.pack(_ZIP64_END_RECORD_SIGNATURE, _ZIP64_END_RECORD.size - 12,
+                                         _ZIP64_VERSION, _ZIP64_VERSION, 0, 0, count, count,
+                                         directory_size, directory_start))
+        out.write(_ZIP64_LOCATOR.pack(_ZIP64_LOCATOR_SIGNATURE, 0, zip64_start, 1))
+        count = min(count, _MAX_16)
+        directory_size = min(directory_size, _MAX_32)
+        directory_start = min(directory_start, _MAX_32)
+    out.write(_END_RECORD.pack(_END_RECORD_SIGNATURE, 0, 0, count, count,
+                               directory_size, directory_start, len(comment)))
+    out.write(comment)
+
+
+def member_checks(archive: str) -> Dict[str, Tuple[int, int]]:
+    """
+    {member name: (CRC, size)} of archive: what tells a member's content
+    apart after a rename, as the inode does on disk (see RenameJournal).
+
+    Raises:
+        OSError, zipfile.BadZipFile as list_members.
+    """
+    with zipfile.ZipFile(archive) as zf:
+        return {member_name(info): (info.CRC, info.file_size) for info in zf.infolist()}
+
+
+def rename_members(archive: str, renames: Dict[str, str]) -> bool:
+    """
+    Renames members of archive in one rewrite.
+
+    The headers and the central directory are written here with the
+    layouts above; zipfile only reads the source's central directory.
+
+    Args:
+        renames: {member name (as from member_name): new file name}. The
+            member stays in its folder inside the archive.
+
+    Returns:
+        True if the archive was rewritten, False if it could not be (it is
+        then left untouched).
+    """
+    directory = os.path.dirname(archive)
+    temp = os.path.join(directory, f".~{os.path.basename(archive)}.tmp")
+    try:
+        with zipfile.ZipFile(archive) as zin, open(archive, "rb") as src, open(temp, "wb") as out:
+            records = []
+            for info in zin.infolist():
+                name = info.filename
+                current = member_name(info)
+                if current in renames:
+                    folder = current.rpartition("/")[0]
+                    name = f"{folder}/{renames[current]}" if folder else renames[current]
+                records.append(_copy_member(info, name, src, out))
+            directory_start = out.tell()
+            for record in records:
+                out.write(record)
+            _write_end_records(out, len(records), directory_start, zin.comment)
+            out.flush()
+            os.fsync(out.fileno())
+        shutil.copymode(archive, temp)
+        os.replace(temp, archive)
+        return True
+    except (OSError, zipfile.BadZipFile, struct.error) as e:
+        logger.warning("Cannot rewrite archive %s: %s", archive, e)
+        try:
+            os.remove(temp)
+        except OSError:
+            pass
+        return False
+
+
+def group_members(paths: Sequence[str]) -> Dict[str, List[Tuple[int, str]]]:
+    """{archive: [(index in paths, member name)]} for the paths inside archives"""
+    marker = ARCHIVE_EXTENSION + os.sep
+    archives: Dict[str, List[Tuple[int, str]]] = {}
+    for i, path in enumerate(paths):
+        if marker not in path.lower():
+            continue # Fast path: not below anything named *.zip
+        split = split_member_path(path)
+        if split is not None:
+            archives.setdefault(split[0], []).append((i, split[1]))
+    return archives
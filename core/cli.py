@@ -0,0 +1,233 @@
+"""
+Headless batch mode: the same rename pipeline as the GUI, without Qt.
+
+    python -m core FOLDER [--project NAME] [--dry-run] [--format json|csv] ...
+
+Only the standard library and the core package are imported, so this runs on
+servers without a display and in cron jobs.
+"""
+import argparse
+import contextlib
+import csv
+import json
+import logging
+import os
+import sys
+import time
+from typing import List, Optional
+
+from core.scanner import DirectorySnapshot
+from core.parser import MetadataParser
+from core.planner import (plan_renames, execute_plan, CONFLICT_COUNTER, CONFLICT_SKIP,
+                          PLAN_RENAME, PLAN_UNCHANGED, PLAN_SKIPPED)
+from core.journal import RenameJournal, DEFAULT_JOURNAL_PATH
+from core.detect import TokenIndex
+from core.duplicates import find_duplicates
+from core.roster import Roster
+from core.metrics import METRICS
+from core.logs import setup_logging
+from core.options import (NAMING_PATTERNS, CLASS_POSITIONS, parse_id_range, parse_ignored_words, build_format,
+                          build_scan_filter)
+
+logger = logging.getLogger(__name__)
+
+# --separator values; the words are easier to pass through a shell than " " and ""
+SEPARATORS = {"-": "-", "_": "_", "space": " ", "none": ""}
+
+REPORT_FIELDS = ["path", "new_name", "status", "student_id", "name", "project", "class_name"]
+
+# Report status per file
+STATUS_PLANNED = "rename"
+STATUS_UNCHANGED = "unchanged"
+STATUS_SKIPPED = "skipped" # Name conflict under --conflict skip
+STATUS_DONE = "done"
+STATUS_ERROR = "error"
+STATUS_DUPLICATE = "duplicate" # Same content as a newer file (--duplicates), not renamed
+
+
+def build_arg_parser() -> argparse.ArgumentParser:
+    ap = argparse.ArgumentParser(
+        prog="python -m core",
+        description="Batch-rename student files (headless version of the GUI)."
+    )
+    ap.add_argument("folder", help="folder to scan (recursively)")
+    ap.add_argument("--include", metavar="PATTERNS", action="append", default=[],
+                    help='only files matching these globs or extensions, e.g. "*.pdf" or ".docx" (repeatable)')
+    ap.add_argument("--exclude", metavar="PATTERNS", action="append", default=[],
+                    help='skip files and folders matching these globs or extensions, e.g. "__MACOSX .zip" (repeatable)')
+    ap.add_argument("--max-depth", type=int, metavar="N",
+                    help="only descend N folder levels (0: files directly in FOLDER)")
+    ap.add_argument("--archives", action="store_true",
+                    help="rename the files inside .zip archives too (the archives are rewritten, not extracted)")
+    ap.add_argument("--id-length", metavar="N[-M]",
+                    help='student ID length or range, e.g. "10" or "8-12" (default: detected)')
+    ap.add_argument("--project", metavar="NAME", help="standard project name (default: most common token)")
+    ap.add_argument("--class-name", metavar="TEXT", default="", help="custom text, e.g. a class name")
+    ap.add_argument("--class-position", choices=CLASS_POSITIONS, default="none",
+                    help="where the custom text goes in the new name (default: none)")
+    ap.add_argument("--separator", choices=list(SEPARATORS), default="-", help="separator (default: -)")
+    ap.add_argument("--pattern", choices=list(NAMING_PATTERNS), default="id-name-project",
+                    help="naming pattern (default: id-name-project)")
+    ap.add_argument("--ignore", metavar="WORDS", action="append", default=[],
+                    help="ignored words, separated by spaces or commas (repeatable)")
+    ap.add_argument("--roster", metavar="CSV",
+                    help="class roster (ID, name[, class, aliases]) used to resolve names and IDs")
+    ap.add_argument("--duplicates", action="store_true",
+                    help="leave files whose content duplicates a newer file alone (reported with duplicate_of)")
+    ap.add_argument("--conflict", choices=[CONFLICT_COUNTER, CONFLICT_SKIP], default=CONFLICT_COUNTER,
+                    help='duplicate new names: add " (2)" or skip the file (default: counter)')
+    ap.add_argument("--dry-run", action="store_true", help="only report the planned names, rename nothing")
+    ap.add_argument("--format", choices=["json", "csv"], default="json", help="report format (default: json)")
+    ap.add_argument("--output", metavar="FILE", help="write the report to FILE instead of stdout")
+    ap.add_argument("--workers", type=int, metavar="N", help="parser processes (default: CPU count)")
+    ap.add_argument("--journal", metavar="FILE", default=DEFAULT_JOURNAL_PATH,
+                    help="undo journal shared with the GUI (default: %(default)s)")
+    ap.add_argument("--metrics", metavar="FILE",
+                    help='write per-stage timings and counters as JSON to FILE ("-" for stderr)')
+    verbosity = ap.add_mutually_exclusive_group()
+    verbosity.add_argument("-v", "--verbose", action="store_true", help="log per-file parser decisions too")
+    verbosity.add_argument("-q", "--quiet", action="store_true", help="log only warnings and errors")
+    return ap
+
+
+@contextlib.contextmanager
+def _report_stream(output: Optional[str]):
+    """
+    Yields the stream the report is written to: FILE, or stdout as UTF-8.
+    Diagnostics are logged to stderr, so a report on stdout stays machine-readable.
+    """
+    if output:
+        with open(output, "w", encoding="utf-8", newline="") as f:
+            yield f
+        return
+
+    sys.stdout.flush()
+    with open(sys.stdout.fileno(), "w", encoding="utf-8", newline="", closefd=False) as f:
+        yield f
+
+
+def _write_report(rows: List[dict], fmt: str, stream, fields: List[str] = REPORT_FIELDS):
+    if fmt == "csv":
+        writer = csv.DictWriter(stream, fieldnames=fields)
+        writer.writeheader()
+        writer.writerows(rows)
+    else:
+        json.dump(rows, stream, ensure_ascii=False, indent=2)
+        stream.write("\n")
+
+
+def run(args: argparse.Namespace, stream) -> int:
+    """Scans, parses, plans and (unless --dry-run) renames; returns the exit code"""
+    root = os.path.abspath(args.folder)
+    if not os.path.isdir(root):
+        logger.error("Not a folder: %s", root)
+        return 2
+
+    roster = None
+    if args.roster:
+        try:
+            roster = Roster.load(args.roster)
+        except (OSError, ValueError) as e:
+            logger.error("Cannot load roster %s: %s", args.roster, e)
+            return 2
+        logger.info("Roster: %d students", len(roster))
+
+    scan_filter = build_scan_filter(" ".join(args.include), " ".join(args.exclude), args.max_depth)
+    snapshot = DirectorySnapshot(root, scan_filter=scan_filter, archives=args.archives)
+    token_index = TokenIndex(snapshot)
+    id_length = args.id_length or token_index.id_length().text
+    min_len, max_len = parse_id_range(id_length)
+
+    ignored_words = parse_ignored_words(" ".join(args.ignore))
+    stats = token_index.stats(ignored_words) if len(snapshot) else None
+    proj_name = (args.project or (stats.project if stats else "")).strip()
+    if not proj_name:
+        logger.error("No project name detected, pass --project")
+        return 2
+
+    # Same exclusions as the GUI preview: ignored words plus tokens in >80% of files
+    common_tokens = stats.common_tokens if stats else []
+    all_excluded = list(dict.fromkeys([w.lower() for w in ignored_words] + common_tokens))
+
+    parser = MetadataParser(
+        id_min_len=min_len,
+        id_max_len=max_len,
+        standard_project_name=proj_name,
+        standard_class_name=args.class_name.strip(),
+        excluded_tokens=all_excluded,
+        roster=roster
+    )
+    fmt_str = build_format(NAMING_PATTERNS[args.pattern], SEPARATORS[args.separator], args.class_position)
+
+    metas = parser.extract_many(snapshot.entries, workers=args.workers)
+    parser.log_report()
+    with METRICS.stage("names"):
+        new_names = [parser.generate_new_name(m, fmt_str) for m in metas]
+    
+    # Duplicates keep their name and stay out of the plan
+    duplicates = find_duplicates(snapshot.entries) if args.duplicates else {}
+    renamed = [i for i, m in enumerate(metas) if m["filepath"] not in duplicates]
+    plan = plan_renames([(metas[i]["filepath"], new_names[i]) for i in renamed], args.conflict)
+    logger.info("%d files, ID length %d-%d, project '%s', %d name conflicts",
+                len(metas), min_len, max_len, proj_name, plan.conflicts)
+
+    if args.dry_run:
+        planned = {PLAN_RENAME: STATUS_PLANNED, PLAN_UNCHANGED: STATUS_UNCHANGED, PLAN_SKIPPED: STATUS_SKIPPED}
+        plan_statuses = [planned[action] for action in plan.actions]
+    else:
+        results = execute_plan(plan, journal=RenameJournal(args.journal), description=root)
+        plan_statuses = []
+        for action, ok in zip(plan.actions, results):
+            if action == PLAN_RENAME:
+                plan_statuses.append(STATUS_DONE if ok else STATUS_ERROR)
+            else:
+                plan_statuses.append(STATUS_UNCHANGED if ok else STATUS_SKIPPED)
+
+    targets = [m["original_name"] for m in metas]
+    statuses = [STATUS_DUPLICATE] * len(metas)
+    for i, target, status in zip(renamed, plan.targets, plan_statuses):
+        targets[i], statuses[i] = target, status
+
+    rows = [{
+        "path": m["filepath"],
+        "new_name": target,
+        "status": status,
+        "student_id": m["student_id"],
+        "name": m["name"],
+        "project": m["project"],
+        "class_name": m["class_name"],
+    } for m, target, status in zip(metas, targets, statuses)]
+    fields = REPORT_FIELDS
+    if args.duplicates:
+        fields = REPORT_FIELDS + ["duplicate_of"]
+        for row in rows:
+            row["duplicate_of"] = duplicates.get(row["path"], "")
+    _write_report(rows, args.format, stream, fields)
+
+    if not args.dry_run:
+        done = statuses.count(STATUS_DONE)
+        logger.info("Renamed %d/%d files", done, len(rows))
+    return 1 if STATUS_ERROR in statuses else 0
+
+
+def _write_metrics(target: str, elapsed: float):
+    report = METRICS.report()
+    report["seconds"] = elapsed
+    if target == "-":
+        json.dump(report, sys.stderr, indent=2)
+        sys.stderr.write("\n")
+    else:
+        with open(target, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_arg_parser().parse_args(argv)
+    setup_logging(logging.DEBUG if args.verbose else logging.WARNING if args.quiet else logging.INFO)
+    METRICS.enabled = bool(args.metrics)
+    start = time.perf_counter()
+    with _report_stream(args.output) as stream:
+        code = run(args, stream)
+    if args.metrics:
+        _write_metrics(args.metrics, time.perf_counter() - start)
+    return code
@@ -0,0 +1,233 @@
+import heapq
+import logging
+import os
+import re
+from operator import itemgetter
+from typing import Dict, Hashable, Iterable, List, Optional, Set, Tuple
+
+from core.metrics import METRICS
+
+logger = logging.getLogger(__name__)
+
+# Student IDs are runs of 4-15 digits; without any such run the default range is used
+ID_MIN_DIGITS = 4
+ID_MAX_DIGITS = 15
+DEFAULT_ID_RANGE = "8-12"
+# A length next to the most common one joins the detected range when at least
+# this share of files has it (e.g. a class mixing 8- and 10-digit IDs) ...
+ID_LENGTH_MIN_SHARE = 0.1
+# ... and it is at most this many digits away (a 4-digit year is not an ID length)
+ID_LENGTH_SPREAD = 2
+
+# Tokens found in more than this share of files are passed to the parser as excluded_tokens
+COMMON_TOKEN_RATIO = 0.8
+
+# 词组：中文词组 或 英文单词, plus digit runs for the ID length. The groups
+# tell the kinds apart without a re.match per token.
+_TOKEN_PATTERN = re.compile(r'([\u4e00-\u9fa5]+)|([a-zA-Z]+)|(\d+)')
+
+
+class IdLengthEstimate:
+    """Student ID length detected by TokenIndex.id_length."""
+
+    def __init__(self, min_len: int, max_len: int, confidence: float, candidates: int, file_count: int):
+        self.min_len = min_len
+        self.max_len = max_len
+        self.confidence = confidence # Share of candidate files whose ID length is in the range
+        self.candidates = candidates # Files with a 4-15 digit run
+        self.file_count = file_count
+
+    @property
+    def text(self) -> str:
+        """The range as typed in the ID length field, e.g. "10" or "8-12"""
+        if self.min_len == self.max_len:
+            return f"{self.min_len}"
+        return f"{self.min_len}-{self.max_len}"
+
+
+def estimate_id_length(histogram: List[int], file_count: int) -> IdLengthEstimate:
+    """
+    Picks the ID length range from a histogram of the longest 4-15 digit run
+    per file (index = length). The parser takes the longest run in range as
+    the ID, so this is the length it will actually see.
+
+    The most common length wins (ties go to the longer one); neighbouring
+    lengths within ID_LENGTH_SPREAD digits that at least ID_LENGTH_MIN_SHARE
+    of the files have widen the range.
+    """
+    candidates = sum(histogram)
+    if not candidates:
+        min_len, max_len = (int(n) for n in DEFAULT_ID_RANGE.split('-'))
+        return IdLengthEstimate(min_len, max_len, 0.0, 0, file_count)
+
+    lengths = range(ID_MIN_DIGITS, ID_MAX_DIGITS + 1)
+    mode = max(lengths, key=lambda l: (histogram[l], l))
+    in_range = [l for l in lengths
+                if abs(l - mode) <= ID_LENGTH_SPREAD and histogram[l] >= candidates * ID_LENGTH_MIN_SHARE]
+    min_len, max_len = min(in_range + [mode]), max(in_range + [mode])
+    confidence = sum(histogram[min_len:max_len + 1]) / candidates
+    return IdLengthEstimate(min_len, max_len, confidence, candidates, file_count)
+
+
+class TokenStats:
+    """Result of TokenIndex.stats."""
+
+    def __init__(self, project: str, recommended: List[str], common_tokens: List[str]):
+        self.project = project # Most common token, in its first-seen case
+        self.recommended = recommended # Suggested ignored words (up to 4 Chinese words)
+        self.common_tokens = common_tokens # Lowercased tokens in > COMMON_TOKEN_RATIO of the files
+
+
+def _file_tokens(stem: str) -> Tuple[List[tuple], int]:
+    """
+    Tokenizes a filename stem in one pass.
+
+    Returns:
+        ((key, token, is_chinese) for every word that counts, length of the
+        longest digit run that could be an ID or 0)
+    """
+    tokens = []
+    longest_id = 0
+    for chinese, english, digits in _TOKEN_PATTERN.findall(stem):
+        if chinese:
+            # 中文：≥2字符
+            if len(chinese) >= 2:
+                tokens.append((chinese, chinese, True))
+        elif english:
+            # 英文：>2字符，不区分大小写
+            if len(english) > 2:
+                tokens.append((english.lower(), english, False))
+        elif ID_MIN_DIGITS <= len(digits) <= ID_MAX_DIGITS and len(digits) > longest_id:
+            longest_id = len(digits)
+    return tokens, longest_id
+
+
+class TokenIndex:
+    """
+    Token frequencies of a set of filenames, for project name autofill and
+    ignored word suggestions.
+
+    Built once per DirectorySnapshot and kept up to date with the snapshot's
+    deltas (apply_delta), so files are tokenized once. Ignored words are only
+    subtracted when stats() is asked for, so changing them never rescans.
+
+    Tokens are Chinese runs (≥2 chars) and English words (>2 letters), counted
+    per occurrence and case-insensitively under their lowercased key. The
+    same pass fills a fixed-size histogram of ID lengths (id_length).
+    """
+
+    def __init__(self, snapshot=None):
+        self.snapshot = snapshot
+        self.file_count = 0
+        self.id_lengths = [0] * (ID_MAX_DIGITS + 1) # Files per longest 4-15 digit run
+        self.counts: Dict[str, int] = {} # key -> occurrences, in first-seen order
+        self.files: Dict[str, Set[Hashable]] = {} # key -> files containing it
+        self._case: Dict[str, str] = {} # key -> first-seen spelling
+        self._chinese: Dict[str, bool] = {}
+        if snapshot is not None:
+            with METRICS.stage("detect.index"):
+                self.add_files(snapshot.paths, snapshot.stems)
+            logger.info("Indexed %d files, %d distinct tokens", self.file_count, len(self.counts))
+
+    def add_files(self, files: Iterable[Hashable], stems: Iterable[str]):
+        """Adds files (any hashable id, usually the path) with their filename stems"""
+        counts, postings, case, chinese = self.counts, self.files, self._case, self._chinese
+        id_lengths = self.id_lengths
+        for file, stem in zip(files, stems):
+            self.file_count += 1
+            tokens, longest_id = _file_tokens(stem)
+            if longest_id:
+                id_lengths[longest_id] += 1
+            for key, token, is_chinese in tokens:
+                count = counts.get(key)
+                if count is None:
+                    counts[key] = 1
+                    postings[key] = {file}
+                    case[key] = token # 保存原始大小写（第一次出现的）
+                    chinese[key] = is_chinese
+                else:
+                    counts[key] = count + 1
+                    postings[key].add(file)
+
+    def remove_files(self, files: Iterable[Hashable], stems: Iterable[str]):
+        """Subtracts files added earlier with the same stems"""
+        counts, postings = self.counts, self.files
+        for file, stem in zip(files, stems):
+            self.file_count -= 1
+            tokens, longest_id = _file_tokens(stem)
+            if longest_id:
+                self.id_lengths[longest_id] -= 1
+            for key, _, _ in tokens:
+                count = counts.get(key)
+                if count is None:
+                    continue
+                if count > 1:
+                    counts[key] = count - 1
+                    postings[key].discard(file)
+                else:
+                    del counts[key], postings[key], self._case[key], self._chinese[key]
+
+    def apply_delta(self, delta):
+        """Follows a DirectorySnapshot.refresh() result (paths added/removed)"""
+        def stems(paths):
+            return [os.path.splitext(os.path.basename(p))[0] for p in paths]
+        with METRICS.stage("detect.index"):
+            self.remove_files(delta.removed, stems(delta.removed))
+            self.add_files(delta.added, stems(delta.added))
+
+    def id_length(self) -> IdLengthEstimate:
+        """Student ID length range over every indexed file, with its confidence"""
+        estimate = estimate_id_length(self.id_lengths, self.file_count)
+        logger.info("ID length %s (confidence %.0f%%, %d/%d files with a digit run)",
+                    estimate.text, estimate.confidence * 100, estimate.candidates, estimate.file_count)
+        return estimate
+
+    def files_with(self, token: str) -> Set[Hashable]:
+        return self.files.get(token.lower(), set())
+
+    def stats(self, ignored_words: Iterable[str] = ()) -> Optional[TokenStats]:
+        """
+        扫描结果：项目名、推荐忽略词和 common_tokens
+
+        Ignored words are matched like tokens (Chinese exactly, English
+        case-insensitively). Works on the distinct tokens only, never on the
+        files, so it is cheap to call after every ignored word change.
+
+        Returns:
+            None if no token is left after filtering.
+        """
+        with METRICS.stage("detect.stats"):
+            return self._stats(list(ignored_words))
+
+    def _stats(self, ignored_words: List[str]) -> Optional[TokenStats]:
+        ignored = {w.lower() for w in ignored_words}
+        logger.debug("Ignored words: %s", ignored_words)
+
+        counts = self.counts
+        live = [(key, count) for key, count in counts.items() if key not in ignored]
+        if not live:
+            logger.warning("No tokens found after filtering")
+            return None
+
+        # Same order as Counter.most_common: by count, ties in first-seen order
+        top_tokens = heapq.nlargest(20, live, key=itemgetter(1)) # 取前20名
+        most_common_lower, count = top_tokens[0]
+        most_common = self._case[most_common_lower]
+        logger.info("Project name: '%s' (%d/%d files)", most_common, count, self.file_count)
+
+        # 推荐忽略词（4个中文词，≤5字），跳过第1名（已用作项目名）
+        recommended = []
+        for token_lower, count in top_tokens[1:]:
+            if not self._chinese[token_lower] or len(token_lower) > 5:
+                continue
+            recommended.append(self._case[token_lower])
+            if len(recommended) >= 4:
+                break
+        logger.info("Recommended ignored words: %s", recommended)
+
+        # 出现在 >80% 文件中的词，传给 parser 作为 excluded_tokens
+        threshold = self.file_count * COMMON_TOKEN_RATIO
+        common_tokens = [key for key, count in live if count > threshold]
+        logger.info("Common tokens (>%.0f%% of files): %s", COMMON_TOKEN_RATIO * 100, common_tokens)
+
+        return TokenStats(most_common, recommended, common_tokens)
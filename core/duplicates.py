@@ -0,0 +1,131 @@
+"""
+Finds files with identical content among scanned files.
+
+Students resubmit the same file under another name ("副本", "Copy (2)"), and
+once those markers are stripped the copies all want the same new name. The
+content is compared in three passes, each only over what the previous one
+left as possible duplicates:
+
+    1. size (from the scan, no I/O)
+    2. hash of the first and last PARTIAL_BLOCK bytes
+    3. full hash, streamed from a memory map
+
+so most files are never read, and only files that still look identical
+after pass 2 are read whole. Hashing runs on a thread pool: hashlib
+releases the GIL while it hashes large buffers.
+"""
+import logging
+import os
+from typing import Callable, Dict, List, Sequence
+
+from core.metrics import METRICS
+from core.scanner import FileEntry
+
+logger = logging.getLogger(__name__)
+
+# Bytes hashed at each end of a file in the partial pass
+PARTIAL_BLOCK = 64 * 1024
+# Bytes handed to the hash per update in the full pass
+HASH_CHUNK = 1024 * 1024
+# Files hashed concurrently (I/O bound, like renames)
+HASH_WORKERS = 8
+
+
+def _new_hash():
+    import hashlib # Imported here so that starting the app does not pay for hashlib
+    return hashlib.blake2b(digest_size=16)
+
+
+def partial_hash(path: str, size: int) -> bytes:
+    """Hash of the first and last PARTIAL_BLOCK bytes (the whole file if it is small)"""
+    h = _new_hash()
+    with open(path, "rb") as f:
+        h.update(f.read(PARTIAL_BLOCK))
+        if size > PARTIAL_BLOCK:
+            f.seek(max(PARTIAL_BLOCK, size - PARTIAL_BLOCK))
+            h.update(f.read(PARTIAL_BLOCK))
+    return h.digest()
+
+
+def full_hash(path: str) -> bytes:
+    """Hash of the whole file, read through a memory map in HASH_CHUNK pieces"""
+    h = _new_hash()
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return h.digest() # mmap cannot map an empty file
+        import mmap
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as m, memoryview(m) as view:
+            for offset in range(0, len(view), HASH_CHUNK):
+                h.update(view[offset:offset + HASH_CHUNK])
+    return h.digest()
+
+
+def _regroup(groups: List[List[FileEntry]], key: Callable[[FileEntry], bytes],
+             workers: int) -> List[List[FileEntry]]:
+    """Splits each group by key(entry), computed on a thread pool; drops singletons and unreadable files"""
+    entries = [e for group in groups for e in group]
+    if not entries:
+        return []
+
+    def safe_key(entry):
+        try:
+            return key(entry)
+        except (OSError, ValueError) as e:
+            logger.debug("Cannot hash %s: %s", entry.path, e)
+            return None
+
+    # Imported here so that starting the app does not pay for concurrent.futures
+    from concurrent.futures import ThreadPoolExecutor
+    with ThreadPoolExecutor(max_workers=min(workers, len(entries))) as pool:
+        keys = dict(zip(map(id, entries), pool.map(safe_key, entries)))
+
+    result = []
+    for group in groups:
+        by_key: Dict[bytes, List[FileEntry]] = {}
+        for entry in group:
+            k = keys[id(entry)]
+            if k is not None:
+                by_key.setdefault(k, []).append(entry)
+        result.extend(g for g in by_key.values() if len(g) > 1)
+    return result
+
+
+def find_duplicates(entries: Sequence[FileEntry], workers: int = HASH_WORKERS) -> Dict[str, str]:
+    """
+    Finds files with the same content, keeping the newest one of each set.
+
+    Args:
+        entries: Scanned files (size and mtime are taken from the scan).
+        workers: Files hashed concurrently.
+
+    Returns:
+        {duplicate path: path of the kept file}. The kept file is the most
+        recently modified one (the first in scan order on a tie). Empty
+        files, archive members and files that cannot be read are never
+        reported.
+    """
+    with METRICS.stage("duplicates"):
+        by_size: Dict[int, List[FileEntry]] = {}
+        for entry in entries:
+            if entry.size > 0 and not entry.is_dir and entry.archive is None:
+                by_size.setdefault(entry.size, []).append(entry)
+        groups = [g for g in by_size.values() if len(g) > 1]
+        METRICS.count("duplicates.partial_hashed", sum(map(len, groups)))
+
+        groups = _regroup(groups, lambda e: partial_hash(e.path, e.size), workers)
+
+        # The partial hash already covered files of up to two blocks
+        small = [g for g in groups if g[0].size <= 2 * PARTIAL_BLOCK]
+        large = [g for g in groups if g[0].size > 2 * PARTIAL_BLOCK]
+        METRICS.count("duplicates.full_hashed", sum(map(len, large)))
+        groups = small + _regroup(large, lambda e: full_hash(e.path), workers)
+
+        duplicates = {}
+        for group in groups:
+            kept = max(group, key=lambda e: e.mtime) # max() keeps the first of equals
+            for entry in group:
+                if entry is not kept:
+                    duplicates[entry.path] = kept.path
+    METRICS.count("duplicates.found", len(duplicates))
+    logger.info("Duplicates: %d files in %d sets", len(duplicates), len(groups))
+    return duplicates
@@ -0,0 +1,373 @@
+import json
+import logging
+import os
+import time
+import uuid
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from core.metrics import METRICS
+from core.renamer import rename_batch
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_JOURNAL_PATH = os.path.join(os.path.expanduser("~"), ".filerenamer", "journal.jsonl")
+
+# Steps written (and fsync'd) to the journal at a time, before they are executed
+JOURNAL_SYNC_EVERY = 512
+
+# How json.dumps starts the records written by log_steps and log_members:
+# batches() counts these lines without decoding or parsing them
+_STEP_PREFIX = b'{"op": "step", "batch": "'
+_MEMBER_PREFIX = b'{"op": "member", "batch": "'
+_BATCH_KEY = b'"batch": "'
+
+
+def _line_batch(line: bytes) -> Optional[str]:
+    """Batch id of a journal line, found without parsing it (a quote inside a path is escaped)"""
+    start = line.find(_BATCH_KEY)
+    if start < 0:
+        return None
+    start += len(_BATCH_KEY)
+    end = line.find(b'"', start)
+    return line[start:end].decode("utf-8", "replace") if end > 0 else None
+
+
+def _count_files(steps: Sequence[tuple], members: int) -> int:
+    """Original files renamed by steps (not the temporary names of cycles), plus archive members"""
+    seen_dst = set()
+    files = 0
+    for step in steps:
+        if step[0] not in seen_dst:
+            files += 1
+        seen_dst.add(step[1])
+    return files + members
+
+
+class JournalBatch:
+    """
+    One rename batch as recorded in the journal.
+
+    batches() only indexes a batch: its steps and archive members are counted
+    but not kept, as the journal holds every rename ever made. They are read
+    by RenameJournal.load_steps when the batch is undone.
+    """
+
+    def __init__(self, batch_id: str, started: float, description: str, undoes: Optional[str]):
+        self.id = batch_id
+        self.started = started
+        self.description = description
+        self.undoes = undoes # Batch id this batch undid, if it is an undo
+        self.step_count = 0
+        self.member_count = 0
+        # Original files plus archive members renamed, from the end record or
+        # RenameJournal.count_files (None until known)
+        self.file_count: Optional[int] = None
+        self.steps: Optional[List[Tuple[str, str, Optional[int]]]] = None # (src, dst, inode or None) in execution order
+        # Renames inside zip archives: (archive, src member, dst member, (CRC, size) of the member)
+        self.members: Optional[List[Tuple[str, str, str, Tuple[int, int]]]] = None
+        self.ended = False # False after a crash mid-batch
+        self.undone = False
+
+
+class RenameJournal:
+    """
+    Append-only, crash-safe journal of rename batches (JSON lines).
+
+    Every rename is logged before it runs, with an fsync every
+    JOURNAL_SYNC_EVERY steps. Any past batch can then be undone after a
+    restart by replaying its steps backwards, and a batch that never got its
+    "end" record (the app crashed) can be rolled back the same way.
+
+    Renames inside a zip archive are logged as "member" records before the
+    archive is rewritten (see core.archives). The member's CRC and size play
+    the part of the inode: they tell whether the rewrite happened, even when
+    members swapped names.
+    """
+
+    def __init__(self, path: str = DEFAULT_JOURNAL_PATH):
+        self.path = path
+        # Batches this instance has begun but not ended: id -> [dst paths logged,
+        # original files, archive members], so end_batch can record the file count
+        self._tallies: Dict[str, list] = {}
+
+    def _append(self, records: Sequence[dict]):
+        with METRICS.stage("journal"):
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            data = "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in records).encode("utf-8")
+            with open(self.path, "a+b") as f:
+                if f.tell() > 0:
+                    f.seek(-1, os.SEEK_END)
+                    if f.read(1) != b"\n":
+                        data = b"\n" + data # End a line torn by a crash, or this record would be lost with it
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+
+    def begin_batch(self, description: str = "", undoes: Optional[str] = None) -> str:
+        batch_id = uuid.uuid4().hex
+        record = {"op": "begin", "batch": batch_id, "time": time.time(), "description": description}
+        if undoes:
+            record["undoes"] = undoes
+        self._append([record])
+        self._tallies[batch_id] = [set(), 0, 0]
+        return batch_id
+
+    def log_steps(self, batch_id: str, steps: Sequence[tuple]):
+        """
+        Records renames that are about to run, as (src, dst) or (src, dst, inode).
+        
+        The inode is needed for renames that go through a temporary name to
+        break a cycle: after A -> B, B -> A both names exist whether the swap
+        happened or not, and only the inode tells the two states apart.
+        """
+        records = []
+        tally = self._tallies.get(batch_id)
+        for step in steps:
+            record = {"op": "step", "batch": batch_id, "src": step[0], "dst": step[1]}
+            if len(step) > 2 and step[2] is not None:
+                record["ino"] = step[2]
+            records.append(record)
+            if tally is not None:
+                if step[0] not in tally[0]:
+                    tally[1] += 1
+                tally[0].add(step[1])
+        self._append(records)
+
+    def log_members(self, batch_id: str, archive: str, renames: Sequence[Tuple[str, str, Tuple[int, int]]]):
+        """Records renames inside archive that are about to run, as (src member, dst member, (CRC, size))"""
+        self._append([{"op": "member", "batch": batch_id, "archive": archive, "src": src, "dst": dst,
+                       "crc": check[0], "size": check[1]} for src, dst, check in renames])
+        if batch_id in self._tallies:
+            self._tallies[batch_id][2] += len(renames)
+
+    def end_batch(self, batch_id: str, complete: bool = True):
+        """Closes a batch; complete=False when it was stopped before all steps ran"""
+        record = {"op": "end", "batch": batch_id, "complete": complete}
+        tally = self._tallies.pop(batch_id, None)
+        if tally is not None:
+            record["files"] = tally[1] + tally[2]
+        self._append([record])
+
+    def batches(self) -> List[JournalBatch]:
+        """
+        All batches, oldest first, indexed without their steps (see
+        load_steps). Only begin and end records are parsed: step and member
+        lines are just counted. A torn line (crash while writing) is ignored.
+        """
+        batches: Dict[str, JournalBatch] = {}
+        try:
+            f = open(self.path, "rb")
+        except FileNotFoundError:
+            return []
+        with f:
+            for line in f:
+                # A complete line ends with its record; anything else was torn
+                if line.endswith(b"}\n") and line.startswith((_STEP_PREFIX, _MEMBER_PREFIX)):
+                    batch = batches.get(_line_batch(line))
+                    if batch is not None:
+                        if line.startswith(_STEP_PREFIX):
+                            batch.step_count += 1
+                        else:
+                            batch.member_count += 1
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                op = record.get("op")
+                batch = batches.get(record.get("batch"))
+                if op == "begin":
+                    batch = JournalBatch(record["batch"], record.get("time", 0), record.get("description", ""), record.get("undoes"))
+                    batches[batch.id] = batch
+                elif batch is None:
+                    continue
+                elif op == "step":
+                    batch.step_count += 1
+                elif op == "member":
+                    batch.member_count += 1
+                elif op == "end":
+                    batch.ended = True
+                    batch.file_count = record.get("files") # Not recorded by older versions
+                    if batch.undoes in batches and record.get("complete", True):
+                        batches[batch.undoes].undone = True
+        return list(batches.values())
+
+    def undoable_batches(self, batches: Optional[List[JournalBatch]] = None) -> List[JournalBatch]:
+        """Finished rename batches that have not been undone, newest first (of batches, default: read the journal)"""
+        if batches is None:
+            batches = self.batches()
+        return [b for b in reversed(batches)
+                if b.ended and not b.undone and not b.undoes and (b.step_count or b.member_count)]
+
+    def incomplete_batches(self, batches: Optional[List[JournalBatch]] = None) -> List[JournalBatch]:
+        """Batches interrupted by a crash (and not rolled back since), newest first"""
+        if batches is None:
+            batches = self.batches()
+        return [b for b in reversed(batches) if not b.ended and not b.undone]
+
+    def load_steps(self, batches: Sequence[JournalBatch]):
+        """Reads the steps and archive members of batches, in one pass over the journal"""
+        self._read_steps(batches, keep=True)
+
+    def count_files(self, batches: Sequence[JournalBatch]):
+        """Sets file_count where the journal has none (older versions, crashed batches), without keeping the steps"""
+        self._read_steps([b for b in batches if b.file_count is None], keep=False)
+
+    def _read_steps(self, batches: Sequence[JournalBatch], keep: bool):
+        wanted = {b.id: b for b in batches}
+        if not wanted:
+            return
+        steps: Dict[str, list] = {batch_id: [] for batch_id in wanted}
+        members: Dict[str, list] = {batch_id: [] for batch_id in wanted}
+        begun = set()
+        try:
+            with open(self.path, "rb") as f:
+                for line in f:
+                    if _line_batch(line) not in wanted:
+                        continue
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+                    op = record.get("op")
+                    if op == "begin":
+                        begun.add(record["batch"])
+                    elif record.get("batch") not in begun:
+                        continue # As in batches()
+                    elif op == "step":
+                        steps[record["batch"]].append((record["src"], record["dst"], record.get("ino")))
+                    elif op == "member":
+                        members[record["batch"]].append((record["archive"], record["src"], record["dst"],
+                                                         (record["crc"], record["size"])))
+        except FileNotFoundError:
+            pass
+        for batch_id, batch in wanted.items():
+            if batch.file_count is None:
+                batch.file_count = _count_files(steps[batch_id], len(members[batch_id]))
+            if keep:
+                batch.steps, batch.members = steps[batch_id], members[batch_id]
+
+    def undo_batch(self, batch: JournalBatch,
+                   progress: Optional[Callable[[int, int], None]] = None,
+                   should_stop: Optional[Callable[[], bool]] = None,
+                   description: Optional[str] = None) -> Tuple[int, List[str]]:
+        """
+        Reverts a batch by replaying its steps backwards. Steps that did not
+        happen (or whose result was renamed again since) are skipped, so this
+        also rolls back a half-finished batch. The undo is journaled as a batch
+        of its own. Renames inside archives ran last, so they are reverted
+        first, with one rewrite per archive.
+
+        Returns:
+            (number of files restored, paths that could not be restored)
+        """
+        if batch.steps is None:
+            self.load_steps([batch])
+
+        # Decide which steps to revert by simulating the replay, since a cycle's
+        # steps only become revertible once the later ones have been reverted
+        exists: Dict[str, bool] = {}
+
+        def on_disk(path):
+            if path not in exists:
+                exists[path] = os.path.lexists(path)
+            return exists[path]
+
+        # Original names (as opposed to temporary names used to break cycles)
+        originals = set()
+        seen_dst = set()
+        for src, dst, _ in batch.steps:
+            if src not in seen_dst:
+                originals.add(src)
+            seen_dst.add(dst)
+
+        moved = set() # Paths whose file the simulated replay has changed
+
+        def is_same_file(path, ino):
+            if ino is None or path in moved:
+                return True # Nothing recorded, or already decided by the simulation
+            try:
+                return os.lstat(path).st_ino == ino
+            except OSError:
+                return False
+
+        # A step whose dst is missing, or whose src still exists, never ran
+        # (or its file was moved away since)
+        reverts = []
+        for src, dst, ino in reversed(batch.steps):
+            if on_disk(dst) and not on_disk(src) and is_same_file(dst, ino):
+                reverts.append((dst, src))
+                exists[dst], exists[src] = False, True
+                moved.update((dst, src))
+        failed = [src for src in originals if not on_disk(src)]
+
+        if description is None:
+            description = f"undo: {batch.description}"
+        undo_id = self.begin_batch(description, undoes=batch.id)
+        restored = 0
+        if batch.members:
+            restored, failed_members = self._undo_members(undo_id, batch.members, should_stop)
+            failed.extend(failed_members)
+            if should_stop and should_stop():
+                self.end_batch(undo_id, complete=False)
+                return restored, failed
+        for start in range(0, len(reverts), JOURNAL_SYNC_EVERY):
+            chunk = reverts[start:start + JOURNAL_SYNC_EVERY]
+            self.log_steps(undo_id, chunk)
+            results = rename_batch(
+                [(src, os.path.basename(dst)) for src, dst in chunk],
+                progress=(lambda done, total, offset=start: progress(offset + done, len(reverts))) if progress else None,
+                should_stop=should_stop
+            )
+            restored += sum(1 for (_, dst), ok in zip(chunk, results) if ok and dst in originals)
+            failed.extend(src for (src, _), ok in zip(chunk, results) if ok is False)
+            if any(ok is None for ok in results):
+                self.end_batch(undo_id, complete=False)
+                return restored, failed
+        self.end_batch(undo_id)
+        return restored, failed
+
+    def _undo_members(self, undo_id: str, members: Sequence[Tuple[str, str, str, Tuple[int, int]]],
+                      should_stop: Optional[Callable[[], bool]]) -> Tuple[int, List[str]]:
+        """
+        Reverts renames inside archives: a member is renamed back when its
+        new name holds the same content (CRC and size) and its old name is
+        free. Returns (members restored, virtual paths not restored).
+        """
+        # Imported here: only batches that renamed archive members need it
+        from zipfile import BadZipFile
+        from core import archives
+
+        by_archive: Dict[str, List[Tuple[str, str, Tuple[int, int]]]] = {}
+        for archive, src, dst, check in members:
+            by_archive.setdefault(archive, []).append((src, dst, check))
+
+        restored = 0
+        failed = []
+        for archive, renames in by_archive.items():
+            if should_stop and should_stop():
+                break
+            try:
+                current = archives.member_checks(archive)
+            except (OSError, BadZipFile) as e:
+                logger.warning("Cannot read archive %s: %s", archive, e)
+                failed.extend(archives.member_path(archive, src) for src, _, _ in renames)
+                continue
+
+            # Renamed: the content is at the new name. Members that swapped names
+            # free each other's old name.
+            renamed = [(src, dst, check) for src, dst, check in renames if current.get(dst) == check]
+            leaving = {dst for _, dst, _ in renamed}
+            reverts = [r for r in renamed if r[0] not in current or r[0] in leaving]
+            reverted = {src for src, _, _ in reverts}
+            # Neither reverted nor still at its old name (never renamed)
+            failed.extend(archives.member_path(archive, src) for src, _, check in renames
+                          if src not in reverted and current.get(src) != check)
+            if not reverts:
+                continue
+            self.log_members(undo_id, archive, [(dst, src, check) for src, dst, check in reverts])
+            if archives.rename_members(archive, {dst: src.rpartition("/")[2] for src, dst, _ in reverts}):
+                restored += len(reverts)
+            else:
+                failed.extend(archives.member_path(archive, src) for src, _, _ in reverts)
+        return restored, failed
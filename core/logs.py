@@ -0,0 +1,28 @@
+"""
+Logging setup shared by the GUI, the CLI and the parser's worker processes.
+
+Core modules log through logging.getLogger(__name__) with %-style arguments,
+so messages below the configured level are never formatted. Per-file
+messages (e.g. every excluded token removed from a name) are DEBUG; batches
+are summarized at INFO.
+"""
+import logging
+import os
+from typing import Optional, Union
+
+LOG_FORMAT = "[%(levelname)s] %(name)s: %(message)s"
+
+# Overrides the default level of the GUI (e.g. FILERENAMER_LOG_LEVEL=DEBUG)
+LOG_LEVEL_ENV = "FILERENAMER_LOG_LEVEL"
+
+
+def setup_logging(level: Optional[Union[int, str]] = None):
+    """
+    Sends log records to stderr. Without a level, FILERENAMER_LOG_LEVEL or
+    INFO is used. Does nothing if the root logger is already configured.
+    """
+    if level is None:
+        level = os.environ.get(LOG_LEVEL_ENV, "INFO").upper()
+    if isinstance(level, str) and not isinstance(logging.getLevelName(level), int):
+        level = logging.INFO # Unknown level name
+    logging.basicConfig(level=level, format=LOG_FORMAT)
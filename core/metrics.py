@@ -0,0 +1,122 @@
+"""
+Stage timings and counters for the scan -> detect -> parse -> rename pipeline.
+
+Modules time their stages with the shared METRICS instance:
+
+    with METRICS.stage("parse"):
+        ...
+    METRICS.count("parse.files", len(paths))
+
+Only whole stages are instrumented, never per-file work, and while METRICS
+is disabled (the default) stage() returns a shared no-op context manager and
+count() returns immediately. The GUI enables it for its status bar summary,
+the CLI with --metrics.
+
+Stages may nest (e.g. "parse.cache" includes the "parse" it triggers); each
+reports its own inclusive time.
+"""
+import threading
+import time
+from typing import Dict, Optional
+
+
+class _NullStage:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+
+class _Stage:
+    __slots__ = ("metrics", "name", "start")
+
+    def __init__(self, metrics: "Metrics", name: str):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.add_time(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class Metrics:
+    """
+    Accumulated stage timings (calls, seconds) and counters.
+
+    Safe to update from worker threads. report() returns a plain dict, and
+    report(since=earlier_report) the difference, so callers can summarize
+    one preview or one rename without resetting the totals.
+    """
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._stages: Dict[str, list] = {} # name -> [calls, seconds]
+        self._counters: Dict[str, int] = {}
+
+    def stage(self, name: str):
+        """Context manager adding the time spent in the block to stage name"""
+        if not self.enabled:
+            return _NULL_STAGE
+        return _Stage(self, name)
+
+    def add_time(self, name: str, seconds: float):
+        if not self.enabled:
+            return
+        with self._lock:
+            entry = self._stages.get(name)
+            if entry is None:
+                self._stages[name] = [1, seconds]
+            else:
+                entry[0] += 1
+                entry[1] += seconds
+
+    def count(self, name: str, n: int = 1):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + n
+
+    def reset(self):
+        with self._lock:
+            self._stages.clear()
+            self._counters.clear()
+
+    def report(self, since: Optional[dict] = None) -> dict:
+        """
+        Returns {"stages": {name: {"calls": n, "seconds": s}}, "counters": {name: n}}.
+
+        With since (an earlier report), only what was recorded after it;
+        stages and counters that did not change are left out.
+        """
+        with self._lock:
+            stages = {name: {"calls": calls, "seconds": seconds}
+                      for name, (calls, seconds) in self._stages.items()}
+            counters = dict(self._counters)
+        if since is None:
+            return {"stages": stages, "counters": counters}
+
+        old_stages, old_counters = since["stages"], since["counters"]
+        delta_stages = {}
+        for name, entry in stages.items():
+            old = old_stages.get(name, {"calls": 0, "seconds": 0.0})
+            if entry["calls"] != old["calls"]:
+                delta_stages[name] = {"calls": entry["calls"] - old["calls"],
+                                      "seconds": entry["seconds"] - old["seconds"]}
+        delta_counters = {name: n - old_counters.get(name, 0)
+                          for name, n in counters.items() if n != old_counters.get(name, 0)}
+        return {"stages": delta_stages, "counters": delta_counters}
+
+
+# Shared by the core modules and the front ends
+METRICS = Metrics()
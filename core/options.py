@@ -0,0 +1,66 @@
+from typing import List, Optional, Tuple
+
+from core.scanner import ScanFilter
+
+# Naming patterns offered by the GUI and the CLI; {sep} is replaced by the separator
+NAMING_PATTERNS = {
+    "id-name-project": "{student_id}{sep}{name}{sep}{project}",
+    "name-id-project": "{name}{sep}{student_id}{sep}{project}",
+    "project-id-name": "{project}{sep}{student_id}{sep}{name}",
+    "original-id": "{original_name}{sep}{student_id}",
+}
+
+# Where the custom text (class name) goes in the new name
+CLASS_POSITIONS = ("none", "start", "after_id", "end")
+
+
+def parse_id_range(text: str) -> Tuple[int, int]:
+    """Parses "10" or "8-12" into (min, max); anything else gives the default (8, 12)"""
+    id_range = text.split('-')
+    try:
+        min_len = int(id_range[0])
+        max_len = int(id_range[1]) if len(id_range) > 1 else min_len
+    except:
+        min_len, max_len = 8, 12
+    return min_len, max_len
+
+
+def parse_ignored_words(text: str) -> List[str]:
+    """Splits the ignored words input on spaces and commas"""
+    text = text.strip().replace(',', ' ')  # 支持逗号分隔
+    return [w.strip() for w in text.split() if w.strip()]
+
+
+def build_format(base_fmt: str, sep: str, class_pos: str = "none") -> str:
+    """
+    Builds the format string for MetadataParser.generate_new_name from a
+    naming pattern, the separator and the custom text position.
+    """
+    # Inject Class Name based on position
+    if class_pos != "none":
+        if class_pos == "start":
+            base_fmt = "{class_name}{sep}" + base_fmt
+        elif class_pos == "end":
+            base_fmt = base_fmt + "{sep}{class_name}"
+        elif class_pos == "after_id":
+            # Replace {student_id} with {student_id}{sep}{class_name}
+            base_fmt = base_fmt.replace("{student_id}", "{student_id}{sep}{class_name}")
+
+    return base_fmt.replace("{sep}", sep)
+
+
+def build_scan_filter(include_text: str, exclude_text: str, max_depth: Optional[int] = None) -> ScanFilter:
+    """
+    Builds the ScanFilter for the include/exclude inputs: globs separated by
+    spaces or commas, where a bare extension (".pdf") filters by extension.
+    """
+    def split(text):
+        globs, extensions = [], []
+        for item in text.replace(',', ' ').split():
+            is_extension = item.startswith('.') and not any(c in item for c in '*?[/\\')
+            (extensions if is_extension else globs).append(item)
+        return globs, extensions
+
+    include, extensions = split(include_text)
+    exclude, exclude_extensions = split(exclude_text)
+    return ScanFilter(include, exclude, extensions, exclude_extensions, max_depth)
@@ -1,14 +1,142 @@
 import re
 import os
-from typing import Dict, Optional
+import logging
+from collections import Counter
+from itertools import combinations, islice
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Tuple, Union
+
+from core.logs import setup_logging
+from core.metrics import METRICS
+from core.scanner import FileEntry
+from core.template import compile_template
+
+if TYPE_CHECKING:
+    from core.roster import Roster # Annotations only: the app imports core.roster when a roster is loaded
+
+logger = logging.getLogger(__name__)
+
+# Below this many files extract_many parses in-process. Measured with
+# benchmarks/bench_parser.py --pool: parsing costs about 20 us per file, and a
+# pool adds its start-up plus about 14 us per file of pickling, so it only
+# pays off for large batches spread over several CPUs.
+PARALLEL_MIN_BATCH = 20000 # Workers started by fork (Linux): ~25 ms start-up
+PARALLEL_MIN_BATCH_SPAWN = 100000 # spawn/forkserver (Windows, macOS): 0.3-0.5 s start-up
+# Unless workers are given, fewer usable CPUs than this always parse in-process
+PARALLEL_MIN_CPUS = 4
+
+# Parser used by each pool worker, set once by _init_worker
+_worker_parser = None
+
+# What extract_metadata accepts: a path, or a scanned FileEntry (already split)
+FileLike = Union[str, FileEntry]
+
+
+def _file_parts(file: FileLike) -> Tuple[str, str, str, str]:
+    """(path, filename, stem, extension) of a path or FileEntry"""
+    if isinstance(file, str):
+        filename = os.path.basename(file)
+        stem, extension = os.path.splitext(filename)
+        return file, filename, stem, extension
+    return file.path, file.name, file.stem, file.extension
+
+
+def _file_path(file: FileLike) -> str:
+    return file if isinstance(file, str) else file.path
+
+
+def _usable_cpus() -> int:
+    """CPUs this process may run on (os.cpu_count() also counts those outside its affinity mask)"""
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def parallel_workers(count: int, workers: Optional[int] = None) -> int:
+    """Worker processes extract_many uses for a batch of count files (1: parsed in-process)"""
+    if workers is None:
+        workers = _usable_cpus()
+        if workers < PARALLEL_MIN_CPUS:
+            return 1
+    if workers <= 1 or count < PARALLEL_MIN_BATCH:
+        return 1
+    # Imported here: multiprocessing is slow to import and only large batches need it
+    import multiprocessing
+    start_method = multiprocessing.get_start_method(allow_none=True) or multiprocessing.get_all_start_methods()[0]
+    if start_method != "fork" and count < PARALLEL_MIN_BATCH_SPAWN:
+        return 1
+    return workers
+
+
+def _init_worker(parser: "MetadataParser", log_level: int):
+    global _worker_parser
+    _worker_parser = parser
+    # Spawned (not forked) workers start without the parent's logging setup
+    setup_logging(log_level)
+
+
+def _extract_chunk(paths: List[str]) -> Tuple[List[Dict[str, str]], "ParseReport"]:
+    _worker_parser.report = ParseReport()
+    return [_worker_parser.extract_metadata(p) for p in paths], _worker_parser.report
+
+
+class ParseReport:
+    """
+    What the excluded tokens, the name re-extraction and the roster did over
+    a batch, logged once (MetadataParser.log_report) instead of once per file.
+    """
+
+    def __init__(self):
+        self.files = 0
+        self.roster: Dict[str, int] = {} # Files resolved per match kind (id/name/alias)
+        self.removed: Dict[str, int] = {} # Excluded token -> name candidates it was removed from
+        self.fully_excluded = 0 # Chinese candidates made only of excluded tokens
+        self.re_extracted = 0 # Names re-extracted because the project name contained them
+        self.re_extract_failed = 0
+
+    def merge(self, other: "ParseReport"):
+        self.files += other.files
+        for how, n in other.roster.items():
+            self.roster[how] = self.roster.get(how, 0) + n
+        for token, n in other.removed.items():
+            self.removed[token] = self.removed.get(token, 0) + n
+        self.fully_excluded += other.fully_excluded
+        self.re_extracted += other.re_extracted
+        self.re_extract_failed += other.re_extract_failed
+
+    def summary(self) -> str:
+        top = sorted(self.removed.items(), key=lambda item: -item[1])[:10]
+        removed = ", ".join(f"'{token}' x{n}" for token, n in top)
+        if len(self.removed) > len(top):
+            removed += f", ... ({len(self.removed)} tokens)"
+        summary = (f"{self.files} files: excluded tokens removed {sum(self.removed.values())} times"
+                   f"{f' ({removed})' if removed else ''}, {self.fully_excluded} candidates fully excluded, "
+                   f"{self.re_extracted} names re-extracted ({self.re_extract_failed} failed)")
+        if self.roster:
+            by_kind = ", ".join(f"{n} by {how}" for how, n in self.roster.items())
+            summary += f"; roster matched {sum(self.roster.values())} ({by_kind})"
+        return summary
+
 
 class MetadataParser:
-    def __init__(self, id_min_len: int = 8, id_max_len: int = 12, standard_project_name: str = "", standard_class_name: str = "", excluded_tokens: list = None):
+    def __init__(self, id_min_len: int = 8, id_max_len: int = 12, standard_project_name: str = "", standard_class_name: str = "", excluded_tokens: list = None, roster: Optional["Roster"] = None):
         self.id_min_len = id_min_len
         self.id_max_len = id_max_len
         self.standard_project_name = standard_project_name
         self.standard_class_name = standard_class_name
         self.excluded_tokens = [t.lower() for t in excluded_tokens] if excluded_tokens else []
+        # Set for the English lookups; list positions and characters for the Chinese names
+        self._excluded_set = frozenset(self.excluded_tokens)
+        self._excluded_positions: Dict[str, List[int]] = {}
+        for position, token in enumerate(self.excluded_tokens):
+            self._excluded_positions.setdefault(token, []).append(position)
+        self._excluded_chars = frozenset("".join(self.excluded_tokens))
+        self.report = ParseReport() # Filled by extract_metadata, logged by log_report
+        
+        # Everything except excluded_tokens that extract_metadata's result depends on
+        self.roster = roster # Real IDs and names, consulted before the patterns
+        self._roster_texts: Dict[object, List[str]] = {} # Student -> its texts as they appear in a project
+        self.fingerprint = (id_min_len, id_max_len, standard_project_name, standard_class_name,
+                            roster.fingerprint if roster is not None else None)
         
         # Regex for Student ID (Anchor)
         self.id_pattern = re.compile(rf'\d{{{self.id_min_len},{self.id_max_len}}}')
@@ -24,33 +152,135 @@ class MetadataParser:
         self.class_keywords = ["班", "级", "Class", "Section"]
         self.cn_num_pattern = r'[一二三四五六七八九十]+'
 
+        self._compile_plan()
+
+    def _compile_plan(self):
+        """
+        Compiles every pattern extract_metadata needs once, so the per-file
+        work is only matching.
+        """
+        # Preprocessing: all "adhesion" splits only ever insert a space at a
+        # boundary between two characters of different kinds, and the kinds of
+        # boundary never overlap, so they are fused into one zero-width pass:
+        #   1. Chinese | English/Numbers, English/Numbers | Chinese
+        #   2. Lowercase | Uppercase (CamelCase adhesion)
+        #   3. Letters | Long Numbers (ID adhesion, only if long enough to be an ID)
+        #   4. Long Numbers | Letters
+        self._split_pattern = re.compile(
+            r'(?<=[\u4e00-\u9fa5])(?=[a-zA-Z0-9])|(?<=[a-zA-Z0-9])(?=[\u4e00-\u9fa5])|'
+            r'(?<=[a-z])(?=[A-Z])|'
+            rf'(?<=[a-zA-Z])(?=\d{{{self.id_min_len}}})|'
+            rf'(?<=\d{{{self.id_min_len}}})(?=[a-zA-Z])'
+        )
+        # 5. "副本" / "Copy" artifacts (must run after the splits)
+        self._copy_pattern = re.compile(r'(?: - )?(?:副本|Copy)(?:\s*\(\d+\))?', re.IGNORECASE)
+
+        # Class: "1班", "Class 1", "一班"
+        keywords_pattern = "|".join(map(re.escape, self.class_keywords))
+        self._class_pattern = re.compile(
+            r'((?:\d+|' + self.cn_num_pattern + r')\s*(?:' + keywords_pattern + r'))|' + 
+            r'((?:' + keywords_pattern + r')\s*(?:\d+|' + self.cn_num_pattern + r'))', 
+            re.IGNORECASE
+        )
+        self._standard_class_pattern = re.compile(re.escape(self.standard_class_name), re.IGNORECASE) if self.standard_class_name else None
+        self._standard_project_pattern = re.compile(re.escape(self.standard_project_name), re.IGNORECASE) if self.standard_project_name else None
+        self._project_words_lower = [w.lower() for w in re.findall(r'[a-zA-Z]+', self.standard_project_name)]
+
+        self._hard_separator_pattern = re.compile(r'[_\-\+——]+')
+        self._whitespace_pattern = re.compile(r'\s+')
+        self._en_token_pattern = re.compile(r'^[a-zA-Z]+$')
+        self._en_word_pattern = re.compile(r'[A-Z][a-z]+')
+        self._cn_only_pattern = re.compile(r'[\u4e00-\u9fa5]+')
+
     def preprocess_filename(self, filename: str) -> str:
         """
         Preprocesses the filename to handle "adhesion" cases where separators are missing.
         """
-        # 1. Separate Chinese and English/Numbers
-        filename = re.sub(r'([\u4e00-\u9fa5])([a-zA-Z0-9])', r'\1 \2', filename)
-        filename = re.sub(r'([a-zA-Z0-9])([\u4e00-\u9fa5])', r'\1 \2', filename)
-        
-        # 2. Separate Lowercase and Uppercase (CamelCase adhesion)
-        filename = re.sub(r'([a-z])([A-Z])', r'\1 \2', filename)
-        
-        # 3. Separate Letters and Long Numbers (ID adhesion)
-        # We only split if the number sequence is long enough to be an ID
-        filename = re.sub(rf'([a-zA-Z])(\d{{{self.id_min_len},}})', r'\1 \2', filename)
-        
-        # 4. Separate Long Numbers and Letters
-        filename = re.sub(rf'(\d{{{self.id_min_len},}})([a-zA-Z])', r'\1 \2', filename)
+        filename = self._split_pattern.sub(' ', filename)
+        return self._copy_pattern.sub('', filename)
 
-        # 5. Remove "副本" / "Copy" artifacts
-        filename = re.sub(r'(?: - )?(?:副本|Copy)(?:\s*\(\d+\))?', '', filename, flags=re.IGNORECASE)
+    def exclusion_probe(self, filename: str) -> str:
+        """
+        Lowercased text that excluded tokens can ever be matched against when
+        parsing filename: the preprocessed name, plus the preprocessed text the
+        re-extraction path works on if that differs.
+        """
+        name_only, extension = os.path.splitext(filename)
+        probe = self.preprocess_filename(name_only).lower()
+        temp_clean = filename.replace(extension, "")
+        if temp_clean != name_only:
+            probe += "\n" + self.preprocess_filename(temp_clean).lower()
+        return probe
 
-        return filename
+    def _roster_form(self, text: str) -> str:
+        """text preprocessed, with separators as single spaces, so that "1班" and "Zhang San" match "1 班" and "zhang_san" """
+        text = self._hard_separator_pattern.sub(' ', self.preprocess_filename(text))
+        return self._whitespace_pattern.sub(' ', text).strip()
 
-    def extract_metadata(self, filepath: str) -> Dict[str, str]:
-        filename = os.path.basename(filepath)
-        name_only, extension = os.path.splitext(filename)
+    def _remove_name(self, text: str, name: str) -> str:
+        """Replace ALL occurrences of name (case insensitive) with a space"""
+        if self._cn_only_pattern.fullmatch(name):
+            # Chinese has no case, a plain replace is equivalent and much cheaper
+            return text.replace(name, " ")
+        return re.sub(re.escape(name), " ", text, flags=re.IGNORECASE)
+
+    def extract_metadata(self, file: FileLike) -> Dict[str, str]:
+        """Parses one file, given by path or by a FileEntry from the scanner (no re-splitting)"""
+        parts = _file_parts(file)
+        if self.roster is not None:
+            metadata = self._extract_with_roster(*parts)
+            if metadata is not None:
+                return metadata
+        return self._extract_by_patterns(*parts)
+
+    def _extract_with_roster(self, filepath: str, filename: str, name_only: str,
+                             extension: str) -> Optional[Dict[str, str]]:
+        """
+        Resolves the file to a roster student by one lookup (ID, name, alias).
+        The patterns only run for what the roster row lacks (an ID or a name).
+        Without a standard project name, the project is what is left of the
+        filename once the student's ID, name, aliases and class are removed.
+
+        Returns:
+            None if the file matches no student.
+        """
+        student, how = self.roster.resolve(name_only)
+        if student is None:
+            return None
+        self.report.roster[how] = self.report.roster.get(how, 0) + 1
+        
+        if student.id and student.name:
+            metadata = {
+                "original_name": filename,
+                "filepath": filepath,
+                "extension": extension,
+                "student_id": student.id,
+                "name": student.name,
+                "project": "",
+                "class_name": self.standard_class_name or student.class_name
+            }
+        else:
+            # Fill in the missing ID or name from the filename
+            metadata = self._extract_by_patterns(filepath, filename, name_only, extension)
+            metadata["student_id"] = student.id or metadata["student_id"]
+            metadata["name"] = student.name or metadata["name"]
+            if student.class_name and not self.standard_class_name:
+                metadata["class_name"] = student.class_name
         
+        if self.standard_project_name:
+            metadata["project"] = self.standard_project_name
+        else:
+            project = self._roster_form(name_only)
+            texts = self._roster_texts.get(student)
+            if texts is None:
+                texts = [t for t in map(self._roster_form, (student.id, student.name, student.class_name, *student.aliases)) if t]
+                self._roster_texts[student] = texts
+            for text in texts:
+                project = self._remove_name(project, text)
+            metadata["project"] = self._whitespace_pattern.sub(' ', project).strip()
+        return metadata
+
+    def _extract_by_patterns(self, filepath: str, filename: str, name_only: str, extension: str) -> Dict[str, str]:
         # Preprocess to handle adhesion
         clean_name = self.preprocess_filename(name_only)
         
@@ -76,17 +306,10 @@ class MetadataParser:
         if self.standard_class_name:
             # If manually provided, use it and try to remove it from filename if present
             metadata["class_name"] = self.standard_class_name
-            clean_name = re.sub(re.escape(self.standard_class_name), " ", clean_name, flags=re.IGNORECASE)
+            clean_name = self._standard_class_pattern.sub(" ", clean_name)
         else:
             # Regex extraction
-            keywords_pattern = "|".join(map(re.escape, self.class_keywords))
-            # Match "1班", "Class 1", "一班"
-            class_pattern = re.compile(
-                r'((?:\d+|' + self.cn_num_pattern + r')\s*(?:' + keywords_pattern + r'))|' + 
-                r'((?:' + keywords_pattern + r')\s*(?:\d+|' + self.cn_num_pattern + r'))', 
-                re.IGNORECASE
-            )
-            class_match = class_pattern.search(clean_name)
+            class_match = self._class_pattern.search(clean_name)
             if class_match:
                 metadata["class_name"] = class_match.group(0)
                 clean_name = clean_name.replace(metadata["class_name"], " ")
@@ -94,12 +317,12 @@ class MetadataParser:
         # 3. Normalize Separators and Remove Standard Project Name
         # We treat standard separators as "breaks" for name clustering, but spaces as "continuations"
         # Replace hard separators with a special char that won't match the name regex
-        clean_name = re.sub(r'[_\-\+——]+', ' | ', clean_name)
+        clean_name = self._hard_separator_pattern.sub(' | ', clean_name)
         
         # If standard project name is set, remove it now to prevent it being picked as Name
         if self.standard_project_name:
             # Case insensitive removal
-            clean_name = re.sub(re.escape(self.standard_project_name), " ", clean_name, flags=re.IGNORECASE)
+            clean_name = self._standard_project_pattern.sub(" ", clean_name)
 
         # 4. Extract Name
         # Strategy: Look for Chinese name first
@@ -107,34 +330,22 @@ class MetadataParser:
         if cn_match:
             candidate_name = cn_match.group()
             
-            # Check if this Chinese name contains any excluded tokens
             # Remove excluded tokens from the candidate name
-            cleaned_candidate = candidate_name
-            for excluded in self.excluded_tokens:
-                if excluded in cleaned_candidate.lower():
-                    # Remove the excluded token
-                    cleaned_candidate = cleaned_candidate.replace(excluded, '')
-                    cleaned_candidate = cleaned_candidate.replace(excluded.upper(), '')
-                    cleaned_candidate = cleaned_candidate.replace(excluded.capitalize(), '')
-                    print(f"[PARSER] Removed '{excluded}' from '{candidate_name}' -> '{cleaned_candidate}'")
+            cleaned_candidate = self._strip_excluded(candidate_name)
             
             # If after removing excluded tokens, we still have a valid name
             if cleaned_candidate.strip():
                 metadata["name"] = cleaned_candidate.strip()
             else:
                 # The entire candidate was excluded, try to find another Chinese name
-                print(f"[PARSER] Entire candidate '{candidate_name}' was excluded")
+                self.report.fully_excluded += 1
+                logger.debug("Entire candidate '%s' was excluded", candidate_name)
                 all_cn_matches = self.cn_name_pattern.findall(clean_name)
                 for cn_name in all_cn_matches:
                     if cn_name == candidate_name:
                         continue  # Skip the one we already tried
                     
-                    cleaned_cn = cn_name
-                    for excluded in self.excluded_tokens:
-                        if excluded in cleaned_cn.lower():
-                            cleaned_cn = cleaned_cn.replace(excluded, '')
-                            cleaned_cn = cleaned_cn.replace(excluded.upper(), '')
-                            cleaned_cn = cleaned_cn.replace(excluded.capitalize(), '')
+                    cleaned_cn = self._strip_excluded(cn_name)
                     
                     if cleaned_cn.strip():
                         metadata["name"] = cleaned_cn.strip()
@@ -150,9 +361,9 @@ class MetadataParser:
             
             for token in tokens:
                 # Clean token (keep letters only)
-                if re.match(r'^[a-zA-Z]+$', token):
+                if self._en_token_pattern.match(token):
                     # Check if this token is in the excluded list (Common Element)
-                    if token.lower() in self.excluded_tokens:
+                    if token.lower() in self._excluded_set:
                         # It's a common element (likely project), so treat as separator
                         if current_candidate:
                             name_candidates.append(" ".join(current_candidate))
@@ -182,7 +393,7 @@ class MetadataParser:
         # Remove Name from string to clean up for Project
         if metadata["name"]:
             # Remove ALL occurrences of the name (case insensitive)
-            clean_name = re.sub(re.escape(metadata["name"]), " ", clean_name, flags=re.IGNORECASE)
+            clean_name = self._remove_name(clean_name, metadata["name"])
 
         # 5. Extract Project
         if self.standard_project_name:
@@ -191,7 +402,7 @@ class MetadataParser:
             # Check if project contains the extracted name
             # If so, the name extraction was wrong - re-extract from remaining tokens
             if metadata["name"] and metadata["name"].lower() in metadata["project"].lower():
-                print(f"[WARNING] Project '{metadata['project']}' contains name '{metadata['name']}' - re-extracting name")
+                logger.debug("Project '%s' contains name '%s' - re-extracting name", metadata['project'], metadata['name'])
                 
                 # Re-extract name from the original clean_name before we removed the name
                 # Get all English name candidates again, excluding the project name
@@ -199,15 +410,15 @@ class MetadataParser:
                 temp_clean = self.preprocess_filename(temp_clean)
                 
                 # Extract English words
-                english_words = re.findall(r'[A-Z][a-z]+', temp_clean)
+                english_words = self._en_word_pattern.findall(temp_clean)
                 
                 # Filter out words that are in the project name
-                project_words_lower = [w.lower() for w in re.findall(r'[a-zA-Z]+', metadata["project"])]
+                project_words_lower = self._project_words_lower
                 name_candidates = []
                 current_candidate = []
                 
                 for word in english_words:
-                    if word.lower() not in project_words_lower and word.lower() not in self.excluded_tokens:
+                    if word.lower() not in project_words_lower and word.lower() not in self._excluded_set:
                         current_candidate.append(word)
                     else:
                         if current_candidate:
@@ -224,62 +435,290 @@ class MetadataParser:
                         metadata["name"] = multi_word[0]
                     else:
                         metadata["name"] = name_candidates[0]
-                    print(f"[RE-EXTRACTED] New name: '{metadata['name']}'")
+                    self.report.re_extracted += 1
+                    logger.debug("Re-extracted name: '%s'", metadata['name'])
                 else:
                     metadata["name"] = ""
-                    print(f"[WARNING] Could not re-extract name")
+                    self.report.re_extract_failed += 1
+                    logger.debug("Could not re-extract name from '%s'", filename)
         else:
             # Cleanup remainder
             # Remove the special separator chars we added
             clean_name = clean_name.replace('|', ' ')
-            clean_name = re.sub(r'\s+', ' ', clean_name).strip()
+            clean_name = self._whitespace_pattern.sub(' ', clean_name).strip()
             metadata["project"] = clean_name
 
         return metadata
 
-    def generate_new_name(self, metadata: Dict[str, str], format_str: str = "{student_id}-{name}-{project}") -> str:
+    def _strip_excluded(self, candidate: str) -> str:
         """
-        Generates the new filename based on metadata and format string.
+        Removes the excluded tokens from a Chinese name candidate, with the
+        same result as going through the whole list: each token, duplicates
+        included, is removed in list order by three replace calls (as-is,
+        upper, capitalized). For Chinese those are the same string, so a
+        nested token ("样样本本" for 样本) is removed up to three times, and
+        removing one token can join the characters around it into another.
+
+        Removing only ever deletes characters, so only a subsequence of the
+        candidate can ever match: at most 15 of them for the 2-4 characters,
+        looked up in a dict, so the cost does not grow with the number of
+        excluded tokens.
+        """
+        if self._excluded_chars.isdisjoint(candidate):
+            return candidate
+        positions = self._excluded_positions
+        hits = {sub for n in range(1, len(candidate) + 1)
+                for sub in map("".join, combinations(candidate, n)) if sub in positions}
+        cleaned = candidate
+        for position in sorted(p for token in hits for p in positions[token]):
+            excluded = self.excluded_tokens[position]
+            if excluded in cleaned:
+                cleaned = cleaned.replace(excluded, '')
+                cleaned = cleaned.replace(excluded.upper(), '')
+                cleaned = cleaned.replace(excluded.capitalize(), '')
+                self._count_removed(excluded)
+                logger.debug("Removed '%s' from '%s' -> '%s'", excluded, candidate, cleaned)
+        return cleaned
+
+    def _count_removed(self, token: str):
+        removed = self.report.removed
+        removed[token] = removed.get(token, 0) + 1
+
+    def log_report(self):
+        """Logs what extract_metadata did since the last call (one line), then starts over"""
+        if self.report.files:
+            logger.info("Parsed %s", self.report.summary())
+        self.report = ParseReport()
+
+    def extract_many(self, paths: Iterable[FileLike], workers: Optional[int] = None, chunk_size: Optional[int] = None) -> List[Dict[str, str]]:
         """
-        # Clean up components
-        sid = metadata.get("student_id", "")
-        # If ID is "NoID", treat it as empty
-        if sid == "NoID":
-            sid = ""
+        Extracts metadata for many files, spreading the work over a process pool.
         
-        name = metadata.get("name", "")
-        proj = metadata.get("project", "")
-        cls = metadata.get("class_name", "")
-        ext = metadata.get("extension", "")
+        Parsing is pure-Python regex work bound by the GIL, so threads would not
+        help. Batches too small to pay for the pool's start-up, and machines
+        with few CPUs, are parsed in-process (see parallel_workers).
         
-        new_name_base = format_str.format(
-            student_id=sid,
-            name=name,
-            project=proj,
-            class_name=cls,
-            original_name=metadata.get("original_name", "").replace(ext, "")
-        )
+        Args:
+            paths: File paths (or FileEntry records) to parse.
+            workers: Number of worker processes (default: usable CPUs, if at least PARALLEL_MIN_CPUS).
+            chunk_size: Paths per task (default: about 4 chunks per worker).
         
-        # Detect the separator used in format_str
-        # Check what separator is actually in the format string
-        separator = "-"  # default
-        if "_" in format_str and "-" not in format_str:
-            separator = "_"
-        elif " " in format_str and "-" not in format_str and "_" not in format_str:
-            separator = " "
+        Returns:
+            One metadata dict per path, in input order.
+        """
+        paths = list(paths)
+        self.report.files += len(paths)
+        METRICS.count("parse.files", len(paths))
+        with METRICS.stage("parse"):
+            return self._extract_many(paths, workers, chunk_size)
+
+    def _extract_many(self, paths: List[FileLike], workers: Optional[int], chunk_size: Optional[int]) -> List[Dict[str, str]]:
+        workers = parallel_workers(len(paths), workers)
+        if workers <= 1:
+            return [self.extract_metadata(p) for p in paths]
         
-        # Clean up double separators if some fields are empty
-        # Replace any sequence of separators with a single separator
-        # This handles cases like "123--Project" or "___Project"
-        if separator == " ":
-            # For space separator, clean up multiple spaces
-            new_name_base = re.sub(r'\s+', ' ', new_name_base)
-        else:
-            # For - or _, replace multiple occurrences with single
-            pattern = re.escape(separator) + r'{2,}'
-            new_name_base = re.sub(pattern, separator, new_name_base)
+        if chunk_size is None:
+            chunk_size = max(500, -(-len(paths) // (workers * 4)))
+        # Workers get plain paths: pickling a string is cheaper than a FileEntry
+        paths_only = [_file_path(p) for p in paths]
+        chunks = [paths_only[i:i + chunk_size] for i in range(0, len(paths_only), chunk_size)]
+        workers = min(workers, len(chunks))
         
-        # Remove leading/trailing separators
-        new_name_base = new_name_base.strip(separator + ' ')
+        # Imported here: multiprocessing is slow to import and only large batches need it
+        from concurrent.futures import ProcessPoolExecutor
+        from concurrent.futures.process import BrokenProcessPool
         
-        return new_name_base + ext
+        METRICS.count("parse.parallel_files", len(paths))
+        results = []
+        report = ParseReport()
+        try:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                     initargs=(self, logging.getLogger().getEffectiveLevel())) as pool:
+                # map() yields chunk results in submission order
+                for chunk_result, chunk_report in pool.map(_extract_chunk, chunks):
+                    results.extend(chunk_result)
+                    report.merge(chunk_report)
+        except (OSError, BrokenProcessPool) as e:
+            logger.warning("Process pool unavailable (%s), parsing in-process", e)
+            METRICS.count("parse.pool_failures")
+            return [self.extract_metadata(p) for p in paths]
+        self.report.merge(report)
+        return results
+
+    def generate_new_name(self, metadata: Dict[str, str], format_str: str = "{student_id}-{name}-{project}") -> str:
+        """
+        Generates the new filename based on metadata and format string.
+        The format string is compiled once (see core.template) and cached.
+        """
+        return compile_template(format_str).render(metadata)
+
+
+class ParseCache:
+    """
+    Bounded LRU cache of extract_metadata results.
+
+    Entries are keyed by parser.fingerprint, then basename; the excluded tokens are
+    checked separately so that toggling an ignored word only re-parses the
+    files it can affect. The result depends on the order of excluded_tokens
+    (they are removed one after the other), so entries record the ordered
+    tuple. Only a token made of characters from the file's exclusion probe
+    can ever match, as removing tokens only joins characters already there.
+    A cached result therefore stays valid for a new list of excluded tokens
+    when those tokens come in the same order in both lists, or when no
+    token of either list occurs in the probe at all.
+
+    An entry is a flat list of the four parsed fields (the rest of a result
+    comes from the file itself), so a cache as large as the folder costs a
+    fraction of the preview rows rather than a metadata dict per file.
+    """
+
+    def __init__(self, max_entries: int = 200000):
+        self.max_entries = max_entries
+        # fingerprint -> {basename: [excluded tokens (tuple), probe (computed lazily),
+        #                            student_id, name, project, class_name]},
+        # least recently used first at both levels
+        self._entries: Dict[tuple, Dict[str, list]] = {}
+        self._size = 0
+        self._excluded = () # Last excluded tuple, shared by the entries validated for it
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def clear(self):
+        self._entries.clear()
+        self._size = 0
+
+    @staticmethod
+    def _changed_tokens(old: tuple, new: tuple) -> frozenset:
+        """
+        Tokens that, once taken out of both lists, leave the same list: the
+        ones outside a longest common subsequence of old and new.
+        """
+        # Usual case: tokens added or removed, the others still in the same order
+        old_counts, new_counts = Counter(old), Counter(new)
+        changed = {t for t in old_counts.keys() | new_counts.keys() if old_counts[t] != new_counts[t]}
+        if [t for t in old if t not in changed] == [t for t in new if t not in changed]:
+            return frozenset(changed)
+
+        # Reordered: lengths[i][j] is the LCS length of old[i:] and new[j:]
+        n, m = len(old), len(new)
+        lengths = [[0] * (m + 1) for _ in range(n + 1)]
+        for i in range(n - 1, -1, -1):
+            row, below = lengths[i], lengths[i + 1]
+            for j in range(m - 1, -1, -1):
+                row[j] = below[j + 1] + 1 if old[i] == new[j] else max(below[j], row[j + 1])
+        changed = set()
+        i = j = 0
+        while i < n and j < m:
+            if old[i] == new[j]:
+                i += 1
+                j += 1
+            elif lengths[i + 1][j] >= lengths[i][j + 1]:
+                changed.add(old[i])
+                i += 1
+            else:
+                changed.add(new[j])
+                j += 1
+        changed.update(old[i:])
+        changed.update(new[j:])
+        return frozenset(changed)
+
+    def _is_valid(self, entry: list, excluded: tuple, changed: frozenset,
+                  parser: MetadataParser, filename: str) -> bool:
+        if entry[1] is None:
+            entry[1] = parser.exclusion_probe(filename)
+        probe = entry[1]
+        probe_chars = set(probe)
+        if any(probe_chars.issuperset(token) for token in changed):
+            old = entry[0]
+            if any(token in probe for token in (*old, *excluded)):
+                if ([t for t in old if probe_chars.issuperset(t)] !=
+                        [t for t in excluded if probe_chars.issuperset(t)]):
+                    return False
+        entry[0] = excluded
+        return True
+
+    def extract_many(self, parser: MetadataParser, paths: Iterable[FileLike], workers: Optional[int] = None) -> List[Dict[str, str]]:
+        """
+        Same as parser.extract_many, but only parses files without a valid cached result.
+        Returns fresh dicts that callers may modify.
+        """
+        with METRICS.stage("parse.cache"):
+            return self._extract_many(parser, list(paths), workers)
+
+    def _extract_many(self, parser: MetadataParser, paths: List[FileLike], workers: Optional[int]) -> List[Dict[str, str]]:
+        excluded = tuple(parser.excluded_tokens)
+        if excluded == self._excluded:
+            excluded = self._excluded # So that up-to-date entries pass the identity check
+        self._excluded = excluded
+        changes: Dict[int, Tuple[tuple, frozenset]] = {} # Entries share a few token tuples: compared once each
+        # This parser's entries, moved to the most recently used end
+        entries = self._entries.pop(parser.fingerprint, None) or {}
+        self._entries[parser.fingerprint] = entries
+
+        results: List[Optional[Dict[str, str]]] = [None] * len(paths)
+        missing = []
+        for i, file in enumerate(paths):
+            if isinstance(file, str):
+                path, filename = file, os.path.basename(file)
+            else:
+                path, filename = file.path, file.name
+            entry = entries.get(filename)
+            if entry is not None and entry[0] is not excluded:
+                memo = changes.get(id(entry[0]))
+                if memo is None:
+                    memo = changes[id(entry[0])] = (entry[0], self._changed_tokens(entry[0], excluded))
+                if not self._is_valid(entry, excluded, memo[1], parser, filename):
+                    entry = None
+            if entry is not None:
+                del entries[filename]
+                entries[filename] = entry # Most recently used
+                extension = file.extension if not isinstance(file, str) else os.path.splitext(filename)[1]
+                results[i] = {
+                    "original_name": filename,
+                    "filepath": path,
+                    "extension": extension,
+                    "student_id": entry[2],
+                    "name": entry[3],
+                    "project": entry[4],
+                    "class_name": entry[5]
+                }
+            else:
+                missing.append(i)
+
+        self.hits += len(paths) - len(missing)
+        self.misses += len(missing)
+        METRICS.count("parse.cache_hits", len(paths) - len(missing))
+        METRICS.count("parse.cache_misses", len(missing))
+
+        if missing:
+            parsed = parser.extract_many([paths[i] for i in missing], workers=workers)
+            for i, meta in zip(missing, parsed):
+                filename = meta["original_name"]
+                if entries.pop(filename, None) is None:
+                    self._size += 1
+                entries[filename] = [excluded, None, meta["student_id"], meta["name"],
+                                     meta["project"], meta["class_name"]]
+                results[i] = meta
+            if self._size > self.max_entries:
+                self._evict(self._size - self.max_entries)
+
+        return results
+
+    def _evict(self, count: int):
+        """Drops the count least recently used entries"""
+        for fingerprint in list(self._entries):
+            entries = self._entries[fingerprint]
+            if len(entries) <= count:
+                del self._entries[fingerprint]
+                removed = len(entries)
+            else:
+                for filename in list(islice(entries, count)):
+                    del entries[filename]
+                removed = count
+            self._size -= removed
+            count -= removed
+            if count <= 0:
+                break
@@ -0,0 +1,317 @@
+import os
+import uuid
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from core.journal import JOURNAL_SYNC_EVERY
+from core.metrics import METRICS
+from core.renamer import rename_batch, rename_file
+
+# What to do when a file's new name is already taken (by a file not being
+# renamed, or by another file of the same batch)
+CONFLICT_COUNTER = "counter" # Append " (2)", " (3)", ... to the new name
+CONFLICT_SKIP = "skip" # Leave the file alone and report it as failed
+
+# Per-item outcome of a plan
+PLAN_RENAME = "rename"
+PLAN_UNCHANGED = "unchanged" # New name equals the current one
+PLAN_SKIPPED = "skipped" # Conflict under CONFLICT_SKIP
+
+# Only paths containing this can be archive members (core.archives.group_members)
+_ARCHIVE_MARKER = ".zip" + os.sep
+
+
+def _key(name: str) -> str:
+    # Compare names case-insensitively: macOS and Windows filesystems are
+    # case-insensitive, and on case-sensitive ones this is merely conservative
+    return name.casefold()
+
+
+def _suffixed_name(name: str, taken: set, counters: Dict[str, int]) -> str:
+    """First free "stem (n).ext"; counters remembers n per name so repeats stay O(1)"""
+    stem, ext = os.path.splitext(name)
+    n = counters.get(_key(name), 2)
+    while True:
+        candidate = f"{stem} ({n}){ext}"
+        n += 1
+        if _key(candidate) not in taken:
+            counters[_key(name)] = n
+            return candidate
+
+
+class RenamePlan:
+    """
+    A conflict-free, ordered set of renames for one batch.
+
+    Attributes:
+        items: The requested (old_path, new_name) pairs.
+        targets: Final new name per item (differs from the request when a
+            suffix was added to resolve a conflict).
+        actions: PLAN_RENAME / PLAN_UNCHANGED / PLAN_SKIPPED per item.
+        steps: (item index, src_path, dst_path) in execution order. Cycles
+            (A -> B, B -> A) and case-only renames go through a temporary name,
+            so an item can have two steps.
+    """
+
+    def __init__(self, items: Sequence[Tuple[str, str]]):
+        self.items = list(items)
+        self.targets: List[str] = [new_name for _, new_name in self.items]
+        self.actions: List[str] = [PLAN_RENAME] * len(self.items)
+        self.steps: List[Tuple[int, str, str]] = []
+        self.batch_id: Optional[str] = None # Set by execute_plan when journaled
+
+    @property
+    def conflicts(self) -> int:
+        """Number of items whose requested name could not be used as-is"""
+        return sum(1 for i, (_, new_name) in enumerate(self.items)
+                   if self.actions[i] == PLAN_SKIPPED or self.targets[i] != new_name)
+
+
+def _listdir(directory: str) -> List[str]:
+    """os.listdir, falling back to core.archives.listdir (imported on first use) for folders inside archives"""
+    try:
+        return os.listdir(directory)
+    except OSError:
+        from core import archives
+        return archives.listdir(directory)
+
+
+def plan_renames(items: Sequence[Tuple[str, str]],
+                 policy: str = CONFLICT_COUNTER,
+                 listdir: Callable[[str], List[str]] = _listdir) -> RenamePlan:
+    """
+    Resolves a whole batch before anything is renamed.
+
+    Duplicate targets are found with one hash index per directory. Names
+    taken on disk by files outside the batch also count as conflicts. Chains
+    (A -> B while B -> C) are ordered so that every target is free when its
+    rename runs, and cycles are broken through a temporary name.
+
+    Args:
+        items: (old_path, new_name) pairs.
+        policy: CONFLICT_COUNTER or CONFLICT_SKIP.
+        listdir: Lists a directory's current names (called once per directory;
+            the default also lists folders inside zip archives).
+    """
+    plan = RenamePlan(items)
+
+    with METRICS.stage("plan"):
+        by_dir: Dict[str, List[int]] = {}
+        for i, (old_path, _) in enumerate(plan.items):
+            by_dir.setdefault(os.path.dirname(old_path), []).append(i)
+
+        for directory, indices in by_dir.items():
+            try:
+                on_disk = {_key(n) for n in listdir(directory)}
+            except OSError:
+                on_disk = set()
+            _plan_directory(plan, directory, indices, on_disk, policy)
+    if METRICS.enabled:
+        METRICS.count("plan.conflicts", plan.conflicts)
+    return plan
+
+
+def _plan_directory(plan: RenamePlan, directory: str, indices: List[int], on_disk: set, policy: str):
+    source_name = {i: os.path.basename(plan.items[i][0]) for i in indices}
+
+    # Files that keep their name
+    moving = []
+    for i in indices:
+        if plan.targets[i] == source_name[i]:
+            plan.actions[i] = PLAN_UNCHANGED
+        else:
+            moving.append(i)
+
+    # Assign final targets. Under CONFLICT_SKIP a skipped file stays where it
+    # is and blocks its own name, which can create new conflicts: repeat until stable.
+    while True:
+        moving_sources = {_key(source_name[i]): i for i in moving}
+        claimed = set()
+        taken = set(on_disk) # Names a suffixed target must avoid: on disk now, or claimed
+        counters: Dict[str, int] = {}
+        newly_skipped = []
+        for i in moving:
+            target = plan.items[i][1]
+            k = _key(target)
+            blocked = k in claimed or (k in on_disk and k not in moving_sources)
+            if blocked:
+                if policy == CONFLICT_SKIP:
+                    newly_skipped.append(i)
+                    continue
+                target = _suffixed_name(target, taken, counters)
+                k = _key(target)
+            plan.targets[i] = target
+            claimed.add(k)
+            taken.add(k)
+        if not newly_skipped:
+            break
+        for i in newly_skipped:
+            plan.actions[i] = PLAN_SKIPPED
+            plan.targets[i] = source_name[i]
+        moving = [i for i in moving if plan.actions[i] == PLAN_RENAME]
+
+    # Each target is claimed once, so "i must wait for the file currently
+    # named like i's target to move away" forms disjoint chains and cycles.
+    moving_sources = {_key(source_name[i]): i for i in moving}
+    waits_for = {}
+    for i in moving:
+        j = moving_sources.get(_key(plan.targets[i]))
+        if j is not None:
+            waits_for[i] = j
+    waited_on = {j: i for i, j in waits_for.items()}
+
+    taken = on_disk.union(_key(plan.targets[i]) for i in moving)
+    done = set()
+
+    def path(name):
+        return os.path.join(directory, name)
+
+    # Chains: start at the end whose target is free, walk back along waited_on
+    for i in moving:
+        if i in done or i in waits_for:
+            continue
+        node = i
+        while node is not None and node not in done:
+            plan.steps.append((node, path(source_name[node]), path(plan.targets[node])))
+            done.add(node)
+            node = waited_on.get(node)
+
+    # Cycles (including case-only renames, which wait for themselves)
+    for i in moving:
+        if i in done:
+            continue
+        stem, ext = os.path.splitext(source_name[i])
+        temp = f".~{uuid.uuid4().hex[:8]}-{stem}{ext}"
+        while _key(temp) in taken:
+            temp = f".~{uuid.uuid4().hex[:8]}-{stem}{ext}"
+        taken.add(_key(temp))
+
+        plan.steps.append((i, path(source_name[i]), path(temp)))
+        done.add(i)
+        node = waited_on.get(i)
+        while node is not None and node not in done:
+            plan.steps.append((node, path(source_name[node]), path(plan.targets[node])))
+            done.add(node)
+            node = waited_on.get(node)
+        plan.steps.append((i, path(temp), path(plan.targets[i])))
+
+
+def execute_plan(plan: RenamePlan,
+                 progress: Optional[Callable[[int, int], None]] = None,
+                 should_stop: Optional[Callable[[], bool]] = None,
+                 journal=None,
+                 description: str = "") -> List[Optional[bool]]:
+    """
+    Runs a RenamePlan with rename_batch.
+
+    With a RenameJournal, the steps are journaled as one batch (id stored in
+    plan.batch_id): each slice of JOURNAL_SYNC_EVERY steps is logged and
+    fsync'd before it runs. Slices run one after another, so the order of a
+    chain that spans two slices is kept.
+
+    Members of zip archives are renamed after the files on disk, by
+    rewriting each archive once (core.archives.rename_members). A rewrite
+    replaces the whole archive atomically; with a journal, the archive's
+    renames are logged first, in the same batch, so undo covers them too.
+
+    Returns:
+        Per item: True if renamed (or unchanged), False if it failed or was
+        skipped, None if not attempted because of should_stop. A file left at
+        its temporary name (its cycle failed or was stopped) is moved back to
+        its old name.
+    """
+    results: List[Optional[bool]] = [None] * len(plan.items)
+    for i, action in enumerate(plan.actions):
+        if action == PLAN_UNCHANGED:
+            results[i] = True
+        elif action == PLAN_SKIPPED:
+            results[i] = False
+
+    # Archive members skip the step-by-step renames: their archive is rewritten
+    # with the final names at once, so chains and cycles need no ordering there
+    moving = [i for i, action in enumerate(plan.actions) if action == PLAN_RENAME]
+    moving_paths = [plan.items[i][0] for i in moving]
+    in_archive = {}
+    if any(_ARCHIVE_MARKER in path.lower() for path in moving_paths):
+        from core import archives # Only now: zipfile is slow to import at startup
+        in_archive = archives.group_members(moving_paths)
+    archive_items = {archive: [(moving[k], member) for k, member in members]
+                     for archive, members in in_archive.items()}
+    archived = {i for members in archive_items.values() for i, _ in members}
+    steps = [step for step in plan.steps if step[0] not in archived] if archived else plan.steps
+
+    # Items with two steps went through a temporary name (the first step's dst)
+    first_dst = {}
+    temp_path = {}
+    for i, _, dst in steps:
+        if i in first_dst:
+            temp_path[i] = first_dst[i]
+        else:
+            first_dst[i] = dst
+
+    renames = [(src, os.path.basename(dst)) for _, src, dst in steps]
+    if journal is None:
+        step_results = rename_batch(renames, progress=progress, should_stop=should_stop)
+    else:
+        plan.batch_id = journal.begin_batch(description)
+        step_results = []
+        inodes = {}
+        for start in range(0, len(renames), JOURNAL_SYNC_EVERY):
+            chunk = steps[start:start + JOURNAL_SYNC_EVERY]
+            logged = []
+            for i, src, dst in chunk:
+                if i in temp_path and i not in inodes:
+                    # Cycle member: the journal needs its inode (see RenameJournal.log_steps)
+                    try:
+                        inodes[i] = os.lstat(src).st_ino
+                    except OSError:
+                        inodes[i] = None
+                logged.append((src, dst, inodes.get(i)))
+            journal.log_steps(plan.batch_id, logged)
+            step_results.extend(rename_batch(
+                renames[start:start + JOURNAL_SYNC_EVERY],
+                progress=(lambda done, total, offset=start: progress(offset + done, len(renames))) if progress else None,
+                should_stop=should_stop
+            ))
+
+    step_ok: Dict[int, List[Optional[bool]]] = {}
+    for (i, _, _), ok in zip(steps, step_results):
+        step_ok.setdefault(i, []).append(ok)
+
+    for i, oks in step_ok.items():
+        if all(ok is None for ok in oks):
+            continue # Not attempted
+        results[i] = all(oks)
+        if i in temp_path and oks[0] and not oks[1]:
+            # Stranded at the temporary name: put it back
+            results[i] = False
+            rename_file(temp_path[i], os.path.basename(plan.items[i][0]))
+
+    for archive, members in archive_items.items():
+        if should_stop and should_stop():
+            break
+        new_names = {member: plan.targets[i] for i, member in members}
+        if journal is not None:
+            from zipfile import BadZipFile
+            try:
+                checks = archives.member_checks(archive)
+            except (OSError, BadZipFile):
+                checks = None
+            if checks is None or any(member not in checks for member in new_names):
+                for i, _ in members:
+                    results[i] = False # Unreadable, or changed since the scan
+                continue
+            journal.log_members(plan.batch_id, archive, [
+                (member, _member_target(member, new_name), checks[member]) for member, new_name in new_names.items()])
+        ok = archives.rename_members(archive, new_names)
+        for i, _ in members:
+            results[i] = ok
+
+    if journal is not None:
+        journal.end_batch(plan.batch_id, complete=None not in results)
+    return results
+
+
+def _member_target(member: str, new_name: str) -> str:
+    """Full name inside the archive of member renamed to new_name (it stays in its folder)"""
+    folder = member.rpartition("/")[0]
+    return f"{folder}/{new_name}" if folder else new_name
@@ -0,0 +1,114 @@
+import os
+import sys
+from typing import Dict, Iterable, Iterator, List, Optional
+
+from core.template import compile_template
+
+STATUS_READY = "Ready"
+STATUS_DONE = "Done"
+STATUS_ERROR = "Error"
+STATUS_DUPLICATE = "Duplicate" # Same content as a newer file (duplicate_of); left alone by renames
+
+
+class FileRecord:
+    """
+    One preview row: a file, its parsed metadata and its planned new name.
+
+    Slotted, with the directory, extension, project and class name interned,
+    so the strings shared by thousands of rows are stored once. Paths are
+    derived on access instead of being stored.
+    """
+    __slots__ = ("directory", "original_name", "extension", "student_id",
+                 "name", "project", "class_name", "new_name", "status", "duplicate_of")
+
+    def __init__(self, directory: str, original_name: str, extension: str, student_id: str,
+                 name: str, project: str, class_name: str, new_name: str, status: str = STATUS_READY):
+        self.directory = sys.intern(directory)
+        self.original_name = original_name
+        self.extension = sys.intern(extension)
+        self.student_id = student_id
+        self.name = name
+        self.project = sys.intern(project)
+        self.class_name = sys.intern(class_name)
+        self.new_name = new_name
+        self.status = status
+        self.duplicate_of = None # Path of the kept copy, when status is STATUS_DUPLICATE
+
+    @classmethod
+    def from_meta(cls, meta: Dict[str, str], new_name: str, directory: Optional[str] = None) -> "FileRecord":
+        """Builds a record from an extract_metadata result (directory: the file's, if already known)"""
+        return cls(
+            directory if directory is not None else os.path.dirname(meta["filepath"]),
+            meta["original_name"],
+            meta["extension"],
+            meta["student_id"],
+            meta["name"],
+            meta["project"],
+            meta["class_name"],
+            new_name
+        )
+
+    @property
+    def filepath(self) -> str:
+        return os.path.join(self.directory, self.original_name)
+
+    @property
+    def new_path(self) -> str:
+        return os.path.join(self.directory, self.new_name)
+
+    def meta(self) -> Dict[str, str]:
+        """The record as an extract_metadata-style dict (for generate_new_name)"""
+        return {
+            "original_name": self.original_name,
+            "filepath": self.filepath,
+            "extension": self.extension,
+            "student_id": self.student_id,
+            "name": self.name,
+            "project": self.project,
+            "class_name": self.class_name
+        }
+
+
+class RecordStore:
+    """
+    The rows of one preview. All rows share the format string they were
+    named with, so it is stored once here rather than per row.
+    """
+
+    def __init__(self, fmt_str: str = ""):
+        self.fmt_str = fmt_str
+        self.records: List[FileRecord] = []
+
+    def rename_all(self, fmt_str: str):
+        """Re-names every row with a new format string, without parsing again"""
+        self.fmt_str = fmt_str
+        render = compile_template(fmt_str).render_fields
+        for r in self.records:
+            r.new_name = render(r.student_id, r.name, r.project, r.class_name, r.original_name, r.extension)
+
+    def extend(self, records: Iterable[FileRecord]):
+        self.records.extend(records)
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def __getitem__(self, index):
+        return self.records[index]
+
+    def __iter__(self) -> Iterator[FileRecord]:
+        return iter(self.records)
+
+    def mark_duplicates(self, duplicates: Dict[str, str]) -> int:
+        """
+        Flags the rows whose file is a key of duplicates ({path: kept path}, from
+        find_duplicates) and clears the flag on the others. Returns the number flagged.
+        """
+        flagged = 0
+        for r in self.records:
+            kept = duplicates.get(r.filepath) if duplicates else None
+            if kept is not None:
+                r.status, r.duplicate_of = STATUS_DUPLICATE, kept
+                flagged += 1
+            elif r.status == STATUS_DUPLICATE:
+                r.status, r.duplicate_of = STATUS_READY, None
+        return flagged
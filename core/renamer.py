@@ -1,30 +1,150 @@
+import logging
 import os
-import shutil
+import threading
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from core.metrics import METRICS
+
+logger = logging.getLogger(__name__)
+
+# Renames are I/O bound (each one is a round trip on SMB/NFS), so threads help
+RENAME_WORKERS = 8
+# Seconds between progress callbacks
+PROGRESS_INTERVAL = 0.1
 
 def rename_file(old_path: str, new_name: str) -> bool:
     """
     Renames a file.
-    
+
     Args:
         old_path: The absolute path to the existing file.
         new_name: The new filename (including extension).
-        
+
     Returns:
         True if successful, False otherwise.
     """
     try:
         directory = os.path.dirname(old_path)
         new_path = os.path.join(directory, new_name)
-        
+
         if os.path.exists(new_path):
             # Simple conflict resolution: don't overwrite, just fail or skip for now
             # Or maybe append a counter?
             # For this MVP, let's just skip to avoid data loss
-            print(f"Target file already exists: {new_path}")
+            logger.warning("Target file already exists: %s", new_path)
             return False
-            
+
         os.rename(old_path, new_path)
         return True
     except Exception as e:
-        print(f"Error renaming {old_path} to {new_name}: {e}")
+        logger.warning("Error renaming %s to %s: %s", old_path, new_name, e)
         return False
+
+
+def _group_renames(items: Sequence[Tuple[str, str]]) -> List[List[int]]:
+    """
+    Splits a batch into groups that can safely run concurrently.
+
+    Renames in different directories never interfere. Within a directory, two
+    renames interfere when they share a source or target name (compared
+    case-insensitively, for macOS/Windows filesystems): e.g. two sources mapping
+    to the same target, or A -> B while B -> C. Interfering renames are chained
+    with union-find into one group that runs serially, in input order.
+    """
+    parent: Dict[tuple, tuple] = {}
+
+    def find(key):
+        root = key
+        while parent[root] != root:
+            root = parent[root]
+        while parent[key] != root:
+            parent[key], key = root, parent[key]
+        return root
+
+    def union(a, b):
+        parent.setdefault(a, a)
+        parent.setdefault(b, b)
+        ra, rb = find(a), find(b)
+        if ra != rb:
+            parent[rb] = ra
+
+    for old_path, new_name in items:
+        directory, old_name = os.path.split(old_path)
+        union((directory, old_name.casefold()), (directory, new_name.casefold()))
+
+    groups: Dict[tuple, List[int]] = {}
+    for i, (old_path, _) in enumerate(items):
+        directory, old_name = os.path.split(old_path)
+        groups.setdefault(find((directory, old_name.casefold())), []).append(i)
+    return list(groups.values())
+
+
+def rename_batch(items: Sequence[Tuple[str, str]],
+                 workers: int = RENAME_WORKERS,
+                 progress: Optional[Callable[[int, int], None]] = None,
+                 should_stop: Optional[Callable[[], bool]] = None) -> List[Optional[bool]]:
+    """
+    Renames many files across a thread pool.
+
+    Renames that could interfere with each other (see _group_renames) run
+    serially in one task; everything else runs concurrently.
+
+    Args:
+        items: (old_path, new_name) pairs, as for rename_file.
+        workers: Maximum number of concurrent renames.
+        progress: Called as progress(done, total) from the calling thread at
+            most every PROGRESS_INTERVAL seconds, and once at the end.
+        should_stop: Polled before each rename; when it returns True, remaining
+            renames are skipped.
+
+    Returns:
+        One entry per item, in input order: True/False as from rename_file,
+        or None if the rename was skipped because of should_stop.
+    """
+    results: List[Optional[bool]] = [None] * len(items)
+    if not items:
+        if progress:
+            progress(0, 0)
+        return results
+
+    with METRICS.stage("rename"):
+        _run_groups(items, results, workers, progress, should_stop)
+    if METRICS.enabled:
+        METRICS.count("rename.done", results.count(True))
+        METRICS.count("rename.failed", results.count(False))
+        METRICS.count("rename.stopped", results.count(None))
+    return results
+
+
+def _run_groups(items: Sequence[Tuple[str, str]],
+                results: List[Optional[bool]],
+                workers: int,
+                progress: Optional[Callable[[int, int], None]],
+                should_stop: Optional[Callable[[], bool]]):
+    """Runs rename_batch's groups on a thread pool, filling in results"""
+    # Imported here so that starting the app does not pay for concurrent.futures
+    from concurrent.futures import ThreadPoolExecutor, wait
+
+    total = len(items)
+    groups = _group_renames(items)
+    done_per_group = [0] * len(groups)
+    stop_event = threading.Event()
+
+    def run_group(g: int):
+        for i in groups[g]:
+            if stop_event.is_set() or (should_stop and should_stop()):
+                stop_event.set()
+                return
+            old_path, new_name = items[i]
+            results[i] = rename_file(old_path, new_name)
+            done_per_group[g] += 1
+
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(groups)))) as pool:
+        pending = {pool.submit(run_group, g) for g in range(len(groups))}
+        while pending:
+            _, pending = wait(pending, timeout=PROGRESS_INTERVAL)
+            if progress and pending:
+                progress(sum(done_per_group), total)
+
+    if progress:
+        progress(sum(done_per_group), total)
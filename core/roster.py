@@ -0,0 +1,200 @@
+"""
+Class roster: the students' real IDs and names, loaded from a CSV file.
+
+With a roster the parser no longer has to guess: a filename is resolved to a
+student by one indexed lookup (the ID, else the name, else an alias), and a
+missing ID is filled in from the name or the other way round.
+
+CSV columns: 学号/ID, 姓名/name, then optionally 班级/class and 别名/alias
+(pinyin or English names, several separated by ; or |). With a header row
+the columns may come in any order; without one they are taken in that order.
+"""
+import re
+from typing import Dict, List, Optional, Tuple
+
+# Header names per column, compared case-insensitively
+ROSTER_COLUMNS = {
+    "id": ("学号", "id", "student_id", "student id", "工号", "编号"),
+    "name": ("姓名", "name", "student_name", "名字"),
+    "class_name": ("班级", "class", "class_name", "班"),
+    "aliases": ("别名", "alias", "aliases", "拼音", "pinyin", "english", "english name", "英文名"),
+}
+
+# Aliases are matched as up to this many consecutive words ("zhang san feng")
+MAX_ALIAS_WORDS = 4
+
+_ALIAS_SPLIT = re.compile(r'[;|；]')
+_DIGITS = re.compile(r'\d+')
+# Words of a filename for alias matching: CamelCase and letter/other boundaries split
+_WORD = re.compile(r'[A-Z]?[a-z]+|[A-Z]+(?![a-z])')
+
+# Marks the end of a name in the trie
+_END = ""
+
+# How a file was resolved
+MATCH_ID = "id"
+MATCH_NAME = "name"
+MATCH_ALIAS = "alias"
+
+
+class Student:
+    """One roster row."""
+    __slots__ = ("id", "name", "class_name", "aliases")
+
+    def __init__(self, student_id: str, name: str, class_name: str = "", aliases: Tuple[str, ...] = ()):
+        self.id = student_id
+        self.name = name
+        self.class_name = class_name
+        self.aliases = aliases
+
+    def __repr__(self) -> str:
+        return f"Student({self.id!r}, {self.name!r})"
+
+
+def _alias_key(text: str) -> str:
+    """Normalizes an alias: "Zhang San", "zhang_san" and "ZhangSan" all give zhangsan"""
+    return "".join(w.lower() for w in _WORD.findall(text))
+
+
+class Roster:
+    """
+    Indexes over the students of a roster:
+
+        by_id     ID -> Student (hash map)
+        name trie character trie of the names, for finding any of them in a
+                  filename in one left-to-right scan
+        aliases   normalized alias (lowercase letters only) -> Student
+
+    Names or aliases shared by several students are kept out of the indexes:
+    such a file can only be resolved by its ID.
+    """
+
+    def __init__(self, students: List[Student]):
+        self.students = list(students)
+        self.by_id: Dict[str, Student] = {}
+        self._trie: dict = {}
+        self.aliases: Dict[str, Student] = {}
+
+        names: Dict[str, List[Student]] = {}
+        aliases: Dict[str, List[Student]] = {}
+        for student in self.students:
+            if student.id:
+                self.by_id[student.id] = student
+            if student.name:
+                names.setdefault(student.name, []).append(student)
+            # An English name in the name column is matched like an alias
+            for alias in (student.name, *student.aliases):
+                key = _alias_key(alias)
+                if key:
+                    aliases.setdefault(key, []).append(student)
+
+        for name, students_with_name in names.items():
+            if len(students_with_name) == 1:
+                node = self._trie
+                for char in name:
+                    node = node.setdefault(char, {})
+                node[_END] = students_with_name[0]
+        self.aliases = {key: found[0] for key, found in aliases.items() if len(found) == 1}
+
+        # Identifies the roster's content in parse cache keys
+        import hashlib # Imported here so that starting the app does not pay for hashlib
+        digest = hashlib.sha1()
+        for s in self.students:
+            digest.update("\t".join((s.id, s.name, s.class_name, *s.aliases)).encode("utf-8") + b"\n")
+        self.fingerprint = digest.hexdigest()
+
+    def __len__(self) -> int:
+        return len(self.students)
+
+    @classmethod
+    def load(cls, path: str) -> "Roster":
+        """
+        Reads a roster CSV (UTF-8, with or without BOM).
+
+        Raises:
+            OSError if the file cannot be read, ValueError if it has no
+            usable ID or name column.
+        """
+        import csv # Imported here so that starting the app does not pay for csv
+        with open(path, encoding="utf-8-sig", newline="") as f:
+            rows = [row for row in csv.reader(f) if any(cell.strip() for cell in row)]
+        if not rows:
+            raise ValueError("花名册为空")
+
+        header = [cell.strip().lower() for cell in rows[0]]
+        columns = {}
+        for field, names in ROSTER_COLUMNS.items():
+            for i, cell in enumerate(header):
+                if cell in names:
+                    columns[field] = i
+                    break
+        if columns:
+            rows = rows[1:]
+        else:
+            columns = {field: i for i, field in enumerate(ROSTER_COLUMNS)}
+        if "id" not in columns and "name" not in columns:
+            raise ValueError("花名册中没有学号或姓名列")
+
+        def cell(row, field):
+            i = columns.get(field)
+            return row[i].strip() if i is not None and i < len(row) else ""
+
+        students = []
+        for row in rows:
+            aliases = tuple(a.strip() for a in _ALIAS_SPLIT.split(cell(row, "aliases")) if a.strip())
+            student = Student(cell(row, "id"), cell(row, "name"), cell(row, "class_name"), aliases)
+            if student.id or student.name:
+                students.append(student)
+        return cls(students)
+
+    def find_name(self, text: str) -> Optional[Student]:
+        """First roster name in text (the longest one at that position)"""
+        trie = self._trie
+        for start in range(len(text)):
+            node = trie.get(text[start])
+            found = None
+            i = start
+            while node is not None:
+                if _END in node:
+                    found = node[_END]
+                i += 1
+                if i == len(text):
+                    break
+                node = node.get(text[i])
+            if found is not None:
+                return found
+        return None
+
+    def find_alias(self, text: str) -> Optional[Student]:
+        """First alias in text, matched on whole words ("ZhangSan", "zhang_san", "Zhang San")"""
+        if not self.aliases:
+            return None
+        words = [w.lower() for w in _WORD.findall(text)]
+        for start in range(len(words)):
+            key = ""
+            for word in words[start:start + MAX_ALIAS_WORDS]:
+                key += word
+                student = self.aliases.get(key)
+                if student is not None:
+                    return student
+        return None
+
+    def resolve(self, text: str) -> Tuple[Optional[Student], Optional[str]]:
+        """
+        The student a filename (without extension) belongs to, and how it was
+        found (MATCH_ID / MATCH_NAME / MATCH_ALIAS), or (None, None).
+        A roster ID in the name wins over a name, and a name over an alias.
+        """
+        by_id = self.by_id
+        if by_id:
+            for digits in _DIGITS.findall(text):
+                student = by_id.get(digits)
+                if student is not None:
+                    return student, MATCH_ID
+        student = self.find_name(text)
+        if student is not None:
+            return student, MATCH_NAME
+        student = self.find_alias(text)
+        if student is not None:
+            return student, MATCH_ALIAS
+        return None, None
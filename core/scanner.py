@@ -1,29 +1,549 @@
+import fnmatch
+import logging
 import os
-from typing import List, Generator
+import re
+import sys
+from typing import Dict, List, Generator, Iterable, Iterator, Optional, Tuple
 
-def scan_directory(root_path: str, ignore_hidden: bool = True) -> Generator[str, None, None]:
+from core.metrics import METRICS
+
+logger = logging.getLogger(__name__)
+
+SYSTEM_FILES = {'.DS_Store', 'Thumbs.db'}
+
+
+def _compile_globs(patterns: Iterable[str]):
+    """
+    Compiles glob patterns into two matchers (or None): one for the patterns
+    without a "/", tested against names, and one for the others, tested
+    against paths relative to the scanned root.
+    """
+    names, paths = [], []
+    for pattern in patterns:
+        pattern = pattern.replace("\\", "/").strip("/")
+        if pattern:
+            (paths if "/" in pattern else names).append(fnmatch.translate(pattern))
+    return tuple(re.compile("|".join(group), re.IGNORECASE).match if group else None
+                 for group in (names, paths))
+
+
+def _normalize_extension(extension: str) -> str:
+    extension = extension.strip().lower()
+    return extension if extension.startswith(".") else "." + extension
+
+
+class ScanFilter:
+    """
+    Which files a scan keeps: include/exclude globs, include/exclude extensions
+    and a maximum depth, evaluated while walking.
+
+    All include globs are compiled into one regex, and so are all exclude
+    globs, so an entry is tested once whatever the number of patterns. A glob
+    without "/" is matched against file and directory names ("__MACOSX",
+    "*.zip"), one with "/" against the path relative to the root
+    ("build/*"). Matching is case-insensitive. Directories matching an
+    exclude glob, or deeper than max_depth, are pruned without being listed;
+    include globs and extensions only select files.
+
+    max_depth 0 keeps only the files directly in the root, 1 also those of
+    its subdirectories, and so on; None means no limit. The members of a
+    scanned archive stand in for the archive: a member is as deep as the
+    archive plus its folders inside it ("a.zip/x.pdf" in the root is at
+    depth 0, "a.zip/inner/x.pdf" at depth 1).
+    """
+
+    def __init__(self, include: Iterable[str] = (), exclude: Iterable[str] = (),
+                 extensions: Iterable[str] = (), exclude_extensions: Iterable[str] = (),
+                 max_depth: Optional[int] = None):
+        self.include = tuple(include)
+        self.exclude = tuple(exclude)
+        self.extensions = frozenset(_normalize_extension(e) for e in extensions if e.strip())
+        self.exclude_extensions = frozenset(_normalize_extension(e) for e in exclude_extensions if e.strip())
+        self.max_depth = max_depth
+        self._include_name, self._include_path = _compile_globs(self.include)
+        self._exclude_name, self._exclude_path = _compile_globs(self.exclude)
+        self._key = (self.include, self.exclude, self.extensions, self.exclude_extensions, max_depth)
+
+    def __bool__(self) -> bool:
+        """False if the filter keeps everything"""
+        return self._key != ((), (), frozenset(), frozenset(), None)
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, ScanFilter) and self._key == other._key
+
+    def __hash__(self) -> int:
+        return hash(self._key)
+
+    def __repr__(self) -> str:
+        return "ScanFilter(include=%r, exclude=%r, extensions=%r, exclude_extensions=%r, max_depth=%r)" % (
+            self.include, self.exclude, sorted(self.extensions), sorted(self.exclude_extensions), self.max_depth)
+
+    def accepts_dir(self, name: str, rel_dir: str) -> bool:
+        """Whether to descend into subdirectory name of rel_dir ("" for the root)"""
+        if self.max_depth is not None:
+            depth = rel_dir.count("/") + 2 if rel_dir else 1
+            if depth > self.max_depth:
+                return False
+        if self._exclude_name is not None and self._exclude_name(name):
+            return False
+        if self._exclude_path is not None and self._exclude_path(rel_dir + "/" + name if rel_dir else name):
+            return False
+        return True
+
+    def accepts_file(self, name: str, rel_dir: str, depth: Optional[int] = None) -> bool:
+        """
+        Whether to keep file name of rel_dir ("" for the root). The walk only
+        lists directories within max_depth; depth is given for files it has
+        not checked (archive members).
+        """
+        if depth is not None and self.max_depth is not None and depth > self.max_depth:
+            return False
+        if self.extensions or self.exclude_extensions:
+            extension = os.path.splitext(name)[1].lower()
+            if self.extensions and extension not in self.extensions:
+                return False
+            if extension in self.exclude_extensions:
+                return False
+        if self._exclude_name is not None and self._exclude_name(name):
+            return False
+        rel_path = None
+        if self._exclude_path is not None:
+            rel_path = rel_dir + "/" + name if rel_dir else name
+            if self._exclude_path(rel_path):
+                return False
+        if self._include_name is None and self._include_path is None:
+            return True
+        if self._include_name is not None and self._include_name(name):
+            return True
+        if self._include_path is not None:
+            if rel_path is None:
+                rel_path = rel_dir + "/" + name if rel_dir else name
+            return self._include_path(rel_path) is not None
+        return False
+
+
+class FileEntry:
+    """
+    One scanned file (or directory), split once while walking.
+
+    Size, mtime and inode come from the os.DirEntry the walk already has, so
+    building a FileEntry costs no more than the stat the scan needs anyway,
+    and later stages read name/stem/extension instead of splitting the path
+    again. The directory and the extension are interned: they are shared by
+    many files.
+
+    A member of a zip archive (see core.archives) has a virtual path below
+    the archive and archive set to the archive's path.
+    """
+    __slots__ = ("path", "directory", "name", "stem", "extension", "inode", "size", "mtime", "is_dir", "archive")
+
+    def __init__(self, path: str, directory: str, name: str, stem: str, extension: str,
+                 inode: int = 0, size: int = 0, mtime: float = 0.0, is_dir: bool = False,
+                 archive: Optional[str] = None):
+        self.path = path
+        self.directory = sys.intern(directory)
+        self.name = name
+        self.stem = stem
+        self.extension = sys.intern(extension)
+        self.inode = inode
+        self.size = size
+        self.mtime = mtime
+        self.is_dir = is_dir
+        self.archive = archive
+
+    @classmethod
+    def from_dir_entry(cls, entry: os.DirEntry, directory: str, is_dir: bool = False) -> "FileEntry":
+        """Builds a FileEntry for an entry of directory, reusing the entry's cached stat"""
+        try:
+            st = entry.stat(follow_symlinks=not is_dir)
+            size, mtime = st.st_size, st.st_mtime
+            inode = entry.inode() or st.st_ino # 0 on Windows until stat'ed
+        except OSError:
+            size, mtime, inode = 0, 0.0, 0
+        if is_dir:
+            stem, extension = entry.name, ""
+        else:
+            stem, extension = os.path.splitext(entry.name)
+        return cls(entry.path, directory, entry.name, stem, extension, inode, size, mtime, is_dir)
+
+    def __repr__(self) -> str:
+        return f"FileEntry({self.path!r})"
+
+
+def _archive_members(path: str, root_path: str, ignore_hidden: bool,
+                     scan_filter: Optional[ScanFilter]) -> Optional[List[FileEntry]]:
+    """
+    The members of a zip file passing scan_filter, or None if it cannot be
+    read as one. A .zip file is let through the filter by _scan_dir (its
+    members are filtered instead), so an unreadable one that does not pass
+    it gives no files rather than None.
+    """
+    # Imported here: core.archives imports this module
+    from zipfile import BadZipFile
+    from core.archives import is_archive, list_members
+    if not is_archive(path):
+        return None
+
+    def accepts(name, directory, depth=None):
+        return scan_filter.accepts_file(name, os.path.relpath(directory, root_path).replace(os.sep, "/"), depth)
+
+    try:
+        members = list_members(path, ignore_hidden)
+    except (OSError, BadZipFile) as e:
+        logger.debug("Cannot list archive %s: %s", path, e)
+        if scan_filter is not None and not accepts(os.path.basename(path), os.path.dirname(path)):
+            return []
+        return None
+    if scan_filter is not None:
+        # Depth of the archive itself, plus the member's folders inside it
+        archive_dir = os.path.relpath(os.path.dirname(path), root_path)
+        depth = archive_dir.count(os.sep) + 1 if archive_dir != os.curdir else 0
+        prefix = len(path) + 1
+        members = [m for m in members if accepts(m.name, m.directory, depth + m.path.count(os.sep, prefix))]
+    return members
+
+
+def _scan_dir(dirpath: str, ignore_hidden: bool = True, scan_filter: Optional[ScanFilter] = None,
+              rel_dir: str = "", archives: bool = False) -> Tuple[List[os.DirEntry], List[os.DirEntry]]:
+    """
+    Lists a single directory with os.scandir.
+
+    Args:
+        scan_filter: Files and subdirectories to keep; rel_dir is dirpath
+            relative to the scanned root ("/"-separated, "" for the root).
+        archives: Keep .zip files whatever scan_filter says; their members
+            are filtered when the archive is listed.
+
+    Returns:
+        (file entries, subdirectory entries), both in listing order.
+        Symlinked directories are not returned as subdirectories.
+
+    Raises:
+        OSError if the directory cannot be read.
+    """
+    if archives and scan_filter is not None:
+        from core.archives import is_archive
+    files = []
+    subdirs = []
+    with os.scandir(dirpath) as it:
+        for entry in it:
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                is_dir = False
+
+            if is_dir:
+                # Skip hidden directories
+                if ignore_hidden and entry.name.startswith('.'):
+                    continue
+                # Pruned here, so an excluded tree is never listed
+                if scan_filter is not None and not scan_filter.accepts_dir(entry.name, rel_dir):
+                    continue
+                if not entry.is_symlink():
+                    subdirs.append(entry)
+                continue
+
+            if ignore_hidden:
+                if entry.name.startswith('.'):
+                    continue
+                if entry.name in SYSTEM_FILES:
+                    continue
+            if scan_filter is not None and not scan_filter.accepts_file(entry.name, rel_dir):
+                if not (archives and is_archive(entry.name)):
+                    continue
+
+            files.append(entry)
+    return files, subdirs
+
+
+def _walk_entries(root_path: str, ignore_hidden: bool = True, scan_filter: Optional[ScanFilter] = None,
+                  include_dirs: bool = False, archives: bool = False) -> Iterator[Tuple[str, os.DirEntry, bool]]:
+    """
+    Walks a directory tree with os.scandir, yielding (directory, entry, is_dir).
+
+    The traversal order matches os.walk (top-down): the files of a directory
+    come first (then its subdirectories themselves, with include_dirs), then
+    each subdirectory is walked in listing order. Symlinked directories are
+    not followed, and unreadable directories are skipped.
+    """
+    scan_filter = scan_filter or None
+    stack = [(root_path, "")]
+    while stack:
+        dirpath, rel_dir = stack.pop()
+        try:
+            files, subdirs = _scan_dir(dirpath, ignore_hidden, scan_filter, rel_dir, archives)
+        except OSError:
+            continue
+
+        for entry in files:
+            yield dirpath, entry, False
+        if include_dirs:
+            for entry in subdirs:
+                yield dirpath, entry, True
+
+        # Reversed so that the first subdirectory is walked first
+        prefix = rel_dir + "/" if rel_dir else ""
+        stack.extend((sub.path, prefix + sub.name) for sub in reversed(subdirs))
+
+
+def scan_directory(root_path: str, ignore_hidden: bool = True, scan_filter: Optional[ScanFilter] = None,
+                   archives: bool = False) -> Generator[str, None, None]:
     """
     Recursively scans a directory for files.
-    
+
     Args:
         root_path: The root directory to scan.
         ignore_hidden: Whether to ignore hidden files (starting with .) and system files.
-        
+        scan_filter: Globs, extensions and depth limit restricting the scan.
+        archives: List the files inside .zip archives (as virtual paths below
+            the archive) instead of the archives themselves.
+
     Yields:
         Absolute paths to files found.
     """
-    system_files = {'.DS_Store', 'Thumbs.db'}
-    
-    for dirpath, dirnames, filenames in os.walk(root_path):
-        # Modify dirnames in-place to skip hidden directories
-        if ignore_hidden:
-            dirnames[:] = [d for d in dirnames if not d.startswith('.')]
-            
-        for filename in filenames:
-            if ignore_hidden:
-                if filename.startswith('.'):
+    scan_filter = scan_filter or None
+    for _, entry, _ in _walk_entries(root_path, ignore_hidden, scan_filter, archives=archives):
+        if archives:
+            members = _archive_members(entry.path, root_path, ignore_hidden, scan_filter)
+            if members is not None:
+                yield from (m.path for m in members)
+                continue
+        yield entry.path
+
+
+def scan_entries(root_path: str, ignore_hidden: bool = True, scan_filter: Optional[ScanFilter] = None,
+                 include_dirs: bool = False, archives: bool = False) -> Generator[FileEntry, None, None]:
+    """
+    Same walk as scan_directory, yielding FileEntry records instead of paths.
+
+    Args:
+        include_dirs: Also yield the subdirectories walked (is_dir=True).
+    """
+    scan_filter = scan_filter or None
+    for directory, entry, is_dir in _walk_entries(root_path, ignore_hidden, scan_filter, include_dirs, archives):
+        if archives and not is_dir:
+            members = _archive_members(entry.path, root_path, ignore_hidden, scan_filter)
+            if members is not None:
+                yield from members
+                continue
+        yield FileEntry.from_dir_entry(entry, directory, is_dir)
+
+
+class _DirListing:
+    """Cached listing of one directory: its mtime, its files and its subdirectories."""
+    __slots__ = ("mtime_ns", "files", "subdirs")
+
+    def __init__(self, mtime_ns: int, files: List[FileEntry], subdirs: List[str]):
+        self.mtime_ns = mtime_ns
+        self.files = files
+        self.subdirs = subdirs
+
+
+class SnapshotDelta:
+    """Files added to and removed from a snapshot by DirectorySnapshot.refresh()."""
+
+    def __init__(self):
+        self.added: List[str] = []
+        self.removed: List[str] = []
+
+    def __bool__(self) -> bool:
+        return bool(self.added or self.removed)
+
+    def __repr__(self) -> str:
+        return f"SnapshotDelta(added={len(self.added)}, removed={len(self.removed)})"
+
+
+class DirectorySnapshot:
+    """
+    A listing of a directory tree taken with a single os.scandir walk.
+
+    The ID detector, the token detector and the preview all read from the same
+    snapshot, so selecting a folder walks the tree only once. Per-file data is
+    exposed as FileEntry records (entries) and as parallel lists, in the same
+    order scan_directory would yield it.
+
+    The snapshot is kept up to date in place with refresh(): only directories
+    whose mtime changed (or that a filesystem watcher reported) are listed
+    again, so unchanged files are never re-stat'ed.
+    """
+
+    def __init__(self, root_path: str, ignore_hidden: bool = True, scan_filter: Optional[ScanFilter] = None,
+                 archives: bool = False):
+        self.root_path = root_path
+        self.ignore_hidden = ignore_hidden
+        self.scan_filter = scan_filter or None
+        self.archives = archives # Zip archives are listed as their members (see scan_directory)
+        self._dirs: Dict[str, _DirListing] = {}
+        self._columns = None
+        with METRICS.stage("scan"):
+            added = []
+            self._load_tree(root_path, added)
+        METRICS.count("scan.dirs", len(self._dirs))
+        METRICS.count("scan.files", len(added))
+
+    # ---- Scanning ----
+
+    def _list_dir(self, dirpath: str) -> Optional[_DirListing]:
+        rel_dir = ""
+        if self.scan_filter is not None and dirpath != self.root_path:
+            rel_dir = os.path.relpath(dirpath, self.root_path).replace(os.sep, "/")
+        try:
+            mtime_ns = os.stat(dirpath).st_mtime_ns
+            entries, subdirs = _scan_dir(dirpath, self.ignore_hidden, self.scan_filter, rel_dir, self.archives)
+        except OSError:
+            return None
+
+        files = []
+        for entry in entries:
+            if self.archives:
+                members = _archive_members(entry.path, self.root_path, self.ignore_hidden, self.scan_filter)
+                if members is not None:
+                    files.extend(members)
                     continue
-                if filename in system_files:
+            files.append(FileEntry.from_dir_entry(entry, dirpath))
+        return _DirListing(mtime_ns, files, [entry.path for entry in subdirs])
+
+    def _load_tree(self, top: str, added: List[str]):
+        """Lists top and everything below it, recording new file paths in added"""
+        stack = [top]
+        while stack:
+            dirpath = stack.pop()
+            listing = self._list_dir(dirpath)
+            if listing is None:
+                continue
+            self._dirs[dirpath] = listing
+            added.extend(f.path for f in listing.files)
+            stack.extend(reversed(listing.subdirs))
+
+    def _drop_tree(self, top: str, removed: List[str]):
+        """Forgets top and everything below it, recording the dropped file paths"""
+        prefix = top + os.sep
+        for dirpath in [d for d in self._dirs if d == top or d.startswith(prefix)]:
+            listing = self._dirs.pop(dirpath)
+            removed.extend(f.path for f in listing.files)
+
+    def refresh(self, dirs: Optional[Iterable[str]] = None) -> SnapshotDelta:
+        """
+        Brings the snapshot up to date with the disk.
+
+        Args:
+            dirs: Directories known to have changed (e.g. from a filesystem
+                watcher); these are listed again unconditionally. If omitted,
+                every known directory is polled and only those whose mtime
+                changed are listed again.
+
+        Returns:
+            The files added and removed since the last scan. A rename shows up
+            as one removal plus one addition.
+        """
+        with METRICS.stage("scan.refresh"):
+            delta = self._refresh(dirs)
+        METRICS.count("scan.added", len(delta.added))
+        METRICS.count("scan.removed", len(delta.removed))
+        return delta
+
+    def _refresh(self, dirs: Optional[Iterable[str]]) -> SnapshotDelta:
+        delta = SnapshotDelta()
+        forced = dirs is not None
+        candidates = list(dirs) if forced else list(self._dirs)
+
+        for dirpath in candidates:
+            old = self._dirs.get(dirpath)
+            if old is None:
+                continue  # Unknown, or already dropped with a parent
+
+            if not forced:
+                try:
+                    if os.stat(dirpath).st_mtime_ns == old.mtime_ns:
+                        continue
+                except OSError:
+                    pass
+
+            METRICS.count("scan.relisted")
+            new = self._list_dir(dirpath)
+            if new is None:
+                self._drop_tree(dirpath, delta.removed)
+                continue
+            self._dirs[dirpath] = new
+
+            # By path: archive members of one directory can share a name
+            old_paths = {f.path for f in old.files}
+            new_paths = {f.path for f in new.files}
+            delta.removed.extend(f.path for f in old.files if f.path not in new_paths)
+            delta.added.extend(f.path for f in new.files if f.path not in old_paths)
+
+            for sub in set(old.subdirs) - set(new.subdirs):
+                self._drop_tree(sub, delta.removed)
+            for sub in new.subdirs:
+                if sub not in self._dirs:
+                    self._load_tree(sub, delta.added)
+
+        if delta:
+            self._columns = None
+        return delta
+
+    # ---- Flat views ----
+
+    @property
+    def directories(self) -> List[str]:
+        """All directories currently in the snapshot (for filesystem watchers)"""
+        return list(self._dirs)
+
+    def _build_columns(self):
+        if self._columns is None:
+            entries = []
+            stack = [self.root_path]
+            while stack:
+                dirpath = stack.pop()
+                listing = self._dirs.get(dirpath)
+                if listing is None:
                     continue
-            
-            yield os.path.join(dirpath, filename)
+                entries.extend(listing.files)
+                stack.extend(reversed(listing.subdirs))
+            self._columns = {"entries": entries}
+        return self._columns
+
+    def _column(self, field: str) -> list:
+        columns = self._build_columns()
+        column = columns.get(field)
+        if column is None:
+            column = columns[field] = [getattr(e, field) for e in columns["entries"]]
+        return column
+
+    @property
+    def entries(self) -> List[FileEntry]:
+        return self._build_columns()["entries"]
+
+    @property
+    def paths(self) -> List[str]:
+        return self._column("path")
+
+    @property
+    def names(self) -> List[str]:
+        return self._column("name")
+
+    @property
+    def stems(self) -> List[str]:
+        return self._column("stem")
+
+    @property
+    def extensions(self) -> List[str]:
+        return self._column("extension")
+
+    @property
+    def sizes(self) -> List[int]:
+        return self._column("size")
+
+    @property
+    def mtimes(self) -> List[float]:
+        return self._column("mtime")
+
+    @property
+    def inodes(self) -> List[int]:
+        return self._column("inode")
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.paths)
@@ -0,0 +1,100 @@
+"""
+Naming format strings ("{student_id}-{name}-{project}") compiled once.
+
+MetadataParser.generate_new_name used to work the format string out again
+for every file: str.format with keyword arguments, a scan for the separator
+and a regex to collapse the separators left by empty fields. A NameTemplate
+does the parsing and the separator detection once; rendering a name is a
+positional format call plus plain string operations.
+"""
+import re
+from functools import lru_cache
+from string import Formatter
+from typing import Dict
+
+# Fields a format string may use, in the order render_fields takes them
+TEMPLATE_FIELDS = ("student_id", "name", "project", "class_name", "original_name")
+
+# Field name before any attribute or index ("name" in "{name[0]}")
+_FIELD_HEAD = re.compile(r'[^.\[]*')
+
+
+def _detect_separator(format_str: str) -> str:
+    """The separator of a format string: "_" or " " when it is the only one used, else "-" """
+    if "_" in format_str and "-" not in format_str:
+        return "_"
+    if " " in format_str and "-" not in format_str and "_" not in format_str:
+        return " "
+    return "-"
+
+
+class NameTemplate:
+    """
+    A compiled naming format string.
+
+    Fields left empty (no ID, no name, ...) leave doubled separators behind;
+    runs of the separator are collapsed to one and separators (and spaces)
+    at either end are dropped, so "2021--Project" becomes "2021-Project".
+
+    Format strings using field attributes or indexes ("{name[0]}") are
+    rendered with str.format and keyword arguments, like before.
+
+    Raises:
+        KeyError for a field not in TEMPLATE_FIELDS, ValueError for a
+        malformed format string (as str.format would).
+    """
+
+    def __init__(self, format_str: str):
+        self.format_str = format_str
+        self.fields = []
+        positional = []
+        simple = True
+        for literal, field, spec, conversion in Formatter().parse(format_str):
+            positional.append(literal.replace("{", "{{").replace("}", "}}"))
+            if field is None:
+                continue
+            if field not in TEMPLATE_FIELDS:
+                if _FIELD_HEAD.match(field).group() not in TEMPLATE_FIELDS:
+                    raise KeyError(field)
+                simple = False
+            if "{" in spec:
+                simple = False # Nested field in the format spec
+            self.fields.append(field)
+            positional.append("{%d%s%s}" % (TEMPLATE_FIELDS.index(field) if simple else 0,
+                                            "!" + conversion if conversion else "",
+                                            ":" + spec if spec else ""))
+        if simple:
+            self._format = "".join(positional).format
+        else:
+            self._format = lambda *values: format_str.format(**dict(zip(TEMPLATE_FIELDS, values)))
+        self.separator = _detect_separator(format_str)
+        self._double = self.separator * 2
+        self._strip = self.separator + " "
+
+    def render_fields(self, student_id: str, name: str, project: str, class_name: str,
+                      original_name: str, extension: str) -> str:
+        """The new filename (with extension) for one file's fields"""
+        if student_id == "NoID":
+            student_id = ""
+        text = self._format(student_id, name, project, class_name, original_name.replace(extension, ""))
+
+        if self.separator == " ":
+            text = " ".join(text.split())
+        else:
+            double = self._double
+            while double in text:
+                text = text.replace(double, self.separator)
+            text = text.strip(self._strip)
+        return text + extension
+
+    def render(self, metadata: Dict[str, str]) -> str:
+        """The new filename for an extract_metadata result"""
+        get = metadata.get
+        return self.render_fields(get("student_id", ""), get("name", ""), get("project", ""),
+                                  get("class_name", ""), get("original_name", ""), get("extension", ""))
+
+
+@lru_cache(maxsize=64)
+def compile_template(format_str: str) -> NameTemplate:
+    """The NameTemplate for format_str, compiled once and cached"""
+    return NameTemplate(format_str)
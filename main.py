@@ -1,4 +1,7 @@
 from ui.app import main
 
 if __name__ == "__main__":
+    # Needed for the parser's process pool in frozen (PyInstaller) builds
+    import multiprocessing
+    multiprocessing.freeze_support()
     main()
@@ -0,0 +1,176 @@
+import io
+import os
+import zipfile
+
+import pytest
+
+from core import archives
+from core.journal import RenameJournal
+from core.planner import execute_plan, plan_renames
+
+
+class Unseekable(io.RawIOBase):
+    """Write-only stream: zipfile then writes data descriptors after each member"""
+
+    def __init__(self):
+        self.data = bytearray()
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self.data += b
+        return len(b)
+
+
+def contents(path):
+    with zipfile.ZipFile(path) as zf:
+        assert zf.testzip() is None
+        return {archives.member_name(info): zf.read(info) for info in zf.infolist() if not info.is_dir()}
+
+
+@pytest.fixture
+def bundle(tmp_path):
+    path = str(tmp_path / "bundle.zip")
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr("2021001张三作业.docx", os.urandom(5000) * 3)
+        zf.writestr("sub/2021002李四作业.pdf", b"pdf" * 1000, compress_type=zipfile.ZIP_STORED)
+        zf.writestr("sub/", b"")
+        zf.writestr("__MACOSX/._x", b"fork")
+        zf.comment = b"class 1"
+    return path
+
+
+def test_list_members_skips_folders_and_resource_forks(bundle):
+    entries = archives.list_members(bundle)
+    assert [e.name for e in entries] == ["2021001张三作业.docx", "2021002李四作业.pdf"]
+    assert entries[1].path == os.path.join(bundle, "sub", "2021002李四作业.pdf")
+    assert all(e.archive == bundle for e in entries)
+    assert archives.split_member_path(entries[1].path) == (bundle, "sub/2021002李四作业.pdf")
+    assert sorted(archives.listdir(bundle)) == ["2021001张三作业.docx", "__MACOSX", "sub"]
+
+
+def test_rename_members_keeps_data_and_comment(bundle):
+    before = contents(bundle)
+    assert archives.rename_members(bundle, {"2021001张三作业.docx": "2021001-张三-作业.docx",
+                                            "sub/2021002李四作业.pdf": "2021002-李四-作业.pdf"})
+    after = contents(bundle)
+    assert after == {"2021001-张三-作业.docx": before["2021001张三作业.docx"],
+                     "sub/2021002-李四-作业.pdf": before["sub/2021002李四作业.pdf"],
+                     "__MACOSX/._x": b"fork"}
+    with zipfile.ZipFile(bundle) as zf:
+        assert zf.comment == b"class 1"
+        assert zf.getinfo("sub/").is_dir()
+    assert not [n for n in os.listdir(os.path.dirname(bundle)) if n.endswith(".tmp")]
+
+
+def test_gbk_names_without_utf8_flag(tmp_path):
+    # Written as by Chinese Windows: GBK bytes, no UTF-8 flag, data descriptors
+    stream = Unseekable()
+    with zipfile.ZipFile(stream, "w", zipfile.ZIP_DEFLATED) as zf:
+        with zf.open("placeholder12345678", "w") as f:
+            f.write(b"y" * 10000)
+    gbk_name = "2021200赵六作业.txt".encode("gbk")
+    assert len(gbk_name) == len("placeholder12345678")
+    path = str(tmp_path / "gbk.zip")
+    with open(path, "wb") as f:
+        f.write(bytes(stream.data).replace(b"placeholder12345678", gbk_name))
+
+    with zipfile.ZipFile(path) as zf:
+        assert zf.infolist()[0].flag_bits & 0x08 # Data descriptor
+    assert [e.name for e in archives.list_members(path)] == ["2021200赵六作业.txt"]
+
+    assert archives.rename_members(path, {"2021200赵六作业.txt": "2021200-赵六-作业.txt"})
+    assert contents(path) == {"2021200-赵六-作业.txt": b"y" * 10000}
+    with zipfile.ZipFile(path) as zf:
+        info = zf.infolist()[0]
+        assert info.flag_bits & 0x800 and not info.flag_bits & 0x08
+
+
+def test_unchanged_members_keep_their_stored_names(tmp_path):
+    path = str(tmp_path / "mixed.zip")
+    with zipfile.ZipFile(path, "w") as zf:
+        zf.writestr("keep.txt", b"1")
+        zf.writestr("作业.txt", b"2")
+    assert archives.rename_members(path, {"keep.txt": "renamed.txt"})
+    assert contents(path) == {"renamed.txt": b"1", "作业.txt": b"2"}
+
+
+def test_zip64_records(tmp_path, monkeypatch):
+    path = str(tmp_path / "big.zip")
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as zf:
+        for i in range(5):
+            with zf.open(f"{i}.txt", "w", force_zip64=True) as f:
+                f.write(str(i).encode() * 1000)
+    before = contents(path)
+    # Every size, offset and count goes through the ZIP64 records
+    monkeypatch.setattr(archives, "_ZIP64_LIMIT", 1)
+    monkeypatch.setattr(archives, "_ZIP64_COUNT_LIMIT", 1)
+    assert archives.rename_members(path, {"3.txt": "three.txt"})
+    with open(path, "rb") as f:
+        data = f.read()
+    assert b"PK\006\006" in data and b"PK\006\007" in data
+    after = contents(path)
+    assert after.pop("three.txt") == before.pop("3.txt")
+    assert after == before
+
+
+def test_unreadable_archive_is_left_alone(tmp_path):
+    path = str(tmp_path / "broken.zip")
+    with open(path, "wb") as f:
+        f.write(b"not a zip")
+    assert not archives.rename_members(path, {"a": "b"})
+    with open(path, "rb") as f:
+        assert f.read() == b"not a zip"
+    assert os.listdir(tmp_path) == ["broken.zip"]
+
+
+def test_rename_inside_archive_is_journaled_and_undone(tmp_path, bundle):
+    disk = tmp_path / "2021003王五作业.pdf"
+    disk.write_text("disk")
+    items = [(os.path.join(bundle, "2021001张三作业.docx"), "2021001-张三-作业.docx"),
+             (os.path.join(bundle, "sub", "2021002李四作业.pdf"), "2021002-李四-作业.pdf"),
+             (str(disk), "2021003-王五-作业.pdf")]
+    before = contents(bundle)
+    journal = RenameJournal(str(tmp_path / "journal.jsonl"))
+    assert execute_plan(plan_renames(items), journal=journal) == [True, True, True]
+    assert "sub/2021002-李四-作业.pdf" in contents(bundle)
+
+    # As after a restart: everything comes from the journal file
+    journal = RenameJournal(str(tmp_path / "journal.jsonl"))
+    batch, = journal.undoable_batches()
+    assert (batch.member_count, batch.step_count, batch.file_count) == (2, 1, 3)
+    assert journal.undo_batch(batch) == (3, [])
+    assert contents(bundle) == before
+    assert disk.exists()
+    assert journal.undoable_batches() == []
+
+
+def test_undo_tells_swapped_members_apart(tmp_path):
+    path = str(tmp_path / "swap.zip")
+    with zipfile.ZipFile(path, "w") as zf:
+        zf.writestr("a.txt", b"A")
+        zf.writestr("b.txt", b"B")
+    journal = RenameJournal(str(tmp_path / "journal.jsonl"))
+    items = [(os.path.join(path, "a.txt"), "b.txt"), (os.path.join(path, "b.txt"), "a.txt")]
+    plan = plan_renames(items)
+    assert execute_plan(plan, journal=journal) == [True, True]
+    assert contents(path) == {"a.txt": b"B", "b.txt": b"A"}
+    batch, = journal.undoable_batches()
+    assert journal.undo_batch(batch) == (2, [])
+    assert contents(path) == {"a.txt": b"A", "b.txt": b"B"}
+
+
+def test_rollback_after_crash_before_rewrite(tmp_path):
+    path = str(tmp_path / "swap.zip")
+    with zipfile.ZipFile(path, "w") as zf:
+        zf.writestr("a.txt", b"A")
+        zf.writestr("b.txt", b"B")
+    journal = RenameJournal(str(tmp_path / "journal.jsonl"))
+    # Logged, then the app died before rewriting the archive
+    batch_id = journal.begin_batch("crash")
+    checks = archives.member_checks(path)
+    journal.log_members(batch_id, path, [("a.txt", "b.txt", checks["a.txt"]), ("b.txt", "a.txt", checks["b.txt"])])
+    batch, = journal.incomplete_batches()
+    assert journal.undo_batch(batch) == (0, [])
+    assert contents(path) == {"a.txt": b"A", "b.txt": b"B"}
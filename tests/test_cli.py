@@ -0,0 +1,89 @@
+import csv
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from core.cli import main
+from core.journal import RenameJournal
+
+FILES = ["2021001张三实验报告.pdf", "2021002李四-实验报告.docx", "实验报告_2021003王五.pdf", "2021004赵六实验报告 - 副本.pdf"]
+
+
+@pytest.fixture
+def folder(tmp_path):
+    root = tmp_path / "hw"
+    root.mkdir()
+    for name in FILES:
+        (root / name).write_text(name, encoding="utf-8")
+    return root
+
+
+def run_cli(tmp_path, *args):
+    report = tmp_path / "report.out"
+    code = main([*map(str, args), "--output", str(report), "--journal", str(tmp_path / "journal.jsonl"),
+                 "--workers", "1", "-q"])
+    return code, report.read_text(encoding="utf-8") if report.exists() else ""
+
+
+def test_dry_run_reports_without_renaming(tmp_path, folder):
+    code, report = run_cli(tmp_path, folder, "--dry-run", "--id-length", "7")
+    assert code == 0
+    rows = {os.path.basename(row["path"]): row for row in json.loads(report)}
+    assert rows["2021001张三实验报告.pdf"]["new_name"] == "2021001-张三-实验报告.pdf"
+    assert rows["实验报告_2021003王五.pdf"]["new_name"] == "2021003-王五-实验报告.pdf"
+    assert {row["status"] for row in rows.values()} == {"rename"}
+    assert sorted(os.listdir(folder)) == sorted(FILES)
+
+
+def test_csv_report_with_options(tmp_path, folder):
+    code, report = run_cli(tmp_path, folder, "--dry-run", "--format", "csv", "--id-length", "7",
+                           "--project", "Lab1", "--separator", "_", "--pattern", "name-id-project",
+                           "--class-name", "1班", "--class-position", "start")
+    assert code == 0
+    rows = list(csv.DictReader(report.splitlines()))
+    assert list(rows[0]) == ["path", "new_name", "status", "student_id", "name", "project", "class_name"]
+    names = {os.path.basename(row["path"]): row["new_name"] for row in rows}
+    assert names["2021002李四-实验报告.docx"] == "1班_李四_2021002_Lab1.docx"
+
+
+def test_rename_is_journaled(tmp_path, folder):
+    code, report = run_cli(tmp_path, folder, "--id-length", "7", "--include", ".pdf")
+    assert code == 0
+    assert {row["status"] for row in json.loads(report)} == {"done"}
+    assert sorted(os.listdir(folder)) == ["2021001-张三-实验报告.pdf", "2021002李四-实验报告.docx",
+                                          "2021003-王五-实验报告.pdf", "2021004-赵六-实验报告.pdf"]
+
+    journal = RenameJournal(str(tmp_path / "journal.jsonl"))
+    assert journal.undo_batch(journal.undoable_batches()[0]) == (3, [])
+    assert sorted(os.listdir(folder)) == sorted(FILES)
+
+
+def test_conflicts_and_duplicates(tmp_path, folder):
+    (folder / "2021001张三实验报告 (2).pdf").write_text(FILES[0], encoding="utf-8")
+    code, report = run_cli(tmp_path, folder, "--dry-run", "--id-length", "7", "--conflict", "skip")
+    assert code == 0
+    rows = {os.path.basename(row["path"]): row for row in json.loads(report)}
+    assert {rows[name]["status"] for name in ("2021001张三实验报告.pdf", "2021001张三实验报告 (2).pdf")} == {"rename", "skipped"}
+
+    code, report = run_cli(tmp_path, folder, "--dry-run", "--id-length", "7", "--duplicates")
+    assert code == 0
+    rows = json.loads(report)
+    duplicates = [row for row in rows if row["status"] == "duplicate"]
+    assert len(duplicates) == 1 and duplicates[0]["duplicate_of"]
+    assert all(row["duplicate_of"] == "" for row in rows if row["status"] != "duplicate")
+
+
+def test_usage_errors(tmp_path, folder):
+    assert run_cli(tmp_path, tmp_path / "missing", "--dry-run")[0] == 2
+    assert run_cli(tmp_path, folder, "--dry-run", "--roster", tmp_path / "missing.csv")[0] == 2
+    (tmp_path / "empty").mkdir()
+    assert run_cli(tmp_path, tmp_path / "empty", "--dry-run")[0] == 2 # No project name to detect
+
+
+def test_no_qt_import():
+    code = "import sys, core.cli; sys.exit(any(m.startswith('PyQt6') for m in sys.modules))"
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    assert subprocess.run([sys.executable, "-c", code], cwd=root).returncode == 0
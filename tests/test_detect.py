@@ -0,0 +1,116 @@
+import random
+import re
+from collections import Counter
+
+import pytest
+
+from core.detect import TokenIndex, estimate_id_length
+
+WORDS = ["作业", "实验报告", "张三", "李四", "王小明", "第一次", "数据结构", "期末大作业",
+         "Lab", "lab", "LAB", "Report", "report", "hw", "Homework", "x", "字"]
+
+
+def reference_stats(stems, ignored_words):
+    """Token detection of the original app (detect_common_tokens), without the UI"""
+    ignored_chinese = [w for w in ignored_words if re.match(r'[\u4e00-\u9fa5]+', w)]
+    ignored_english = [w.lower() for w in ignored_words if re.match(r'[a-zA-Z]+', w)]
+    token_counts = Counter()
+    token_original_case = {}
+    for stem in stems:
+        for token in re.findall(r'[\u4e00-\u9fa5]+|[a-zA-Z]+', stem):
+            if re.match(r'[\u4e00-\u9fa5]+', token):
+                if len(token) < 2 or token in ignored_chinese:
+                    continue
+            elif len(token) <= 2 or token.lower() in ignored_english:
+                continue
+            token_counts[token.lower()] += 1
+            token_original_case.setdefault(token.lower(), token)
+    if not token_counts:
+        return None
+    most_common = token_original_case[token_counts.most_common(1)[0][0]]
+    recommended = []
+    for token_lower, _ in token_counts.most_common(20)[1:]:
+        token = token_original_case[token_lower]
+        if not re.match(r'[\u4e00-\u9fa5]+', token) or len(token) > 5:
+            continue
+        recommended.append(token)
+        if len(recommended) >= 4:
+            break
+    common = [t for t, count in token_counts.items() if count > len(stems) * 0.8]
+    return most_common, recommended, common
+
+
+def random_stems(rng, count):
+    return ["".join(rng.choice(WORDS + [str(rng.randrange(10 ** 9, 10 ** 10)), "_", "-"])
+                    for _ in range(rng.randint(1, 6))) for _ in range(count)]
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_stats_match_original_detection(seed):
+    rng = random.Random(seed)
+    stems = random_stems(rng, rng.randint(1, 60))
+    ignored = rng.sample(["作业", "lab", "REPORT", "张三", "字", "12"], rng.randint(0, 3))
+    index = TokenIndex()
+    index.add_files(range(len(stems)), stems)
+    stats = index.stats(ignored)
+    expected = reference_stats(stems, ignored)
+    if expected is None:
+        assert stats is None
+    else:
+        assert (stats.project, stats.recommended, stats.common_tokens) == expected
+
+
+def test_incremental_updates_match_a_fresh_index():
+    rng = random.Random(1)
+    stems = dict(enumerate(random_stems(rng, 200)))
+    index = TokenIndex()
+    index.add_files(stems, stems.values())
+    removed = rng.sample(sorted(stems), 80)
+    index.remove_files(removed, [stems.pop(i) for i in removed])
+    added = {i: stem for i, stem in enumerate(random_stems(rng, 30), start=1000)}
+    index.add_files(added, added.values())
+    stems.update(added)
+
+    fresh = TokenIndex()
+    fresh.add_files(stems, stems.values())
+    assert index.file_count == fresh.file_count == len(stems)
+    assert index.counts == fresh.counts
+    assert index.files == fresh.files
+    assert index.id_lengths == fresh.id_lengths
+
+
+def test_files_with_is_case_insensitive():
+    index = TokenIndex()
+    index.add_files(["a", "b", "c"], ["Lab1", "LAB作业", "作业"])
+    assert index.files_with("lab") == {"a", "b"}
+    assert index.files_with("作业") == {"b", "c"}
+    assert index.files_with("missing") == set()
+
+
+def histogram(lengths):
+    counts = [0] * 16
+    for length, count in lengths.items():
+        counts[length] = count
+    return counts
+
+
+@pytest.mark.parametrize("lengths, text, confidence", [
+    ({}, "8-12", 0.0),
+    ({10: 50}, "10", 1.0),
+    ({8: 30, 10: 20}, "8-10", 1.0), # Two ID formats in one class
+    ({10: 95, 4: 5}, "10", 0.95), # Stray years stay out
+    ({10: 60, 11: 5, 13: 35}, "10", 0.6), # Too far from the mode
+    ({9: 25, 10: 25}, "9-10", 1.0), # Ties go to the longer length, the other joins
+])
+def test_estimate_id_length(lengths, text, confidence):
+    estimate = estimate_id_length(histogram(lengths), 100)
+    assert estimate.text == text
+    assert estimate.confidence == pytest.approx(confidence)
+
+
+def test_id_length_uses_longest_digit_run_per_file():
+    index = TokenIndex()
+    index.add_files(range(3), ["2024_2021001234_作业", "2021001235张三", "第1次"])
+    assert index.id_lengths[10] == 2 and index.id_lengths[4] == 0
+    estimate = index.id_length()
+    assert (estimate.text, estimate.candidates, estimate.file_count) == ("10", 2, 3)
@@ -0,0 +1,76 @@
+import hashlib
+import os
+import zipfile
+
+import pytest
+
+from core import duplicates
+from core.duplicates import PARTIAL_BLOCK, find_duplicates, full_hash, partial_hash
+from core.scanner import scan_entries
+
+
+def write(path, data, mtime=None):
+    path.write_bytes(data)
+    if mtime is not None:
+        os.utime(path, (mtime, mtime))
+    return str(path)
+
+
+def found(root, **kwargs):
+    return find_duplicates(list(scan_entries(str(root), include_dirs=True, **kwargs)))
+
+
+def test_copies_point_to_the_newest_file(tmp_path):
+    (tmp_path / "sub").mkdir()
+    data = os.urandom(1000)
+    old = write(tmp_path / "作业.docx", data, mtime=1000)
+    new = write(tmp_path / "sub" / "作业 - 副本.docx", data, mtime=2000)
+    older = write(tmp_path / "作业 (2).docx", data, mtime=500)
+    write(tmp_path / "other.docx", os.urandom(1000))
+    write(tmp_path / "short.docx", data[:999])
+    assert found(tmp_path) == {old: new, older: new}
+
+
+def test_first_in_scan_order_wins_a_tie(tmp_path):
+    data = b"same"
+    paths = [write(tmp_path / f"{n}.txt", data, mtime=1000) for n in "abc"]
+    order = [e.path for e in scan_entries(str(tmp_path))]
+    kept = order[0]
+    assert found(tmp_path) == {p: kept for p in paths if p != kept}
+
+
+@pytest.mark.parametrize("size", [2 * PARTIAL_BLOCK + 1, 5 * PARTIAL_BLOCK])
+def test_large_files_differing_in_the_middle(tmp_path, monkeypatch, size):
+    monkeypatch.setattr(duplicates, "HASH_CHUNK", 4096) # Several updates per file
+    data = bytearray(os.urandom(size))
+    a = write(tmp_path / "a.bin", bytes(data), mtime=1000)
+    data[size // 2] ^= 0xFF
+    write(tmp_path / "b.bin", bytes(data))
+    c = write(tmp_path / "c.bin", (tmp_path / "a.bin").read_bytes(), mtime=2000)
+    assert partial_hash(a, size) == partial_hash(str(tmp_path / "b.bin"), size)
+    assert full_hash(a) == full_hash(c) != full_hash(str(tmp_path / "b.bin"))
+    assert found(tmp_path) == {a: c}
+
+
+def test_full_hash_covers_the_whole_file(tmp_path):
+    data = os.urandom(3 * PARTIAL_BLOCK + 17)
+    path = write(tmp_path / "x.bin", data)
+    assert full_hash(path) == hashlib.blake2b(data, digest_size=16).digest()
+    assert full_hash(write(tmp_path / "empty", b"")) == hashlib.blake2b(b"", digest_size=16).digest()
+
+
+def test_empty_files_and_archive_members_are_ignored(tmp_path):
+    write(tmp_path / "a.txt", b"")
+    write(tmp_path / "b.txt", b"")
+    with zipfile.ZipFile(tmp_path / "bundle.zip", "w") as zf:
+        zf.writestr("one.txt", b"content")
+        zf.writestr("two.txt", b"content")
+    assert found(tmp_path, archives=True) == {}
+
+
+def test_unreadable_files_are_skipped(tmp_path):
+    data = os.urandom(100)
+    paths = [write(tmp_path / f"{n}.txt", data, mtime=t) for n, t in (("a", 1), ("b", 2), ("c", 3))]
+    entries = list(scan_entries(str(tmp_path)))
+    os.remove(paths[2]) # Deleted since the scan
+    assert find_duplicates(entries) == {paths[0]: paths[1]}
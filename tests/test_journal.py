@@ -0,0 +1,142 @@
+import os
+
+import pytest
+
+from core.journal import RenameJournal
+from core.planner import execute_plan, plan_renames
+from core.renamer import rename_file
+
+
+def make_files(directory, names):
+    for name in names:
+        (directory / name).write_text(name, encoding="utf-8")
+
+
+def listing(directory):
+    return {name: (directory / name).read_text(encoding="utf-8")
+            for name in os.listdir(directory) if name != "journal.jsonl"}
+
+
+def test_undo_after_restart(tmp_path):
+    make_files(tmp_path, ["a.txt", "b.txt", "c.txt"])
+    journal_path = str(tmp_path / "journal.jsonl")
+    plan = plan_renames([(str(tmp_path / "a.txt"), "b.txt"), (str(tmp_path / "b.txt"), "a.txt"),
+                         (str(tmp_path / "c.txt"), "d.txt")])
+    assert execute_plan(plan, journal=RenameJournal(journal_path), description="batch") == [True, True, True]
+
+    journal = RenameJournal(journal_path) # A fresh instance reads everything back from disk
+    batches = journal.undoable_batches()
+    assert [b.id for b in batches] == [plan.batch_id]
+    assert batches[0].description == "batch"
+    restored, failed = journal.undo_batch(batches[0])
+    assert (restored, failed) == (3, [])
+    assert listing(tmp_path) == {"a.txt": "a.txt", "b.txt": "b.txt", "c.txt": "c.txt"}
+    assert RenameJournal(journal_path).undoable_batches() == []
+
+
+def test_crash_mid_batch_is_rolled_back(tmp_path):
+    make_files(tmp_path, ["a.txt", "b.txt"])
+    journal = RenameJournal(str(tmp_path / "journal.jsonl"))
+    batch_id = journal.begin_batch("crashed")
+    journal.log_steps(batch_id, [(str(tmp_path / "a.txt"), str(tmp_path / "x.txt")),
+                                 (str(tmp_path / "b.txt"), str(tmp_path / "y.txt"))])
+    rename_file(str(tmp_path / "a.txt"), "x.txt") # Only the first step ran before the "crash"
+    with open(journal.path, "a", encoding="utf-8") as f:
+        f.write('{"op": "step", "batch"') # Torn last line
+
+    journal = RenameJournal(journal.path)
+    assert journal.undoable_batches() == []
+    incomplete = journal.incomplete_batches()
+    assert [b.id for b in incomplete] == [batch_id]
+    restored, failed = journal.undo_batch(incomplete[0])
+    assert (restored, failed) == (1, [])
+    assert listing(tmp_path) == {"a.txt": "a.txt", "b.txt": "b.txt"}
+    assert RenameJournal(journal.path).incomplete_batches() == []
+
+
+@pytest.mark.parametrize("steps_run", [0, 1, 2, 3])
+def test_interrupted_swap_is_told_apart_by_inode(tmp_path, steps_run):
+    # a <-> b goes through a temporary name. Before the first step and after
+    # the last one, both names exist: only the inode tells the states apart.
+    make_files(tmp_path, ["a.txt", "b.txt"])
+    journal = RenameJournal(str(tmp_path / "journal.jsonl"))
+    plan = plan_renames([(str(tmp_path / "a.txt"), "b.txt"), (str(tmp_path / "b.txt"), "a.txt")])
+    assert len(plan.steps) == 3
+    cycled = plan.steps[0][0]
+    ino = os.lstat(plan.steps[0][1]).st_ino
+    batch_id = journal.begin_batch()
+    journal.log_steps(batch_id, [(src, dst, ino if i == cycled else None) for i, src, dst in plan.steps])
+    for _, src, dst in plan.steps[:steps_run]:
+        assert rename_file(src, os.path.basename(dst))
+
+    restored, failed = journal.undo_batch(journal.incomplete_batches()[0])
+    assert failed == []
+    assert listing(tmp_path) == {"a.txt": "a.txt", "b.txt": "b.txt"}
+
+
+def test_files_renamed_again_are_reported(tmp_path):
+    make_files(tmp_path, ["a.txt", "b.txt"])
+    journal = RenameJournal(str(tmp_path / "journal.jsonl"))
+    plan = plan_renames([(str(tmp_path / "a.txt"), "x.txt"), (str(tmp_path / "b.txt"), "y.txt")])
+    execute_plan(plan, journal=journal)
+    rename_file(str(tmp_path / "x.txt"), "moved.txt")
+
+    restored, failed = journal.undo_batch(journal.undoable_batches()[0])
+    assert restored == 1
+    assert failed == [str(tmp_path / "a.txt")]
+    assert listing(tmp_path) == {"moved.txt": "a.txt", "b.txt": "b.txt"}
+
+
+def test_undo_is_journaled_and_stoppable(tmp_path):
+    make_files(tmp_path, ["a.txt"])
+    journal = RenameJournal(str(tmp_path / "journal.jsonl"))
+    execute_plan(plan_renames([(str(tmp_path / "a.txt"), "b.txt")]), journal=journal)
+    batch = journal.undoable_batches()[0]
+
+    assert journal.undo_batch(batch, should_stop=lambda: True) == (0, [])
+    assert listing(tmp_path) == {"b.txt": "a.txt"}
+    batch = journal.undoable_batches()[0] # A stopped undo leaves the batch undoable
+    journal.undo_batch(batch)
+    undo = journal.batches()[-1]
+    assert undo.undoes == batch.id and undo.ended
+    assert listing(tmp_path) == {"a.txt": "a.txt"}
+
+
+def test_batches_are_indexed_without_their_steps(tmp_path):
+    make_files(tmp_path, ["a.txt", "b.txt", "c.txt"])
+    journal = RenameJournal(str(tmp_path / "journal.jsonl"))
+    # The swap goes through a temporary name: 4 steps for 3 files
+    plan = plan_renames([(str(tmp_path / "a.txt"), "b.txt"), (str(tmp_path / "b.txt"), "a.txt"),
+                         (str(tmp_path / "c.txt"), "d.txt")])
+    execute_plan(plan, journal=journal, description="batch")
+
+    batch, = RenameJournal(journal.path).undoable_batches()
+    assert (batch.step_count, batch.member_count, batch.file_count) == (4, 0, 3)
+    assert batch.steps is None and batch.members is None
+    journal.load_steps([batch])
+    assert [step[:2] for step in batch.steps] == [step[1:] for step in plan.steps]
+    assert batch.members == []
+
+
+def test_file_count_of_older_and_crashed_batches(tmp_path):
+    path = tmp_path / "journal.jsonl"
+    lines = ['{"op": "begin", "batch": "old", "time": 1, "description": "old"}',
+             '{"op": "step", "batch": "old", "src": "/d/a", "dst": "/d/.~1-a"}',
+             '{"op": "step", "batch": "crash", "src": "/d/x", "dst": "/d/y"}', # Before its begin: ignored
+             '{"op": "begin", "batch": "crash", "time": 2, "description": "crash"}',
+             '{"op": "step", "batch": "old", "src": "/d/b", "dst": "/d/a"}',
+             '{"op": "step", "batch": "old", "src": "/d/.~1-a", "dst": "/d/b"}',
+             '{"op": "end", "batch": "old", "complete": true}', # No file count: written by an older version
+             '{"op": "step", "batch": "crash", "src": "/d/p", "dst": "/d/q"}',
+             '{"op": "step", "batch": "crash", "src": "/d/q\\"', # Torn by the crash
+             '{"op": "member", "batch": "crash", "archive": "/d/z.zip", "src": "m", "dst": "n", "crc": 1, "size": 2}']
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    journal = RenameJournal(str(path))
+    batches = journal.batches()
+    undoable, incomplete = journal.undoable_batches(batches), journal.incomplete_batches(batches)
+    assert [b.id for b in undoable] == ["old"] and [b.id for b in incomplete] == ["crash"]
+    assert [(b.step_count, b.member_count, b.file_count) for b in batches] == [(3, 0, None), (1, 1, None)]
+
+    journal.count_files(batches)
+    assert [b.file_count for b in batches] == [2, 2]
+    assert all(b.steps is None for b in batches)
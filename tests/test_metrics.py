@@ -0,0 +1,98 @@
+import json
+
+import pytest
+
+from core.cli import main
+from core.metrics import METRICS, Metrics
+from core.parser import MetadataParser
+from core.renamer import rename_batch
+from core.scanner import DirectorySnapshot
+
+FILES = ["2021001张三实验报告.pdf", "2021002李四-实验报告.docx", "实验报告_2021003王五.pdf"]
+
+
+@pytest.fixture
+def metrics():
+    """The shared METRICS, enabled and empty for one test"""
+    METRICS.reset()
+    METRICS.enabled = True
+    yield METRICS
+    METRICS.enabled = False
+    METRICS.reset()
+
+
+@pytest.fixture
+def folder(tmp_path):
+    root = tmp_path / "hw"
+    root.mkdir()
+    for name in FILES:
+        (root / name).write_text(name, encoding="utf-8")
+    return root
+
+
+def test_stages_nest_and_accumulate():
+    m = Metrics(enabled=True)
+    for _ in range(2):
+        with m.stage("outer"):
+            with m.stage("inner"):
+                pass
+    m.count("items", 3)
+    m.count("items")
+    report = m.report()
+    assert {name: s["calls"] for name, s in report["stages"].items()} == {"outer": 2, "inner": 2}
+    assert report["stages"]["outer"]["seconds"] >= report["stages"]["inner"]["seconds"] >= 0
+    assert report["counters"] == {"items": 4}
+
+
+def test_disabled_records_nothing():
+    m = Metrics()
+    with m.stage("parse"):
+        m.count("parse.files", 10)
+    assert m.report() == {"stages": {}, "counters": {}}
+
+
+def test_pipeline_stages_and_report_since(metrics, folder):
+    snapshot = DirectorySnapshot(str(folder))
+    parser = MetadataParser(id_min_len=7, id_max_len=7)
+    metas = parser.extract_many(snapshot.entries, workers=1)
+    before_rename = metrics.report()
+    assert set(before_rename["stages"]) == {"scan", "parse"}
+    assert before_rename["counters"]["scan.files"] == before_rename["counters"]["parse.files"] == len(FILES)
+
+    assert rename_batch([(meta["filepath"], parser.generate_new_name(meta)) for meta in metas]) == [True] * len(FILES)
+    report = metrics.report()
+    assert set(report["stages"]) == {"scan", "parse", "rename"}
+
+    # Only the rename happened since: unchanged stages and counters are left out
+    delta = metrics.report(since=before_rename)
+    assert list(delta["stages"]) == ["rename"]
+    assert delta["stages"]["rename"] == report["stages"]["rename"]
+    assert delta["counters"] == {"rename.done": len(FILES)}
+    assert metrics.report(since=report) == {"stages": {}, "counters": {}}
+
+
+def test_cli_metrics_json(metrics, tmp_path, folder):
+    out = tmp_path / "metrics.json"
+    code = main([str(folder), "--id-length", "7", "--workers", "1", "-q", "--output", str(tmp_path / "report.out"),
+                 "--journal", str(tmp_path / "journal.jsonl"), "--metrics", str(out)])
+    assert code == 0
+    report = json.loads(out.read_text(encoding="utf-8"))
+    assert set(report) == {"stages", "counters", "seconds"}
+    assert {"scan", "parse", "names", "plan", "journal", "rename"} <= set(report["stages"])
+    for stage in report["stages"].values():
+        assert set(stage) == {"calls", "seconds"}
+        assert stage["calls"] >= 1 and stage["seconds"] >= 0
+    assert report["stages"]["rename"]["calls"] == 1
+    counters = report["counters"]
+    assert counters["scan.files"] == counters["parse.files"] == counters["rename.done"] == len(FILES)
+    assert counters["rename.failed"] == counters["rename.stopped"] == 0
+    assert report["seconds"] >= report["stages"]["scan"]["seconds"] + report["stages"]["rename"]["seconds"]
+
+
+def test_cli_metrics_to_stderr(metrics, tmp_path, folder, capsys):
+    code = main([str(folder), "--dry-run", "--id-length", "7", "--workers", "1", "-q",
+                 "--output", str(tmp_path / "report.out"), "--metrics", "-"])
+    assert code == 0
+    report = json.loads(capsys.readouterr().err)
+    assert "rename" not in report["stages"] and "journal" not in report["stages"] # Dry run
+    assert report["counters"]["parse.files"] == len(FILES)
@@ -0,0 +1,265 @@
+import json
+import logging
+import os
+import random
+
+import pytest
+
+from benchmarks.corpus import generate_filenames
+from core import parser as parser_module
+from core.parser import MetadataParser, ParseCache, ParseReport
+from core.scanner import FileEntry
+
+# Results of the original parser (metadata fields and generate_new_name) for
+# a mixed corpus under several configurations: [config, filename, student_id,
+# name, project, class_name, new_name]
+with open(os.path.join(os.path.dirname(__file__), "data", "parser_baseline.json"), encoding="utf-8") as f:
+    BASELINE = json.load(f)
+
+
+def parse(filename, excluded, **kwargs):
+    kwargs.setdefault("id_min_len", 7)
+    kwargs.setdefault("id_max_len", 10)
+    parser = MetadataParser(excluded_tokens=excluded, **kwargs)
+    return parser.extract_metadata("/x/" + filename)
+
+
+# Expected values are what the parser gave before excluded tokens were
+# looked up by subsequence (a replace loop over the whole list)
+@pytest.mark.parametrize("filename, excluded, name, project", [
+    # Nested copies: each token is replaced three times (as-is, upper, capitalized)
+    ("2021001样样本本.docx", ["样本"], "", "样样本本"),
+    ("2021001作作业业-张三.pdf", ["作业"], "张三", "作作业业"),
+    ("2021001王样本五.pdf", ["样本"], "王五", "王样本五"),
+    # Duplicate tokens are each applied again, in list order
+    ("2021001样本本样.pdf", ["样本", "样本"], "本样", "样本"),
+    ("2021001样乙本-王五.pdf", ["样本", "乙", "样本"], "王五", "样乙本"),
+    ("2021001样乙本-王五.pdf", ["样本", "乙"], "样本", "样乙本 王五"),
+    ("2021001李样本四-作作业业.pdf", ["作业", "样本", "作业"], "李四", "李样本四 作作业业"),
+])
+def test_excluded_tokens_match_replace_loop(filename, excluded, name, project):
+    meta = parse(filename, excluded)
+    assert (meta["name"], meta["project"]) == (name, project)
+
+
+def test_excluded_tokens_apply_in_list_order():
+    # Removing 样本 first leaves 本甲, then 本 goes; removing 本 first leaves 样甲
+    assert parse("2021001本样本甲.pdf", ["样本", "本"])["name"] == "甲"
+    assert parse("2021001本样本甲.pdf", ["本", "样本"])["name"] == "样甲"
+
+
+def test_excluded_english_token_is_a_separator():
+    meta = parse("2021001-Project-Zhang-San.pdf", ["project"], standard_project_name="Project")
+    assert meta["student_id"] == "2021001"
+    assert meta["name"] == "Zhang"
+    assert meta["project"] == "Project"
+
+
+def _replace_loop(candidate, excluded):
+    """The original removal: every listed token, in order, replaced three times"""
+    for token in excluded:
+        if token in candidate.lower():
+            candidate = candidate.replace(token, "")
+            candidate = candidate.replace(token.upper(), "")
+            candidate = candidate.replace(token.capitalize(), "")
+    return candidate
+
+
+def test_strip_excluded_matches_replace_loop():
+    rnd = random.Random(19)
+    chars = "样本作业王李甲乙"
+    for _ in range(3000):
+        candidate = "".join(rnd.choice(chars) for _ in range(rnd.randint(2, 4)))
+        excluded = ["".join(rnd.choice(chars) for _ in range(rnd.randint(1, 3))) for _ in range(rnd.randint(0, 6))]
+        excluded += rnd.sample(excluded, len(excluded) // 2) # Duplicates
+        rnd.shuffle(excluded)
+        parser = MetadataParser(excluded_tokens=excluded)
+        assert parser._strip_excluded(candidate) == _replace_loop(candidate, excluded), (candidate, excluded)
+
+
+def test_parse_cache_follows_excluded_token_order():
+    cache = ParseCache()
+    path = "/x/2021001本样本甲.pdf"
+    first = MetadataParser(id_min_len=7, id_max_len=10, excluded_tokens=["样本", "本"])
+    assert cache.extract_many(first, [path])[0]["name"] == "甲"
+    # Same tokens, other order: the cached result must not be reused
+    second = MetadataParser(id_min_len=7, id_max_len=10, excluded_tokens=["本", "样本"])
+    assert cache.extract_many(second, [path])[0]["name"] == "样甲"
+
+
+def test_parse_cache_matches_fresh_parse_when_tokens_change():
+    rnd = random.Random(5)
+    names = generate_filenames(1500, seed=11) + ["2021000001本样本甲.pdf", "2021000002样样本本.docx"]
+    paths = ["/d/" + name for name in names]
+    chars = sorted({c for name in names for c in name if "\u4e00" <= c <= "\u9fa5"})
+    pool = ["样本", "本样", "本", "作业", "练习", "copy", "final"] + rnd.sample(chars, 10)
+    cache = ParseCache()
+    excluded = []
+    for _ in range(25):
+        token = rnd.choice(pool)
+        if token in excluded:
+            excluded.remove(token)
+        else:
+            excluded.append(token)
+        if rnd.random() < 0.5:
+            rnd.shuffle(excluded)
+        parser = MetadataParser(10, 10, "会计作业", excluded_tokens=excluded)
+        assert cache.extract_many(parser, paths, workers=1) == [parser.extract_metadata(p) for p in paths]
+    assert cache.hits > 0
+
+
+def test_changed_tokens_leave_equal_lists():
+    rnd = random.Random(55)
+    for _ in range(500):
+        old = tuple(rnd.choice("abcdef") for _ in range(rnd.randint(0, 8)))
+        new = list(old)
+        if rnd.random() < 0.5:
+            rnd.shuffle(new)
+        else:
+            new.insert(rnd.randint(0, len(new)), rnd.choice("abcdefg"))
+        new = tuple(new)
+        changed = ParseCache._changed_tokens(old, new)
+        assert [t for t in old if t not in changed] == [t for t in new if t not in changed]
+    # Moving one token only changes that token
+    assert ParseCache._changed_tokens(("a", "b", "c", "d"), ("b", "c", "d", "a")) == {"a"}
+
+
+def test_parse_cache_evicts_least_recently_used():
+    cache = ParseCache(max_entries=50)
+    paths = ["/d/%d张三作业.pdf" % i for i in range(40)]
+    first, second = MetadataParser(10, 10, "作业"), MetadataParser(8, 10, "作业")
+    cache.extract_many(first, paths)
+    cache.extract_many(second, paths)
+    assert len(cache) == 50
+    # The oldest entries of the first parser went; used again, they are parsed again
+    hits = cache.hits
+    assert cache.extract_many(first, paths[-10:]) == [first.extract_metadata(p) for p in paths[-10:]]
+    assert cache.hits == hits + 10
+    cache.extract_many(first, paths[:5])
+    assert len(cache) == 50 and cache.misses == 85
+
+
+def baseline_cases(config):
+    return [case[1:] for case in BASELINE["cases"] if case[0] == config]
+
+
+def entry(path):
+    directory, name = os.path.split(path)
+    stem, extension = os.path.splitext(name)
+    return FileEntry(path, directory, name, stem, extension)
+
+
+@pytest.mark.parametrize("config", range(len(BASELINE["configs"])))
+def test_extract_metadata_matches_original_parser(config):
+    parser = MetadataParser(**BASELINE["configs"][config])
+    for filename, *expected in baseline_cases(config):
+        path = "/hw/" + filename
+        meta = parser.extract_metadata(path)
+        assert meta == parser.extract_metadata(entry(path))
+        assert (meta["filepath"], meta["original_name"]) == (path, filename)
+        got = [meta["student_id"], meta["name"], meta["project"], meta["class_name"], parser.generate_new_name(meta)]
+        assert got == expected, filename
+
+
+@pytest.mark.parametrize("config", range(len(BASELINE["configs"])))
+def test_extract_many_matches_extract_metadata(config, monkeypatch):
+    monkeypatch.setattr(parser_module, "PARALLEL_MIN_BATCH", 10)
+    monkeypatch.setattr(parser_module, "PARALLEL_MIN_BATCH_SPAWN", 10)
+    parser = MetadataParser(**BASELINE["configs"][config])
+    paths = ["/hw/" + case[0] for case in baseline_cases(config)]
+    expected = [MetadataParser(**BASELINE["configs"][config]).extract_metadata(p) for p in paths]
+    assert parser.extract_many([entry(p) for p in paths], workers=2, chunk_size=40) == expected
+    assert parser.report.files == len(paths)
+
+
+def test_parallel_workers(monkeypatch):
+    monkeypatch.setattr(parser_module, "_usable_cpus", lambda: 2)
+    assert parser_module.parallel_workers(10 ** 6) == 1 # Too few CPUs for a pool to pay off
+    assert parser_module.parallel_workers(parser_module.PARALLEL_MIN_BATCH - 1, workers=4) == 1
+    assert parser_module.parallel_workers(parser_module.PARALLEL_MIN_BATCH_SPAWN, workers=4) == 4
+    monkeypatch.setattr(parser_module, "_usable_cpus", lambda: 8)
+    assert parser_module.parallel_workers(parser_module.PARALLEL_MIN_BATCH_SPAWN) == 8
+    assert parser_module.parallel_workers(parser_module.PARALLEL_MIN_BATCH_SPAWN, workers=1) == 1
+
+
+# Files that exercise every ParseReport field but the roster (see test_roster.py)
+REPORT_FILES = ["2021001_Lab_Report_Zhang_San.pdf", "Report_2021002_Li_Si.pdf", "2021003样本李四.pdf",
+                "2021004练习.pdf", "2021005样本练习王五.docx", "2021006张三实验报告.pdf"] * 5
+
+
+def report_parser():
+    return MetadataParser(id_min_len=7, id_max_len=7, standard_project_name="Lab Report", excluded_tokens=["样本", "练习"])
+
+
+def test_report_merge_adds_up():
+    first, second = ParseReport(), ParseReport()
+    first.files, first.roster, first.removed, first.re_extracted = 3, {"id": 2}, {"样本": 1}, 1
+    second.files, second.roster, second.removed, second.fully_excluded = 4, {"id": 1, "name": 1}, {"样本": 2, "练习": 1}, 2
+    second.re_extract_failed = 1
+    first.merge(second)
+    assert vars(first) == {"files": 7, "roster": {"id": 3, "name": 1}, "removed": {"样本": 3, "练习": 1},
+                           "fully_excluded": 2, "re_extracted": 1, "re_extract_failed": 1}
+
+
+def test_report_merged_across_chunks_matches_one_batch(monkeypatch):
+    serial = report_parser()
+    expected = serial.extract_many(REPORT_FILES, workers=1)
+    assert vars(serial.report) == {"files": 30, "roster": {}, "removed": {"样本": 10, "练习": 10},
+                                   "fully_excluded": 10, "re_extracted": 10, "re_extract_failed": 0}
+
+    monkeypatch.setattr(parser_module, "PARALLEL_MIN_BATCH", 10)
+    monkeypatch.setattr(parser_module, "PARALLEL_MIN_BATCH_SPAWN", 10)
+    pooled = report_parser()
+    assert pooled.extract_many(REPORT_FILES, workers=2, chunk_size=4) == expected # 8 chunks
+    assert vars(pooled.report) == vars(serial.report)
+
+
+def test_report_summary():
+    parser = report_parser()
+    parser.extract_many(REPORT_FILES, workers=1)
+    assert parser.report.summary() == ("30 files: excluded tokens removed 20 times ('样本' x10, '练习' x10), "
+                                       "10 candidates fully excluded, 10 names re-extracted (0 failed)")
+    report = ParseReport()
+    report.files = 2
+    report.removed = {f"t{n}": n for n in range(1, 13)}
+    report.roster = {"id": 1, "alias": 1}
+    assert report.summary() == ("2 files: excluded tokens removed 78 times ('t12' x12, 't11' x11, 't10' x10, "
+                                "'t9' x9, 't8' x8, 't7' x7, 't6' x6, 't5' x5, 't4' x4, 't3' x3, ... (12 tokens)), "
+                                "0 candidates fully excluded, 0 names re-extracted (0 failed); "
+                                "roster matched 2 (1 by id, 1 by alias)")
+
+
+def test_per_file_messages_are_debug_and_summary_is_info(caplog):
+    caplog.set_level(logging.DEBUG, logger="core.parser")
+    parser = report_parser()
+    parser.extract_many(REPORT_FILES, workers=1)
+    per_file = [r for r in caplog.records if r.name == "core.parser"]
+    assert per_file and {r.levelno for r in per_file} == {logging.DEBUG}
+
+    caplog.clear()
+    summary = parser.report.summary()
+    parser.log_report()
+    assert [(r.levelno, r.getMessage()) for r in caplog.records] == [(logging.INFO, "Parsed " + summary)]
+    assert parser.report.files == 0 # Starts over
+
+    caplog.clear()
+    parser.log_report() # Nothing parsed since
+    assert caplog.records == []
+
+
+def test_pool_failure_warns_once(monkeypatch, caplog):
+    import concurrent.futures
+
+    def unavailable(*args, **kwargs):
+        raise OSError("no semaphores")
+
+    monkeypatch.setattr(parser_module, "PARALLEL_MIN_BATCH", 10)
+    monkeypatch.setattr(parser_module, "PARALLEL_MIN_BATCH_SPAWN", 10)
+    monkeypatch.setattr(concurrent.futures, "ProcessPoolExecutor", unavailable)
+    caplog.set_level(logging.DEBUG, logger="core.parser")
+    parser = report_parser()
+    assert parser.extract_many(REPORT_FILES, workers=2) == report_parser().extract_many(REPORT_FILES, workers=1)
+    warnings = [r for r in caplog.records if r.levelno > logging.DEBUG]
+    assert [r.levelno for r in warnings] == [logging.WARNING]
+    assert "no semaphores" in warnings[0].getMessage()
+    assert parser.report.fully_excluded == 10 # Counted once, by the in-process fallback
@@ -0,0 +1,97 @@
+import os
+
+import pytest
+
+from core.planner import (CONFLICT_SKIP, PLAN_RENAME, PLAN_SKIPPED, PLAN_UNCHANGED,
+                          execute_plan, plan_renames)
+
+
+def make_files(directory, contents):
+    """Creates one file per name, holding its name (so renames can be followed)"""
+    for name in contents:
+        (directory / name).write_text(name, encoding="utf-8")
+
+
+def listing(directory):
+    """{name: original name} of the files in directory"""
+    return {name: (directory / name).read_text(encoding="utf-8") for name in os.listdir(directory)}
+
+
+def run(directory, renames, **kwargs):
+    plan = plan_renames([(str(directory / old), new) for old, new in renames], **kwargs)
+    return plan, execute_plan(plan)
+
+
+def test_chain_is_ordered(tmp_path):
+    make_files(tmp_path, ["a.txt", "b.txt", "c.txt"])
+    plan, results = run(tmp_path, [("a.txt", "b.txt"), ("b.txt", "c.txt"), ("c.txt", "d.txt")])
+    assert results == [True, True, True]
+    assert plan.conflicts == 0
+    assert [os.path.basename(src) for _, src, _ in plan.steps] == ["c.txt", "b.txt", "a.txt"]
+    assert listing(tmp_path) == {"b.txt": "a.txt", "c.txt": "b.txt", "d.txt": "c.txt"}
+
+
+def test_cycle_goes_through_a_temporary_name(tmp_path):
+    make_files(tmp_path, ["a.txt", "b.txt", "c.txt"])
+    plan, results = run(tmp_path, [("a.txt", "b.txt"), ("b.txt", "c.txt"), ("c.txt", "a.txt")])
+    assert results == [True, True, True]
+    assert len(plan.steps) == 4
+    assert listing(tmp_path) == {"b.txt": "a.txt", "c.txt": "b.txt", "a.txt": "c.txt"}
+
+
+def test_case_only_rename(tmp_path):
+    make_files(tmp_path, ["report.txt"])
+    plan, results = run(tmp_path, [("report.txt", "Report.txt")])
+    assert results == [True]
+    assert plan.actions == [PLAN_RENAME]
+    assert listing(tmp_path) == {"Report.txt": "report.txt"}
+
+
+def test_conflicts_get_counter_suffixes(tmp_path):
+    make_files(tmp_path, ["x.txt", "y.txt", "z.txt", "作业.txt", "作业 (2).txt"])
+    plan, results = run(tmp_path, [("x.txt", "作业.txt"), ("y.txt", "作业.txt"), ("z.txt", "z.txt")])
+    assert results == [True, True, True]
+    assert plan.targets == ["作业 (3).txt", "作业 (4).txt", "z.txt"]
+    assert plan.actions == [PLAN_RENAME, PLAN_RENAME, PLAN_UNCHANGED]
+    assert plan.conflicts == 2
+    assert listing(tmp_path)["作业 (3).txt"] == "x.txt"
+
+
+def test_conflicts_are_case_insensitive(tmp_path):
+    make_files(tmp_path, ["x.txt", "NOTES.txt"])
+    plan = plan_renames([(str(tmp_path / "x.txt"), "notes.txt")])
+    assert plan.targets == ["notes (2).txt"]
+
+
+def test_skip_policy_cascades(tmp_path):
+    # b is skipped because c.txt is taken; it then stays put, which blocks a
+    make_files(tmp_path, ["a.txt", "b.txt", "c.txt"])
+    plan, results = run(tmp_path, [("a.txt", "b.txt"), ("b.txt", "c.txt")], policy=CONFLICT_SKIP)
+    assert plan.actions == [PLAN_SKIPPED, PLAN_SKIPPED]
+    assert results == [False, False]
+    assert listing(tmp_path) == {"a.txt": "a.txt", "b.txt": "b.txt", "c.txt": "c.txt"}
+
+
+@pytest.mark.parametrize("policy", [None, CONFLICT_SKIP])
+def test_directories_are_planned_separately(tmp_path, policy):
+    for sub in ("one", "two"):
+        (tmp_path / sub).mkdir()
+        make_files(tmp_path / sub, ["a.txt"])
+    kwargs = {"policy": policy} if policy else {}
+    plan, results = run(tmp_path, [("one/a.txt", "b.txt"), ("two/a.txt", "b.txt")], **kwargs)
+    assert results == [True, True]
+    assert plan.conflicts == 0
+
+
+def test_missing_source_fails_alone(tmp_path):
+    make_files(tmp_path, ["a.txt"])
+    _, results = run(tmp_path, [("gone.txt", "x.txt"), ("a.txt", "b.txt")])
+    assert results == [False, True]
+    assert listing(tmp_path) == {"b.txt": "a.txt"}
+
+
+def test_should_stop_leaves_items_unattempted(tmp_path):
+    make_files(tmp_path, ["a.txt"])
+    plan = plan_renames([(str(tmp_path / "a.txt"), "b.txt")])
+    assert execute_plan(plan, should_stop=lambda: True) == [None]
+    assert listing(tmp_path) == {"a.txt": "a.txt"}
@@ -0,0 +1,65 @@
+import os
+import threading
+
+from core.renamer import _group_renames, rename_batch, rename_file
+
+
+def make_files(directory, names):
+    for name in names:
+        (directory / name).write_text(name, encoding="utf-8")
+
+
+def listing(directory):
+    return {name: (directory / name).read_text(encoding="utf-8") for name in os.listdir(directory)}
+
+
+def test_rename_file_never_overwrites(tmp_path):
+    make_files(tmp_path, ["a.txt", "b.txt"])
+    assert not rename_file(str(tmp_path / "a.txt"), "b.txt")
+    assert not rename_file(str(tmp_path / "missing.txt"), "c.txt")
+    assert rename_file(str(tmp_path / "a.txt"), "c.txt")
+    assert listing(tmp_path) == {"b.txt": "b.txt", "c.txt": "a.txt"}
+
+
+def test_groups_chain_interfering_renames():
+    items = [("/d/a", "b"), ("/d/c", "x"), ("/d/b", "C"), ("/e/a", "b"), ("/d/y", "z"), ("/d/q", "Z")]
+    groups = sorted(_group_renames(items))
+    assert groups == [[0, 1, 2], [3], [4, 5]]
+
+
+def test_batch_runs_groups_in_input_order(tmp_path):
+    # Within a group, renames run in input order: b moves away before a takes its name
+    make_files(tmp_path, ["a.txt", "b.txt"] + [f"f{n}.txt" for n in range(50)])
+    items = [(str(tmp_path / "b.txt"), "c.txt"), (str(tmp_path / "a.txt"), "b.txt")]
+    items += [(str(tmp_path / f"f{n}.txt"), f"g{n}.txt") for n in range(50)]
+    assert rename_batch(items, workers=4) == [True] * 52
+    files = listing(tmp_path)
+    assert files["c.txt"] == "b.txt" and files["b.txt"] == "a.txt"
+    assert all(files[f"g{n}.txt"] == f"f{n}.txt" for n in range(50))
+
+
+def test_same_target_fails_once(tmp_path):
+    make_files(tmp_path, ["a.txt", "b.txt"])
+    results = rename_batch([(str(tmp_path / "a.txt"), "c.txt"), (str(tmp_path / "b.txt"), "c.txt")])
+    assert results == [True, False]
+    assert listing(tmp_path)["c.txt"] == "a.txt"
+
+
+def test_progress_and_stop(tmp_path):
+    make_files(tmp_path, [f"f{n}.txt" for n in range(20)])
+    items = [(str(tmp_path / f"f{n}.txt"), f"g{n}.txt") for n in range(20)]
+    calls = []
+    lock = threading.Lock()
+    polled = [0]
+
+    def should_stop():
+        with lock:
+            polled[0] += 1
+            return polled[0] > 5
+
+    results = rename_batch(items, workers=1, progress=lambda done, total: calls.append((done, total)),
+                           should_stop=should_stop)
+    assert results == [True] * 5 + [None] * 15
+    assert calls[-1] == (5, 20)
+    assert rename_batch([], progress=lambda done, total: calls.append((done, total))) == []
+    assert calls[-1] == (0, 0)
@@ -0,0 +1,82 @@
+import pytest
+
+from core.parser import MetadataParser
+from core.roster import MATCH_ALIAS, MATCH_ID, MATCH_NAME, Roster, Student
+
+
+@pytest.fixture
+def roster():
+    return Roster([
+        Student("2021001", "张三", "1班", ("Zhang San",)),
+        Student("2021002", "李四", "1班", ("Li Si", "Lucy")),
+        Student("2021003", "张三丰", "2班"),
+        Student("2021004", "王五"),
+        Student("2021005", "王五"), # Same name: only found by ID
+        Student("", "赵六"),
+    ])
+
+
+def write(path, text):
+    path.write_text(text, encoding="utf-8-sig")
+    return str(path)
+
+
+def test_load_with_header_in_any_order(tmp_path):
+    path = write(tmp_path / "r.csv", "姓名,班级,学号,别名\n张三,1班,2021001,Zhang San;zs|San\n\n,,,\n李四,,2021002,\n")
+    roster = Roster.load(path)
+    assert [(s.id, s.name, s.class_name, s.aliases) for s in roster.students] == [
+        ("2021001", "张三", "1班", ("Zhang San", "zs", "San")),
+        ("2021002", "李四", "", ()),
+    ]
+
+
+def test_load_without_header(tmp_path):
+    roster = Roster.load(write(tmp_path / "r.csv", "2021001,张三\n2021002,李四,2班,Li Si\n"))
+    assert [(s.id, s.name, s.class_name) for s in roster.students] == [("2021001", "张三", ""), ("2021002", "李四", "2班")]
+
+
+@pytest.mark.parametrize("text", ["", "\n,,\n", "班级,别名\n1班,x\n"])
+def test_load_rejects_unusable_files(tmp_path, text):
+    with pytest.raises(ValueError):
+        Roster.load(write(tmp_path / "r.csv", text))
+
+
+@pytest.mark.parametrize("stem, student_id, how", [
+    ("2021002_张三_实验", "2021002", MATCH_ID), # An ID wins over a name
+    ("张三_实验", "2021001", MATCH_NAME),
+    ("张三丰_实验", "2021003", MATCH_NAME), # Longest name at a position
+    ("实验-ZhangSan", "2021001", MATCH_ALIAS),
+    ("zhang_san 实验", "2021001", MATCH_ALIAS),
+    ("lucy-lab1", "2021002", MATCH_ALIAS),
+    ("2021005王五", "2021005", MATCH_ID),
+])
+def test_resolve(roster, stem, student_id, how):
+    student, found_how = roster.resolve(stem)
+    assert (student.id, found_how) == (student_id, how)
+
+
+@pytest.mark.parametrize("stem", ["王五_实验", "张 三", "Zhangsanfeng", "20210010"])
+def test_resolve_misses(roster, stem):
+    assert roster.resolve(stem) == (None, None)
+
+
+def test_fingerprint_follows_content():
+    a = Roster([Student("1", "张三")])
+    assert a.fingerprint == Roster([Student("1", "张三")]).fingerprint
+    assert a.fingerprint != Roster([Student("1", "张三", aliases=("zs",))]).fingerprint
+
+
+def test_parser_uses_roster(roster):
+    parser = MetadataParser(id_min_len=7, id_max_len=7, roster=roster)
+    meta = parser.extract_metadata("/hw/ZhangSan-1班-实验报告.pdf")
+    assert (meta["student_id"], meta["name"], meta["class_name"], meta["project"]) == ("2021001", "张三", "1班", "实验报告")
+
+    meta = parser.extract_metadata("/hw/实验报告_zhang_san.pdf")
+    assert (meta["student_id"], meta["project"]) == ("2021001", "实验报告")
+    assert parser.report.roster == {MATCH_ALIAS: 2}
+
+    meta = parser.extract_metadata("/hw/2021009赵六作业.docx") # No ID in the roster: taken from the name
+    assert (meta["student_id"], meta["name"]) == ("2021009", "赵六")
+
+    without = MetadataParser(id_min_len=7, id_max_len=7)
+    assert parser.extract_metadata("/hw/无名氏.pdf") == without.extract_metadata("/hw/无名氏.pdf")
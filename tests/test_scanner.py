@@ -0,0 +1,172 @@
+import os
+import zipfile
+
+import pytest
+
+from core.options import build_scan_filter
+from core.scanner import DirectorySnapshot, ScanFilter, scan_directory, scan_entries
+
+
+def make_tree(root, files):
+    for rel in files:
+        path = os.path.join(root, *rel.split("/"))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            f.write(rel)
+
+
+def make_zip(path, members):
+    with zipfile.ZipFile(path, "w") as zf:
+        for name in members:
+            zf.writestr(name, name)
+
+
+def relative(root, paths):
+    return sorted(os.path.relpath(p, root).replace(os.sep, "/") for p in paths)
+
+
+def scan_all(root, scan_filter=None, archives=False):
+    """The same scan through all three entry points, which must agree"""
+    paths = relative(root, scan_directory(root, scan_filter=scan_filter, archives=archives))
+    assert relative(root, (e.path for e in scan_entries(root, scan_filter=scan_filter, archives=archives))) == paths
+    snapshot = DirectorySnapshot(root, scan_filter=scan_filter, archives=archives)
+    assert relative(root, snapshot.paths) == paths
+    return paths
+
+
+@pytest.fixture
+def tree(tmp_path):
+    make_tree(tmp_path, ["a.pdf", "b.docx", "notes.txt", ".hidden.pdf",
+                         "hw/c.pdf", "hw/d.DOCX", "hw/deep/e.pdf",
+                         "build/f.pdf", "__MACOSX/g.pdf"])
+    return str(tmp_path)
+
+
+def test_no_filter_skips_hidden_files(tree):
+    assert scan_all(tree) == ["__MACOSX/g.pdf", "a.pdf", "b.docx", "build/f.pdf", "hw/c.pdf",
+                              "hw/d.DOCX", "hw/deep/e.pdf", "notes.txt"]
+
+
+@pytest.mark.parametrize("include, exclude, depth, expected", [
+    (".pdf", "", None, ["__MACOSX/g.pdf", "a.pdf", "build/f.pdf", "hw/c.pdf", "hw/deep/e.pdf"]),
+    (".docx", "", None, ["b.docx", "hw/d.DOCX"]), # Extensions are case-insensitive
+    ("", ".pdf .txt", None, ["b.docx", "hw/d.DOCX"]),
+    ("", "__MACOSX build", None, ["a.pdf", "b.docx", "hw/c.pdf", "hw/d.DOCX", "hw/deep/e.pdf", "notes.txt"]),
+    # A glob with "/" matches the relative path; like fnmatch, * also matches "/"
+    ("hw/*", "", None, ["hw/c.pdf", "hw/d.DOCX", "hw/deep/e.pdf"]),
+    ("*.pdf", "hw/deep", None, ["__MACOSX/g.pdf", "a.pdf", "build/f.pdf", "hw/c.pdf"]),
+    ("", "", 0, ["a.pdf", "b.docx", "notes.txt"]),
+    (".pdf", "", 1, ["__MACOSX/g.pdf", "a.pdf", "build/f.pdf", "hw/c.pdf"]),
+])
+def test_filters(tree, include, exclude, depth, expected):
+    assert scan_all(tree, build_scan_filter(include, exclude, depth)) == expected
+
+
+def test_empty_filter_keeps_everything(tree):
+    assert not ScanFilter()
+    assert scan_all(tree, ScanFilter()) == scan_all(tree)
+
+
+@pytest.fixture
+def archive_tree(tmp_path):
+    make_tree(tmp_path, ["top.pdf", "sub/s.pdf"])
+    for rel in ("a.zip", "sub/b.zip"):
+        make_zip(os.path.join(tmp_path, *rel.split("/")), ["x.pdf", "y.docx", "inner/y.pdf", "inner/deep/z.pdf"])
+    with open(tmp_path / "broken.zip", "w") as f:
+        f.write("not a zip")
+    return str(tmp_path)
+
+
+@pytest.mark.parametrize("depth, expected", [
+    (0, ["a.zip/x.pdf", "top.pdf"]),
+    (1, ["a.zip/inner/y.pdf", "a.zip/x.pdf", "sub/b.zip/x.pdf", "sub/s.pdf", "top.pdf"]),
+    (2, ["a.zip/inner/deep/z.pdf", "a.zip/inner/y.pdf", "a.zip/x.pdf", "sub/b.zip/inner/y.pdf",
+         "sub/b.zip/x.pdf", "sub/s.pdf", "top.pdf"]),
+])
+def test_archive_members_follow_max_depth(archive_tree, depth, expected):
+    assert scan_all(archive_tree, build_scan_filter(".pdf", "", depth), archives=True) == expected
+
+
+def test_filters_apply_to_archive_members(archive_tree):
+    assert scan_all(archive_tree, build_scan_filter(".docx", "", None), archives=True) == [
+        "a.zip/y.docx", "sub/b.zip/y.docx"]
+    # An unreadable .zip is an ordinary file, kept only if it passes the filter
+    assert "broken.zip" in scan_all(archive_tree, archives=True)
+    assert "broken.zip" not in scan_all(archive_tree, build_scan_filter(".pdf", "", None), archives=True)
+
+
+def walk_scan(root):
+    """scan_directory of the original app (os.walk)"""
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = [d for d in dirnames if not d.startswith('.')]
+        for filename in filenames:
+            if not filename.startswith('.') and filename not in {'.DS_Store', 'Thumbs.db'}:
+                yield os.path.join(dirpath, filename)
+
+
+def test_scan_order_matches_os_walk(tree):
+    make_tree(tree, [".git/config", "Thumbs.db", "hw/deep/deeper/f.pdf", "z/y/x.pdf"])
+    os.symlink(os.path.join(tree, "hw"), os.path.join(tree, "link-to-dir"))
+    os.symlink(os.path.join(tree, "a.pdf"), os.path.join(tree, "link.pdf"))
+    os.symlink(os.path.join(tree, "missing"), os.path.join(tree, "dangling.pdf"))
+    expected = list(walk_scan(tree))
+    assert list(scan_directory(tree)) == expected
+    assert [e.path for e in scan_entries(tree)] == expected
+    assert DirectorySnapshot(tree).paths == expected
+
+
+def bump_mtime(path):
+    """Moves a directory's mtime on, so that the change is seen even within one timestamp tick"""
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+
+
+def test_refresh_follows_changes(tree):
+    snapshot = DirectorySnapshot(tree)
+    assert not snapshot.refresh()
+
+    make_tree(tree, ["new.pdf", "added/one.pdf", "added/two/three.pdf"])
+    os.rename(os.path.join(tree, "hw", "c.pdf"), os.path.join(tree, "hw", "c2.pdf"))
+    os.remove(os.path.join(tree, "hw", "deep", "e.pdf"))
+    os.remove(os.path.join(tree, "build", "f.pdf"))
+    os.rmdir(os.path.join(tree, "build"))
+    for sub in ("", "hw", "hw/deep"):
+        bump_mtime(os.path.join(tree, sub))
+
+    delta = snapshot.refresh()
+    assert relative(tree, delta.added) == ["added/one.pdf", "added/two/three.pdf", "hw/c2.pdf", "new.pdf"]
+    assert relative(tree, delta.removed) == ["build/f.pdf", "hw/c.pdf", "hw/deep/e.pdf"]
+    assert snapshot.paths == list(scan_directory(tree))
+    assert os.path.join(tree, "added", "two") in snapshot.directories
+    assert os.path.join(tree, "build") not in snapshot.directories
+    assert not snapshot.refresh()
+
+
+def test_refresh_relists_only_changed_directories(tree, monkeypatch):
+    snapshot = DirectorySnapshot(tree)
+    listed = []
+    list_dir = snapshot._list_dir
+    monkeypatch.setattr(snapshot, "_list_dir", lambda d: listed.append(d) or list_dir(d))
+
+    make_tree(tree, ["hw/new.pdf"])
+    bump_mtime(os.path.join(tree, "hw"))
+    assert relative(tree, snapshot.refresh().added) == ["hw/new.pdf"]
+    assert listed == [os.path.join(tree, "hw")]
+
+    # Directories reported by a watcher are listed again whatever their mtime
+    listed.clear()
+    os.remove(os.path.join(tree, "a.pdf"))
+    os.utime(tree, ns=(0, snapshot._dirs[tree].mtime_ns)) # Same mtime as when listed
+    assert not snapshot.refresh()
+    assert relative(tree, snapshot.refresh([tree]).removed) == ["a.pdf"]
+    assert listed == [tree]
+    assert snapshot.paths == list(scan_directory(tree))
+
+
+def test_refresh_drops_a_vanished_root(tmp_path):
+    make_tree(tmp_path, ["root/a.pdf", "root/sub/b.pdf"])
+    root = str(tmp_path / "root")
+    snapshot = DirectorySnapshot(root)
+    os.rename(root, str(tmp_path / "moved"))
+    assert relative(root, snapshot.refresh().removed) == ["a.pdf", "sub/b.pdf"]
+    assert snapshot.paths == [] and len(snapshot) == 0
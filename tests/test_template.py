@@ -0,0 +1,92 @@
+import random
+import re
+
+import pytest
+
+from core.template import NameTemplate, compile_template
+
+FORMATS = [
+    "{student_id}-{name}-{project}",
+    "{student_id}_{name}_{project}",
+    "{student_id} {name} {project}",
+    "{class_name}{student_id}{name}",
+    "{project}-{original_name}",
+    "{student_id}_{name}-{project}",
+    "[{class_name}] {name}",
+    "{{{student_id}}}-{name}",
+    "{name!r}-{student_id:>12}",
+    "{name:.1}__{project}",
+    "{student_id:{name}}",
+    "作业_{name}_{student_id}",
+]
+VALUES = ["", "NoID", "2021001", "张三", "Zhang San", "实验报告", "a--b", "_x_", " ", "\t", "-", "1班", "ab"]
+
+
+def reference_name(metadata, format_str):
+    """MetadataParser.generate_new_name of the original parser"""
+    sid = metadata.get("student_id", "")
+    if sid == "NoID":
+        sid = ""
+    ext = metadata.get("extension", "")
+    text = format_str.format(student_id=sid, name=metadata.get("name", ""), project=metadata.get("project", ""),
+                             class_name=metadata.get("class_name", ""),
+                             original_name=metadata.get("original_name", "").replace(ext, ""))
+    separator = "-"
+    if "_" in format_str and "-" not in format_str:
+        separator = "_"
+    elif " " in format_str and "-" not in format_str and "_" not in format_str:
+        separator = " "
+    if separator == " ":
+        text = re.sub(r'\s+', ' ', text)
+    else:
+        text = re.sub(re.escape(separator) + r'{2,}', separator, text)
+    return text.strip(separator + ' ') + ext
+
+
+def outcome(render, *args):
+    try:
+        return render(*args)
+    except (KeyError, IndexError, ValueError) as e:
+        return type(e)
+
+
+@pytest.mark.parametrize("format_str", FORMATS)
+def test_render_matches_original(format_str):
+    rng = random.Random(format_str)
+    template = compile_template(format_str)
+    for _ in range(300):
+        extension = rng.choice(["", ".pdf", ".docx"])
+        metadata = {key: rng.choice(VALUES) for key in ("student_id", "name", "project", "class_name")}
+        metadata["original_name"] = "".join(rng.choice(VALUES) for _ in range(3)) + extension
+        metadata["extension"] = extension
+        assert outcome(template.render, metadata) == outcome(reference_name, metadata, format_str), metadata
+
+
+def test_original_name_drops_every_copy_of_the_extension():
+    template = compile_template("{original_name}")
+    assert template.render({"original_name": "a.pdf.pdf", "extension": ".pdf"}) == "a.pdf"
+
+
+def test_field_indexes_fall_back_to_str_format():
+    template = compile_template("{name[0]}-{student_id}")
+    assert template.render({"name": "张三", "student_id": "2021001"}) == "张-2021001"
+    with pytest.raises(IndexError):
+        template.render({"name": "", "student_id": "2021001"})
+
+
+@pytest.mark.parametrize("format_str, error", [
+    ("{student}-{name}", KeyError),
+    ("{}-{name}", KeyError),
+    ("{name}}", ValueError),
+    ("{name", ValueError),
+])
+def test_invalid_formats_fail_when_compiled(format_str, error):
+    with pytest.raises(error):
+        NameTemplate(format_str)
+
+
+def test_render_fields_matches_render():
+    template = compile_template("{student_id}_{name}_{project}")
+    metadata = {"student_id": "NoID", "name": "张三", "project": "实验", "class_name": "",
+                "original_name": "x.pdf", "extension": ".pdf"}
+    assert template.render_fields("NoID", "张三", "实验", "", "x.pdf", ".pdf") == template.render(metadata) == "张三_实验.pdf"
@@ -1,45 +1,298 @@
 import sys
 import os
+import time
+import logging
 from PyQt6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, 
-                             QLabel, QLineEdit, QPushButton, QTreeWidget, QTreeWidgetItem, 
+                             QLabel, QLineEdit, QPushButton, QTableView, QAbstractItemView, 
                              QFileDialog, QProgressBar, QFrame, QSplitter, QMessageBox, QHeaderView, 
-                             QComboBox, QRadioButton, QButtonGroup)
-from PyQt6.QtCore import Qt, QThread, pyqtSignal
+                             QComboBox, QRadioButton, QButtonGroup, QInputDialog, QSpinBox, QCheckBox)
+from PyQt6.QtCore import (Qt, QThread, pyqtSignal, QFileSystemWatcher, QTimer, 
+                          QAbstractTableModel, QModelIndex)
 from PyQt6.QtGui import QFont, QColor, QPalette
 
-from core.scanner import scan_directory
-from core.parser import MetadataParser
-from core.renamer import rename_file
+from core.scanner import DirectorySnapshot
+from core.parser import MetadataParser, ParseCache, parallel_workers
+from core.template import compile_template
+from core.options import NAMING_PATTERNS, parse_id_range, parse_ignored_words, build_format, build_scan_filter
+from core.records import FileRecord, RecordStore, STATUS_DONE, STATUS_ERROR, STATUS_DUPLICATE
+from core.metrics import METRICS
+from core.logs import setup_logging
+# core.planner, core.journal, core.detect, core.duplicates and core.roster are
+# imported where they are first needed, so that starting the app does not pay
+# for them (and for json, uuid and platform behind them)
+
+logger = logging.getLogger(__name__)
+
+PREVIEW_BATCH_SIZE = 300 # Rows handed to the GUI per batch_ready signal
+PREVIEW_PARSE_CHUNK = 2000 # Files parsed in-process between cancellation checks
+ROSTER_TOOLTIP = "CSV：学号, 姓名[, 班级, 别名]。按花名册匹配学号和姓名，并补全缺失的一项"
+DUPLICATES_TOOLTIP = "按文件内容查找重复提交（先比较大小和首尾数据，必要时才完整读取）。重复的文件只保留修改时间最新的一份参与重命名，其余保持原名"
+FILTER_TOOLTIP = "通配符或扩展名，空格分隔。不含 / 的匹配文件名和文件夹名，含 / 的匹配相对路径；被排除的文件夹不会被扫描"
+
+# Stages shown in the status bar after a preview, in pipeline order
+STATUS_STAGES = [
+    ("scan", "扫描"),
+    ("scan.refresh", "刷新"),
+    ("detect.index", "词频索引"),
+    ("detect.stats", "检测"),
+    ("parse", "解析"),
+    ("names", "生成文件名"),
+    ("preview.table", "填充表格"),
+]
 
 class WorkerThread(QThread):
     progress = pyqtSignal(int)
     finished = pyqtSignal(int) # success count
     
-    def __init__(self, files_data):
+    def __init__(self, files_data, conflict_policy=None, journal=None, description=""):
         super().__init__()
         self.files_data = files_data
+        self.conflict_policy = conflict_policy # None: CONFLICT_COUNTER
+        self.journal = journal
+        self.description = description
         self.is_running = True
 
     def run(self):
+        from core.planner import plan_renames, execute_plan, CONFLICT_COUNTER, PLAN_RENAME
+        
+        # Duplicate files keep their names
+        records = [record for record in self.files_data if record.status != STATUS_DUPLICATE]
+        # Resolve duplicate targets, chains and cycles for the whole batch first
+        items = [(record.filepath, record.new_name) for record in records]
+        policy = self.conflict_policy or CONFLICT_COUNTER
+        plan = plan_renames(items, policy)
+        if plan.conflicts:
+            logger.info("Resolved %d name conflicts (%s)", plan.conflicts, policy)
+        results = execute_plan(
+            plan,
+            progress=lambda done, total: self.progress.emit(int(done / total * 100) if total else 100),
+            should_stop=lambda: not self.is_running,
+            journal=self.journal,
+            description=self.description
+        )
+        
         success_count = 0
-        total = len(self.files_data)
-        for i, item in enumerate(self.files_data):
-            if not self.is_running:
-                break
-                
-            old_path = item["filepath"]
-            new_name = item["new_name"]
-            
-            if rename_file(old_path, new_name):
-                item["status"] = "Done"
+        for record, target, action, ok in zip(records, plan.targets, plan.actions, results):
+            if action == PLAN_RENAME:
+                record.new_name = target # May carry a conflict suffix
+            if ok is None:
+                continue # Skipped after a stop request
+            if ok:
+                record.status = STATUS_DONE
                 success_count += 1
             else:
-                item["status"] = "Error"
-            
-            self.progress.emit(int((i + 1) / total * 100))
+                record.status = STATUS_ERROR
         
         self.finished.emit(success_count)
 
+class UndoWorker(QThread):
+    """Reverts one journaled rename batch in the background"""
+    progress = pyqtSignal(int)
+    finished = pyqtSignal(int, list) # restored count, paths that could not be restored
+
+    def __init__(self, journal, batch):
+        super().__init__()
+        self.journal = journal
+        self.batch = batch
+        self.is_running = True
+
+    def run(self):
+        restored, failed = self.journal.undo_batch(
+            self.batch,
+            progress=lambda done, total: self.progress.emit(int(done / total * 100) if total else 100),
+            should_stop=lambda: not self.is_running
+        )
+        self.finished.emit(restored, failed)
+
+class JournalWorker(QThread):
+    """Reads the rename journal, which grows with every rename, off the GUI thread"""
+    finished = pyqtSignal(list, list) # undoable batches, interrupted batches (newest first)
+
+    def __init__(self, journal):
+        super().__init__()
+        self.journal = journal
+
+    def run(self):
+        try:
+            batches = self.journal.batches()
+            undoable = self.journal.undoable_batches(batches)
+            incomplete = self.journal.incomplete_batches(batches)
+            # For describe_batch; only the latest interrupted batch is offered
+            self.journal.count_files(undoable + incomplete[:1])
+        except OSError as e:
+            logger.warning("Cannot read journal: %s", e)
+            undoable, incomplete = [], []
+        self.finished.emit(undoable, incomplete)
+
+class DuplicateWorker(QThread):
+    """Finds files with identical content in a snapshot, off the GUI thread"""
+    finished = pyqtSignal(object, dict) # (snapshot, folder version) hashed, {duplicate path: kept path}
+
+    def __init__(self, snapshot, version):
+        super().__init__()
+        self.snapshot = snapshot
+        self.version = version
+        self.entries = snapshot.entries # Taken now: the snapshot may be refreshed while hashing
+
+    def run(self):
+        from core.duplicates import find_duplicates
+        self.finished.emit((self.snapshot, self.version), find_duplicates(self.entries))
+
+class PreviewModel(QAbstractTableModel):
+    """
+    Table model over the files_data RecordStore. The view only asks for the
+    cells it draws, so no per-row widget items exist.
+    """
+    HEADERS = ["原始文件名", "学号（可编辑）", "姓名", "项目名", "新文件名", "状态"]
+    FIELDS = ("original_name", "student_id", "name", "project", "new_name", "status") # FileRecord attribute per column
+    COL_ID, COL_NAME, COL_NEW_NAME, COL_STATUS = 1, 2, 4, 5
+    
+    student_id_edited = pyqtSignal(int) # row
+    
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.rows = RecordStore()
+
+    def set_rows(self, rows):
+        self.beginResetModel()
+        self.rows = rows
+        self.endResetModel()
+
+    def append_rows(self, rows):
+        if not rows:
+            return
+        first = len(self.rows)
+        self.beginInsertRows(QModelIndex(), first, first + len(rows) - 1)
+        self.rows.extend(rows)
+        self.endInsertRows()
+
+    def rows_changed(self, first, last, first_col=0, last_col=None):
+        """Tell the view that rows first..last (inclusive) were updated in place"""
+        if last < first:
+            return
+        if last_col is None:
+            last_col = len(self.HEADERS) - 1
+        self.dataChanged.emit(self.index(first, first_col), self.index(last, last_col))
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def cell_text(self, row, column):
+        return getattr(self.rows[row], self.FIELDS[column])
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        if role in (Qt.ItemDataRole.DisplayRole, Qt.ItemDataRole.EditRole):
+            return self.cell_text(index.row(), index.column())
+        if role == Qt.ItemDataRole.ToolTipRole and index.column() == self.COL_NEW_NAME:
+            # Tooltip for full filename visibility
+            return self.rows[index.row()].new_name
+        if role == Qt.ItemDataRole.ToolTipRole and index.column() == self.COL_STATUS:
+            record = self.rows[index.row()]
+            if record.status == STATUS_DUPLICATE:
+                return f"与 {record.duplicate_of} 内容相同，保留较新的文件，此文件不重命名"
+        return None
+
+    def headerData(self, section, orientation, role=Qt.ItemDataRole.DisplayRole):
+        if role == Qt.ItemDataRole.DisplayRole and orientation == Qt.Orientation.Horizontal:
+            return self.HEADERS[section]
+        return None
+
+    def flags(self, index):
+        flags = super().flags(index)
+        if index.isValid() and index.column() == self.COL_ID:
+            flags |= Qt.ItemFlag.ItemIsEditable
+        return flags
+
+    def setData(self, index, value, role=Qt.ItemDataRole.EditRole):
+        if role != Qt.ItemDataRole.EditRole or index.column() != self.COL_ID:
+            return False
+        row = index.row()
+        self.rows[row].student_id = str(value)
+        self.student_id_edited.emit(row)
+        self.rows_changed(row, row, self.COL_ID, self.COL_NEW_NAME)
+        return True
+
+class PreviewWorker(QThread):
+    """
+    Scans (if there is no snapshot yet) and parses in the background, streaming
+    preview rows to the GUI in batches. With parser=None it only scans.
+    """
+    scanned = pyqtSignal(object, object) # DirectorySnapshot, its TokenIndex
+    batch_ready = pyqtSignal(list) # FileRecords
+    finished = pyqtSignal(int) # row count
+    
+    def __init__(self, root_dir, snapshot, parser, fmt_str, parse_cache, previous=None, scan_filter=None,
+                 archives=False):
+        super().__init__()
+        self.root_dir = root_dir
+        self.snapshot = snapshot
+        self.scan_filter = scan_filter
+        self.archives = archives
+        self.parser = parser
+        self.fmt_str = fmt_str
+        self.parse_cache = parse_cache
+        self.previous = previous # Cancelled worker that may still be using parse_cache
+        self.is_running = True
+
+    def cancel(self):
+        self.is_running = False
+
+    def run(self):
+        if self.previous is not None:
+            self.previous.wait()
+            self.previous = None
+        
+        if self.snapshot is None:
+            self.snapshot = DirectorySnapshot(self.root_dir, scan_filter=self.scan_filter, archives=self.archives)
+            if not self.is_running:
+                return
+            from core.detect import TokenIndex
+            token_index = TokenIndex(self.snapshot)
+            if not self.is_running:
+                return
+            self.scanned.emit(self.snapshot, token_index)
+        if self.parser is None:
+            return
+        
+        files = self.snapshot.entries # Already split: nothing is re-stat'ed or re-split below
+        count = 0
+        # A process pool gets every file in one extract_many call, as starting a
+        # pool per chunk costs more than it saves. In-process parsing goes chunk
+        # by chunk so that a cancelled preview stops early. Either way rows are
+        # handed over in small batches so the table fills progressively.
+        if parallel_workers(len(files)) > 1:
+            chunk_size = len(files)
+        else:
+            chunk_size = PREVIEW_PARSE_CHUNK
+        for start in range(0, len(files), chunk_size):
+            if not self.is_running:
+                return
+            chunk = files[start:start + chunk_size]
+            metas = self.parse_cache.extract_many(self.parser, chunk)
+            
+            with METRICS.stage("names"):
+                new_names = [self.parser.generate_new_name(meta, self.fmt_str) for meta in metas]
+            
+            rows = []
+            for entry, meta, new_name in zip(chunk, metas, new_names):
+                rows.append(FileRecord.from_meta(meta, new_name, entry.directory))
+                if len(rows) >= PREVIEW_BATCH_SIZE:
+                    self.batch_ready.emit(rows)
+                    rows = []
+            if rows:
+                self.batch_ready.emit(rows)
+            count += len(chunk)
+        
+        # One summary of the excluded tokens and re-extractions for the whole preview
+        self.parser.log_report()
+        if self.is_running:
+            self.finished.emit(count)
+
 class MainWindow(QMainWindow):
     def __init__(self):
         super().__init__()
@@ -48,13 +301,52 @@ class MainWindow(QMainWindow):
         self.resize(1300, 850)
         
         # Data
-        self.files_data = []
+        self.files_data = RecordStore() # Rows of the current preview
         self.root_dir = ""
-        self.rename_history = [] # Store rename operations for undo
-        
-        # Setup UI
+        self.snapshot = None # DirectorySnapshot of root_dir, shared by detectors and preview
+        self.token_index = None # TokenIndex of snapshot, kept in sync with its deltas
+        self.roster = None # Loaded class roster (IDs and names), if any
+        self.scan_filter = None # ScanFilter from the include/exclude/depth inputs, None if they keep everything
+        self.scan_archives = False # List the files inside .zip archives instead of the archives
+        self.parse_cache = ParseCache() # Parse results survive separator/format/ignore-word changes
+        self.preview_worker = None
+        self.duplicates = None # ((snapshot, folder_version), {duplicate path: kept path}) from DuplicateWorker
+        self.duplicate_worker = None
+        self.folder_version = 0 # Bumped on every snapshot delta
+        self.preview_inputs = None # (parser settings, excluded tokens, snapshot) behind files_data, once complete
+        self.pending_inputs = None # The same for the preview still running
+        self.after_scan = None # Called once a background scan delivers the snapshot
+        self.journal = None # RenameJournal of the batches on disk, for undo across restarts (opened in finish_startup)
+        self.undo_worker = None
+        self.journal_worker = None
+        self.journal_stale = False # Changed while journal_worker was reading it
+        self.undoable_batches = [] # From the last journal read, newest first
+        self.crash_checked = False # Interrupted batches are offered once, after the first read
+        self.startup_done = False # Set once finish_startup has run after the first paint
+        self.metrics_since = None # (METRICS report, time) when the current folder/preview action started
+        METRICS.enabled = True # Stage timings for the status bar
+        
+        # Setup UI. Only what the first frame needs happens here; the stylesheet
+        # and the journal are handled in finish_startup.
         self.setup_ui()
+        self.apply_dark_palette()
+        self.setup_folder_watch()
+
+    def paintEvent(self, event):
+        super().paintEvent(event)
+        if not self.startup_done:
+            self.startup_done = True
+            # Queued, so the first frame reaches the screen before the deferred work runs
+            QTimer.singleShot(0, self.finish_startup)
+
+    def finish_startup(self):
+        """Work deferred until the window has been painted once"""
         self.apply_modern_theme()
+        from core.journal import RenameJournal
+        self.journal = RenameJournal()
+        # Reads the journal in the background, then offers to roll back
+        # batches a crash left half-done
+        self.update_undo_button()
 
     def setup_ui(self):
         central_widget = QWidget()
@@ -86,6 +378,41 @@ class MainWindow(QMainWindow):
         id_group.addWidget(self.id_len_input)
         sidebar_layout.addLayout(id_group)
 
+        # File Filters (applied while walking the folder)
+        filter_group = QVBoxLayout()
+        filter_group.setSpacing(5)
+        filter_group.addWidget(QLabel("文件筛选（可选）："))
+        self.include_input = QLineEdit()
+        self.include_input.setPlaceholderText("只包含：例如 *.pdf .docx")
+        self.include_input.setToolTip(FILTER_TOOLTIP)
+        self.exclude_input = QLineEdit()
+        self.exclude_input.setPlaceholderText("排除：例如 __MACOSX build .zip")
+        self.exclude_input.setToolTip(FILTER_TOOLTIP)
+        depth_layout = QHBoxLayout()
+        depth_layout.addWidget(QLabel("子文件夹层数："))
+        self.depth_spin = QSpinBox()
+        self.depth_spin.setRange(-1, 99)
+        self.depth_spin.setValue(-1)
+        self.depth_spin.setSpecialValueText("不限") # Shown for -1
+        self.depth_spin.setToolTip("0：只扫描所选文件夹中的文件")
+        depth_layout.addWidget(self.depth_spin)
+        # Debounced like the ignored words: every change means a new scan
+        self.filter_timer = QTimer(self)
+        self.filter_timer.setSingleShot(True)
+        self.filter_timer.setInterval(400)
+        self.filter_timer.timeout.connect(self.apply_scan_filter)
+        self.include_input.textEdited.connect(self.filter_timer.start)
+        self.exclude_input.textEdited.connect(self.filter_timer.start)
+        self.depth_spin.valueChanged.connect(lambda _: self.filter_timer.start()) # Not start(msec)
+        self.archives_check = QCheckBox("包含压缩包（.zip）内的文件")
+        self.archives_check.setToolTip("直接重命名压缩包内的文件：只改写压缩包中的文件名，不解压也不重新压缩。压缩包内的重命名也可以撤回")
+        self.archives_check.toggled.connect(self.apply_scan_filter)
+        filter_group.addWidget(self.include_input)
+        filter_group.addWidget(self.exclude_input)
+        filter_group.addLayout(depth_layout)
+        filter_group.addWidget(self.archives_check)
+        sidebar_layout.addLayout(filter_group)
+
         # Standard Project Name
         proj_group = QVBoxLayout()
         proj_group.setSpacing(5)
@@ -105,7 +432,14 @@ class MainWindow(QMainWindow):
         self.ignore_input = QLineEdit()
         self.ignore_input.setPlaceholderText("例如：副本 样本 练习")
         self.ignore_input.setToolTip("在检测项目名和学生姓名时忽略这些词")
-        # DO NOT auto-trigger on text change - this causes infinite loops and clears user input!
+        # Only react to user typing (textEdited, not textChanged): programmatic setText
+        # calls already trigger their own preview. Debounced, and a newer keystroke
+        # cancels a preview that is still running.
+        self.ignore_timer = QTimer(self)
+        self.ignore_timer.setSingleShot(True)
+        self.ignore_timer.setInterval(400)
+        self.ignore_timer.timeout.connect(self.run_preview)
+        self.ignore_input.textEdited.connect(self.ignore_timer.start)
         ignore_group.addWidget(self.ignore_input)
         
         # Recommended Ignored Words
@@ -157,6 +491,21 @@ class MainWindow(QMainWindow):
         self.sep_combo.addItem("无", "")
         self.sep_combo.currentIndexChanged.connect(self.update_pattern_labels) # Update labels then preview
         sep_group.addWidget(self.sep_combo)
+        
+        # Name Conflicts (duplicate new names in the batch or on disk)
+        conflict_layout = QHBoxLayout()
+        conflict_layout.addWidget(QLabel("重名处理："))
+        self.conflict_combo = QComboBox()
+        self.conflict_combo.addItem("自动编号 (2)", "counter") # core.planner.CONFLICT_COUNTER
+        self.conflict_combo.addItem("跳过", "skip") # core.planner.CONFLICT_SKIP
+        conflict_layout.addWidget(self.conflict_combo)
+        sep_group.addLayout(conflict_layout)
+        
+        # Duplicate Submissions (same content under another name)
+        self.duplicates_check = QCheckBox("跳过重复文件（保留最新）")
+        self.duplicates_check.setToolTip(DUPLICATES_TOOLTIP)
+        self.duplicates_check.toggled.connect(self.update_duplicates)
+        sep_group.addWidget(self.duplicates_check)
         sidebar_layout.addLayout(sep_group)
 
         # Format Selection (Tiled Radio Buttons)
@@ -170,10 +519,10 @@ class MainWindow(QMainWindow):
         # Templates for display and logic
         # We use a custom placeholder {sep} for display updates
         formats = [
-            ("ID {sep} Name {sep} Project", "{student_id}{sep}{name}{sep}{project}"),
-            ("Name {sep} ID {sep} Project", "{name}{sep}{student_id}{sep}{project}"),
-            ("Project {sep} ID {sep} Name", "{project}{sep}{student_id}{sep}{name}"),
-            ("Original {sep} ID", "{original_name}{sep}{student_id}")
+            ("ID {sep} Name {sep} Project", NAMING_PATTERNS["id-name-project"]),
+            ("Name {sep} ID {sep} Project", NAMING_PATTERNS["name-id-project"]),
+            ("Project {sep} ID {sep} Name", NAMING_PATTERNS["project-id-name"]),
+            ("Original {sep} ID", NAMING_PATTERNS["original-id"])
         ]
         
         for i, (label_tmpl, fmt) in enumerate(formats):
@@ -206,39 +555,65 @@ class MainWindow(QMainWindow):
         self.path_label = QLabel("未选择文件夹")
         self.path_label.setStyleSheet("color: #888888; font-style: italic;")
         
+        self.roster_btn = QPushButton("导入花名册")
+        self.roster_btn.setCursor(Qt.CursorShape.PointingHandCursor)
+        self.roster_btn.setToolTip(ROSTER_TOOLTIP)
+        self.roster_btn.clicked.connect(self.load_roster)
+        self.roster_btn.setFixedWidth(120)
+        
+        self.clear_roster_btn = QPushButton("清除")
+        self.clear_roster_btn.setCursor(Qt.CursorShape.PointingHandCursor)
+        self.clear_roster_btn.clicked.connect(self.clear_roster)
+        self.clear_roster_btn.setFixedWidth(60)
+        self.clear_roster_btn.hide()
+        
         top_bar.addWidget(self.load_btn)
         top_bar.addWidget(self.path_label)
         top_bar.addStretch()
+        top_bar.addWidget(self.roster_btn)
+        top_bar.addWidget(self.clear_roster_btn)
         content_layout.addLayout(top_bar)
 
-        # Tree Widget (Table)
-        self.tree = QTreeWidget()
-        self.tree.setHeaderLabels(["原始文件名", "学号（可编辑）", "姓名", "项目名", "新文件名", "状态"])
+        # Preview Table (model/view: only visible rows are rendered)
+        self.preview_model = PreviewModel(self)
+        self.preview_model.student_id_edited.connect(self.on_student_id_edited) # Handle edits
+        self.table = QTableView()
+        self.table.setModel(self.preview_model)
         
         # Column Widths
-        header = self.tree.header()
+        header = self.table.horizontalHeader()
         header.setSectionResizeMode(QHeaderView.ResizeMode.Interactive)
         header.setSectionResizeMode(0, QHeaderView.ResizeMode.Interactive) 
         header.setSectionResizeMode(4, QHeaderView.ResizeMode.Interactive) # Allow manual resize for full view
-        
-        self.tree.setColumnWidth(0, 200)
-        self.tree.setColumnWidth(1, 120)
-        self.tree.setColumnWidth(2, 100)
-        self.tree.setColumnWidth(3, 120)
-        self.tree.setColumnWidth(4, 300) # Give more space to New Filename
-        self.tree.setColumnWidth(5, 60)
-        
-        self.tree.setAlternatingRowColors(True)
-        self.tree.itemChanged.connect(self.on_item_changed) # Handle edits
-        self.tree.itemDoubleClicked.connect(self.on_item_double_clicked) # Handle double-click
-        content_layout.addWidget(self.tree)
+        header.setStretchLastSection(True)
+        
+        self.table.setColumnWidth(0, 200)
+        self.table.setColumnWidth(1, 120)
+        self.table.setColumnWidth(2, 100)
+        self.table.setColumnWidth(3, 120)
+        self.table.setColumnWidth(4, 300) # Give more space to New Filename
+        self.table.setColumnWidth(5, 60)
+        
+        # Fixed row height: the view never measures rows it doesn't show
+        rows_header = self.table.verticalHeader()
+        rows_header.setVisible(False)
+        rows_header.setSectionResizeMode(QHeaderView.ResizeMode.Fixed)
+        rows_header.setDefaultSectionSize(28)
+        
+        self.table.setShowGrid(False)
+        self.table.setWordWrap(False)
+        self.table.setAlternatingRowColors(True)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
+        self.table.setEditTriggers(QAbstractItemView.EditTrigger.DoubleClicked | QAbstractItemView.EditTrigger.EditKeyPressed)
+        self.table.doubleClicked.connect(self.on_item_double_clicked) # Handle double-click
+        content_layout.addWidget(self.table)
 
         # Bottom Bar
         bottom_bar = QHBoxLayout()
         
         self.preview_btn = QPushButton("刷新预览")
         self.preview_btn.setCursor(Qt.CursorShape.PointingHandCursor)
-        self.preview_btn.clicked.connect(self.run_preview)
+        self.preview_btn.clicked.connect(self.refresh_preview)
         self.preview_btn.setEnabled(False)
         
         self.progress_bar = QProgressBar()
@@ -282,8 +657,9 @@ class MainWindow(QMainWindow):
         main_layout.addWidget(sidebar)
         main_layout.addWidget(content)
 
-    def apply_modern_theme(self):
-        # Dark Theme Palette
+    def apply_dark_palette(self):
+        # Dark Theme Palette. Cheap, so the first frame is already dark; the
+        # stylesheet on top of it is applied by apply_modern_theme after the first paint
         dark_palette = QPalette()
         dark_palette.setColor(QPalette.ColorRole.Window, QColor(40, 44, 52))
         dark_palette.setColor(QPalette.ColorRole.WindowText, Qt.GlobalColor.white)
@@ -300,6 +676,7 @@ class MainWindow(QMainWindow):
         dark_palette.setColor(QPalette.ColorRole.HighlightedText, Qt.GlobalColor.black)
         QApplication.setPalette(dark_palette)
 
+    def apply_modern_theme(self):
         # Stylesheet
         self.setStyleSheet("""
             QMainWindow {
@@ -377,7 +754,7 @@ class MainWindow(QMainWindow):
                 background-color: #3b4048;
                 color: #5c6370;
             }
-            QTreeWidget {
+            QTableView {
                 background-color: #21252b;
                 border: 1px solid #181a1f;
                 border-radius: 4px;
@@ -392,6 +769,11 @@ class MainWindow(QMainWindow):
                 border-right: 1px solid #181a1f;
                 font-weight: bold;
             }
+            QStatusBar {
+                background-color: #21252b;
+                color: #7f848e;
+                font-size: 12px;
+            }
             QProgressBar {
                 border: 1px solid #181a1f;
                 border-radius: 4px;
@@ -404,6 +786,74 @@ class MainWindow(QMainWindow):
             }
         """)
 
+    def setup_folder_watch(self):
+        # QFileSystemWatcher uses inotify / FSEvents / ReadDirectoryChangesW;
+        # if it can't watch a directory we fall back to polling directory mtimes
+        self.fs_watcher = QFileSystemWatcher(self)
+        self.fs_watcher.directoryChanged.connect(self.on_directory_changed)
+        self.changed_dirs = set()
+        
+        # Coalesce bursts of events (e.g. copying many files in) into one refresh
+        self.rescan_timer = QTimer(self)
+        self.rescan_timer.setSingleShot(True)
+        self.rescan_timer.setInterval(300)
+        self.rescan_timer.timeout.connect(self.apply_folder_changes)
+        
+        self.poll_timer = QTimer(self)
+        self.poll_timer.setInterval(3000)
+        self.poll_timer.timeout.connect(self.poll_folder)
+
+    def watch_snapshot(self):
+        """Watch every directory of the current snapshot"""
+        watched = self.fs_watcher.directories()
+        if watched:
+            self.fs_watcher.removePaths(watched)
+        self.watch_directories(self.snapshot.directories)
+
+    def watch_directories(self, dirs):
+        failed = self.fs_watcher.addPaths(dirs) if dirs else []
+        if failed:
+            logger.warning("Cannot watch %d directories, polling instead", len(failed))
+            self.poll_timer.start()
+        elif not self.fs_watcher.directories():
+            self.poll_timer.stop()
+
+    def is_renaming(self):
+        worker = getattr(self, 'worker', None)
+        return (worker is not None and worker.isRunning()) or self.undo_worker is not None
+
+    def on_directory_changed(self, path):
+        self.changed_dirs.add(path)
+        self.rescan_timer.start()
+
+    def apply_folder_changes(self):
+        dirs, self.changed_dirs = self.changed_dirs, set()
+        if self.snapshot is None or self.is_renaming():
+            return
+        self.on_snapshot_changed(self.snapshot.refresh(dirs))
+
+    def poll_folder(self):
+        if self.snapshot is None or self.is_renaming():
+            return
+        self.on_snapshot_changed(self.snapshot.refresh())
+
+    def on_snapshot_changed(self, delta):
+        if not delta:
+            return
+        logger.info("Folder changed: %d added, %d removed", len(delta.added), len(delta.removed))
+        self.preview_inputs = None # The rows no longer match the folder
+        self.folder_version += 1
+        if self.token_index is not None and self.token_index.snapshot is self.snapshot:
+            self.token_index.apply_delta(delta)
+        
+        # Newly created subdirectories need watching too
+        new_dirs = set(self.snapshot.directories) - set(self.fs_watcher.directories())
+        if new_dirs:
+            self.watch_directories(list(new_dirs))
+        
+        if self.proj_name_input.text().strip():
+            self.run_preview()
+
     def check_runnable(self):
         has_proj = bool(self.proj_name_input.text().strip())
         self.preview_btn.setEnabled(has_proj)
@@ -413,152 +863,143 @@ class MainWindow(QMainWindow):
         if folder:
             self.root_dir = folder
             self.path_label.setText(folder)
-            self.detect_id_length()
-            self.detect_common_tokens()
-            # If we auto-filled project name, trigger preview
-            if self.proj_name_input.text().strip():
-                self.run_preview()
+            self.snapshot = None
+            self.start_metrics()
+            self.start_scan(self.on_folder_scanned)
+
+    def apply_scan_filter(self):
+        """Walks the folder again if the include/exclude/depth/archive inputs changed"""
+        depth = self.depth_spin.value()
+        scan_filter = build_scan_filter(self.include_input.text(), self.exclude_input.text(),
+                                        depth if depth >= 0 else None) or None
+        archives = self.archives_check.isChecked()
+        if scan_filter == self.scan_filter and archives == self.scan_archives:
+            return
+        self.scan_filter = scan_filter
+        self.scan_archives = archives
+        logger.info("Scan filter: %s, archives: %s", scan_filter, archives)
+        if not self.root_dir or self.is_renaming():
+            return
+        self.snapshot = None
+        self.start_metrics()
+        self.start_scan(self.on_folder_scanned)
+
+    def load_roster(self):
+        path, _ = QFileDialog.getOpenFileName(self, "选择花名册", "", "CSV 文件 (*.csv);;所有文件 (*)")
+        if not path:
+            return
+        from core.roster import Roster
+        try:
+            roster = Roster.load(path)
+        except (OSError, ValueError) as e:
+            QMessageBox.warning(self, "错误", f"无法读取花名册：{e}")
+            return
+        self.roster = roster
+        self.roster_btn.setText(f"花名册：{len(roster)} 人")
+        self.roster_btn.setToolTip(path)
+        self.clear_roster_btn.show()
+        logger.info("Roster %s: %d students", path, len(roster))
+        self.run_preview()
+
+    def clear_roster(self):
+        self.roster = None
+        self.roster_btn.setText("导入花名册")
+        self.roster_btn.setToolTip(ROSTER_TOOLTIP)
+        self.clear_roster_btn.hide()
+        self.run_preview()
+
+    def on_folder_scanned(self):
+        self.detect_id_length()
+        self.detect_common_tokens()
+        # If we auto-filled project name, trigger preview
+        if self.proj_name_input.text().strip():
+            self.run_preview()
+
+    def start_preview_worker(self, parser=None, fmt_str=None):
+        """Start a PreviewWorker, abandoning any preview still running"""
+        previous = self.preview_worker
+        if previous is not None and previous.isRunning():
+            previous.cancel()
+        else:
+            previous = None
+        
+        worker = PreviewWorker(self.root_dir, self.snapshot, parser, fmt_str, self.parse_cache, previous,
+                               self.scan_filter, self.scan_archives)
+        worker.scanned.connect(self.on_preview_scanned)
+        worker.batch_ready.connect(self.on_preview_batch)
+        worker.finished.connect(self.on_preview_finished)
+        self.preview_worker = worker
+        worker.start()
+
+    def start_scan(self, then):
+        """Walk root_dir in the background, then call then()"""
+        self.after_scan = then
+        self.path_label.setText(f"{self.root_dir}（扫描中...）")
+        self.start_preview_worker()
+
+    def on_preview_scanned(self, snapshot, token_index):
+        if self.sender() is not self.preview_worker:
+            return # Stale worker
+        self.path_label.setText(self.root_dir)
+        self.snapshot = snapshot
+        self.token_index = token_index
+        self.watch_snapshot()
+        then, self.after_scan = self.after_scan, None
+        if then:
+            then()
+
+    def get_snapshot(self):
+        """Return the snapshot of root_dir, walking the folder only if there is none yet"""
+        if (self.snapshot is None or self.snapshot.root_path != self.root_dir
+                or self.snapshot.scan_filter != self.scan_filter or self.snapshot.archives != self.scan_archives):
+            self.snapshot = DirectorySnapshot(self.root_dir, scan_filter=self.scan_filter, archives=self.scan_archives)
+            self.watch_snapshot()
+        return self.snapshot
+
+    def get_token_index(self):
+        """Return the TokenIndex of the current snapshot, building it only if there is none yet"""
+        snapshot = self.get_snapshot()
+        if self.token_index is None or self.token_index.snapshot is not snapshot:
+            from core.detect import TokenIndex
+            self.token_index = TokenIndex(snapshot)
+        return self.token_index
+
+    def refresh_preview(self):
+        """Pick up added/renamed files (re-listing only changed directories), then preview"""
+        if self.snapshot is not None:
+            self.on_snapshot_changed(self.snapshot.refresh())
+        self.run_preview()
 
     def detect_id_length(self):
-        import re
-        from collections import Counter
-        files = list(scan_directory(self.root_dir))
-        lengths = []
-        for fpath in files[:50]:
-            name = os.path.basename(fpath)
-            matches = re.findall(r'\d+', name)
-            for m in matches:
-                l = len(m)
-                if 4 <= l <= 15: lengths.append(l)
-        if lengths:
-            common = Counter(lengths).most_common(1)[0][0]
-            self.id_len_input.setText(f"{common}")
+        estimate = self.get_token_index().id_length()
+        self.id_len_input.setText(estimate.text)
+        if estimate.candidates:
+            self.id_len_input.setToolTip(
+                f"检测置信度 {estimate.confidence:.0%}（{estimate.candidates}/{estimate.file_count} 个文件含数字串）")
         else:
-            self.id_len_input.setText("8-12")
+            self.id_len_input.setToolTip("未找到数字串，使用默认范围")
 
     def detect_common_tokens(self):
         """
         扫描文件名，自动填充 Project Name 和生成推荐忽略词
-        
-        逻辑：
-        1. 从原始文件名（去除扩展名）中提取所有词组
-        2. 排除用户手动输入的 Ignored Words
-        3. 统计词频
-        4. 最常见的词 -> 自动填充到 Standard Project Name
-        5. 第2-15名的中文词（≤5字） -> 生成4个推荐按钮
+        出现在 >80% 文件中的词保存为 common_tokens，供 parser 使用
         """
-        import re
-        from collections import Counter
-        
         if not self.root_dir:
             return
         
-        files = list(scan_directory(self.root_dir))
-        if not files:
+        snapshot = self.get_snapshot()
+        if not len(snapshot):
             return
         
-        print(f"[INFO] Scanning {len(files)} files...")
-        
-        # ============ 步骤1: 获取用户手动输入的 Ignored Words ============
-        ignored_text = self.ignore_input.text().strip()
-        ignored_text = ignored_text.replace(',', ' ')  # 支持逗号分隔
-        ignored_words = [w.strip() for w in ignored_text.split() if w.strip()]
-        
-        # 分类：中文词（精确匹配）和英文词（不区分大小写）
-        ignored_chinese = [w for w in ignored_words if re.match(r'[\u4e00-\u9fa5]+', w)]
-        ignored_english = [w.lower() for w in ignored_words if re.match(r'[a-zA-Z]+', w)]
-        
-        print(f"[IGNORED] Chinese: {ignored_chinese}, English: {ignored_english}")
-        
-        # ============ 步骤2: 从所有文件名中提取词组 ============
-        token_counts = Counter()
-        token_original_case = {}  # 保存原始大小写
-        
-        for fpath in files:
-            filename = os.path.basename(fpath)
-            name_no_ext, _ = os.path.splitext(filename)  # 去除扩展名
-            
-            # 提取词组：中文词组 或 英文单词
-            tokens = re.findall(r'[\u4e00-\u9fa5]+|[a-zA-Z]+', name_no_ext)
-            
-            for token in tokens:
-                # 过滤长度
-                if re.match(r'[\u4e00-\u9fa5]+', token):
-                    # 中文：≥2字符
-                    if len(token) < 2:
-                        continue
-                else:
-                    # 英文：>2字符
-                    if len(token) <= 2:
-                        continue
-                
-                # ============ 步骤3: 检查是否在 Ignored Words 中 ============
-                is_ignored = False
-                
-                if re.match(r'[\u4e00-\u9fa5]+', token):
-                    # 中文：精确匹配
-                    if token in ignored_chinese:
-                        is_ignored = True
-                else:
-                    # 英文：不区分大小写
-                    if token.lower() in ignored_english:
-                        is_ignored = True
-                
-                if is_ignored:
-                    continue
-                
-                # ============ 步骤4: 统计词频 ============
-                token_lower = token.lower()
-                token_counts[token_lower] += 1
-                
-                # 保存原始大小写（第一次出现的）
-                if token_lower not in token_original_case:
-                    token_original_case[token_lower] = token
-        
-        if not token_counts:
-            print("[WARNING] No tokens found after filtering!")
+        # Ignored words are subtracted from the snapshot's token index, no rescan
+        stats = self.get_token_index().stats(parse_ignored_words(self.ignore_input.text()))
+        if stats is None:
             self.update_recommended_words([])
             return
         
-        # ============ 步骤5: 自动填充 Standard Project Name ============
-        most_common_lower, count = token_counts.most_common(1)[0]
-        most_common = token_original_case[most_common_lower]
-        
-        self.proj_name_input.setText(most_common)
-        print(f"[AUTO-FILL] Project Name: '{most_common}' ({count}/{len(files)} files)")
-        
-        # ============ 步骤6: 生成推荐忽略词（4个中文词，≤5字） ============
-        top_tokens = token_counts.most_common(20)  # 取前20名
-        recommended = []
-        
-        for token_lower, count in top_tokens[1:]:  # 跳过第1名（已用作项目名）
-            token = token_original_case[token_lower]
-            
-            # 只要中文词
-            if not re.match(r'[\u4e00-\u9fa5]+', token):
-                continue
-            
-            # 长度限制：≤5字
-            if len(token) > 5:
-                continue
-            
-            recommended.append(token)
-            
-            if len(recommended) >= 4:
-                break
-        
-        print(f"[RECOMMENDED] Ignored Words: {recommended}")
-        self.update_recommended_words(recommended)
-        
-        # ============ 步骤7: 保存 common_tokens 供 parser 使用 ============
-        # 出现在 >80% 文件中的词，传给 parser 作为 excluded_tokens
-        total_files = len(files)
-        self.common_tokens = []
-        for token_lower, count in token_counts.items():
-            if count > total_files * 0.8:
-                self.common_tokens.append(token_lower)
-        
-        print(f"[COMMON] Tokens (>80%): {self.common_tokens}")
+        self.proj_name_input.setText(stats.project)
+        self.update_recommended_words(stats.recommended)
+        self.common_tokens = stats.common_tokens
         
         # Don't auto-trigger preview here - let the caller decide
         # This prevents infinite loops and preserves user's ignored words input
@@ -604,13 +1045,13 @@ class MainWindow(QMainWindow):
             existing_lower = [w.lower() for w in existing]
             if word.lower() not in existing_lower:
                 self.ignore_input.setText(current + ' ' + word)
-                print(f"[ADDED] Ignored word: '{word}'")
+                logger.info("Added ignored word: '%s'", word)
                 # Trigger preview to apply the new ignored word
                 if self.proj_name_input.text().strip():
                     self.run_preview()
         else:
             self.ignore_input.setText(word)
-            print(f"[ADDED] Ignored word: '{word}'")
+            logger.info("Added ignored word: '%s'", word)
             # Trigger preview to apply the new ignored word
             if self.proj_name_input.text().strip():
                 self.run_preview()
@@ -630,128 +1071,156 @@ class MainWindow(QMainWindow):
 
     def run_preview(self):
         if not self.root_dir: return
+        self.start_metrics()
+        
+        if self.snapshot is None:
+            # Nothing to preview until the folder has been walked
+            if self.after_scan is None:
+                self.start_scan(self.run_preview)
+            return
         
         # Check if user has manually entered ignored words
         # If so, re-scan to update Project Name with those words excluded
         ignored_text = self.ignore_input.text().strip()
         if ignored_text:
-            print(f"[PREVIEW] User has ignored words, re-scanning to update Project Name...")
+            logger.debug("User has ignored words, updating the project name")
             self.detect_common_tokens()
         
         proj_name = self.proj_name_input.text().strip()
         if not proj_name: return # Don't warn on every toggle, just return
             
-        self.tree.blockSignals(True) # Prevent itemChanged triggering during populate
-        self.tree.clear()
-        
         # Get settings
-        id_range = self.id_len_input.text().split('-')
-        try:
-            min_len = int(id_range[0])
-            max_len = int(id_range[1]) if len(id_range) > 1 else min_len
-        except:
-            min_len, max_len = 8, 12
-            
+        min_len, max_len = parse_id_range(self.id_len_input.text())
         class_name = self.class_name_input.text().strip()
-        class_pos = self.class_pos_combo.currentData()
         
         # Construct format string
-        sep = self.sep_combo.currentData()
-        base_fmt = self.fmt_group_btn.checkedButton().property("fmt")
-        
-        # Inject Class Name based on position
-        if class_pos != "none":
-            if class_pos == "start":
-                base_fmt = "{class_name}{sep}" + base_fmt
-            elif class_pos == "end":
-                base_fmt = base_fmt + "{sep}{class_name}"
-            elif class_pos == "after_id":
-                # Replace {student_id} with {student_id}{sep}{class_name}
-                base_fmt = base_fmt.replace("{student_id}", "{student_id}{sep}{class_name}")
-        
-        fmt_str = base_fmt.replace("{sep}", sep)
+        fmt_str = build_format(
+            self.fmt_group_btn.checkedButton().property("fmt"),
+            self.sep_combo.currentData(),
+            self.class_pos_combo.currentData()
+        )
         
         # Get user's manually entered Ignored Words
-        import re
-        ignored_text = self.ignore_input.text().strip()
-        ignored_text = ignored_text.replace(',', ' ')
-        ignored_words = [w.strip().lower() for w in ignored_text.split() if w.strip()]
+        ignored_words = [w.lower() for w in parse_ignored_words(self.ignore_input.text())]
         
-        print(f"[PREVIEW] User ignored words: {ignored_words}")
+        logger.debug("User ignored words: %s", ignored_words)
         
         # Combine with common tokens (>80% frequency)
         common_tokens = getattr(self, 'common_tokens', [])
-        all_excluded = list(set(ignored_words + common_tokens))
+        all_excluded = list(dict.fromkeys(ignored_words + common_tokens)) # Deduplicated, in a stable order
+        
+        logger.debug("All excluded tokens: %s", all_excluded)
         
-        print(f"[PREVIEW] All excluded tokens: {all_excluded}")
+        inputs = ((min_len, max_len, proj_name, class_name, self.roster), tuple(all_excluded), self.snapshot)
+        if inputs == self.preview_inputs:
+            # Only the format changed: re-name the rows already parsed
+            with METRICS.stage("names"):
+                self.files_data.rename_all(fmt_str)
+            self.preview_model.rows_changed(0, len(self.files_data) - 1, PreviewModel.COL_NEW_NAME, PreviewModel.COL_NEW_NAME)
+            self.show_metrics(len(self.files_data))
+            return
         
         parser = MetadataParser(
             id_min_len=min_len, 
             id_max_len=max_len, 
             standard_project_name=proj_name,
             standard_class_name=class_name,
-            excluded_tokens=all_excluded
+            excluded_tokens=all_excluded,
+            roster=self.roster
         )
         
-        self.files_data = []
-        files = list(scan_directory(self.root_dir))
+        # Parsing happens in the background; rows stream in through on_preview_batch.
+        # Only files that are new, renamed, or affected by a changed setting are parsed again.
+        self.files_data = RecordStore(fmt_str)
+        self.preview_model.set_rows(self.files_data)
+        self.rename_btn.setEnabled(False)
+        self.preview_inputs, self.pending_inputs = None, inputs
+        self.start_preview_worker(parser, fmt_str)
+
+    def on_preview_batch(self, rows):
+        if self.sender() is not self.preview_worker:
+            return # Rows from an abandoned preview
         
-        for fpath in files:
-            meta = parser.extract_metadata(fpath)
-            new_name = parser.generate_new_name(meta, fmt_str)
-            
-            # Calculate new path
-            dir_path = os.path.dirname(fpath)
-            new_path = os.path.join(dir_path, new_name)
-            
-            item_data = {
-                "filepath": fpath,
-                "old_path": fpath,  # For undo functionality
-                "new_path": new_path,  # For undo functionality
-                "meta": meta,
-                "new_name": new_name,
-                "status": "Ready",
-                "fmt_str": fmt_str # Store for re-generation
-            }
-            self.files_data.append(item_data)
-            
-            item = QTreeWidgetItem([
-                meta["original_name"],
-                meta["student_id"],
-                meta["name"],
-                meta["project"],
-                new_name,
-                "Ready"
-            ])
-            # Make ID editable
-            item.setFlags(item.flags() | Qt.ItemFlag.ItemIsEditable)
-            # Add tooltip for full filename visibility
-            item.setToolTip(4, new_name)
-            self.tree.addTopLevelItem(item)
-            
-        self.tree.blockSignals(False)
-        self.rename_btn.setEnabled(True)
+        with METRICS.stage("preview.table"):
+            self.preview_model.append_rows(rows) # Extends self.files_data
+
+    def on_preview_finished(self, count):
+        if self.sender() is not self.preview_worker:
+            return
+        logger.info("Preview: %d files, parse cache: %d hits, %d misses",
+                    count, self.parse_cache.hits, self.parse_cache.misses)
+        self.preview_inputs = self.pending_inputs
+        self.rename_btn.setEnabled(bool(self.files_data))
+        self.show_metrics(count)
+        if self.duplicates_check.isChecked():
+            self.update_duplicates()
+
+    def update_duplicates(self):
+        """Flags duplicate files in the preview, hashing in the background if the folder changed"""
+        if not self.duplicates_check.isChecked():
+            self.show_duplicates({})
+            return
+        if self.snapshot is None:
+            return # Flagged once the preview after the next scan finishes
+        if self.duplicates is not None and self.duplicates[0] == (self.snapshot, self.folder_version):
+            self.show_duplicates(self.duplicates[1])
+            return
+        if self.duplicate_worker is not None:
+            return # on_duplicates_found checks the folder again
+        self.duplicate_worker = DuplicateWorker(self.snapshot, self.folder_version)
+        self.duplicate_worker.finished.connect(self.on_duplicates_found)
+        self.duplicate_worker.start()
+
+    def on_duplicates_found(self, hashed, duplicates):
+        if self.sender() is not self.duplicate_worker:
+            return
+        self.duplicate_worker.wait()
+        self.duplicate_worker = None
+        self.duplicates = (hashed, duplicates)
+        self.update_duplicates() # Starts over if the folder changed meanwhile
+
+    def show_duplicates(self, duplicates):
+        flagged = self.files_data.mark_duplicates(duplicates)
+        self.preview_model.rows_changed(0, len(self.files_data) - 1, PreviewModel.COL_STATUS, PreviewModel.COL_STATUS)
+        if flagged:
+            logger.info("Preview: %d duplicate files will keep their names", flagged)
+
+    def start_metrics(self):
+        """Marks the start of a folder/preview action, unless one is already being measured"""
+        if self.metrics_since is None:
+            self.metrics_since = (METRICS.report(), time.perf_counter())
 
-    def on_item_changed(self, item, column):
-        # If user edits ID (col 1), regenerate new name
-        if column == 1:
-            index = self.tree.indexOfTopLevelItem(item)
-            if index >= 0 and index < len(self.files_data):
-                new_id = item.text(1)
-                item_data = self.files_data[index]
-                item_data["meta"]["student_id"] = new_id
-                
-                # Regenerate name
-                parser = MetadataParser() # Helper just for generation
-                new_name = parser.generate_new_name(item_data["meta"], item_data["fmt_str"])
-                
-                item_data["new_name"] = new_name
-                item.setText(4, new_name) # Update New Filename column
+    def show_metrics(self, count):
+        """Shows the stage timings since start_metrics in the status bar"""
+        if self.metrics_since is None:
+            return
+        since, started = self.metrics_since
+        self.metrics_since = None
+        report = METRICS.report(since)
+        stages = report["stages"]
+        parts = [f"{label} {stages[name]['seconds'] * 1000:.0f} ms"
+                 for name, label in STATUS_STAGES if name in stages]
+        counters = report["counters"]
+        hits, misses = counters.get("parse.cache_hits", 0), counters.get("parse.cache_misses", 0)
+        if hits + misses:
+            parts.append(f"缓存命中 {hits}/{hits + misses}")
+        elapsed = time.perf_counter() - started
+        self.statusBar().showMessage(f"预览 {count} 个文件，共 {elapsed:.2f} s：" + " · ".join(parts))
+        details = [f"{name}: {entry['seconds'] * 1000:.1f} ms ({entry['calls']}×)" for name, entry in stages.items()]
+        details += [f"{name}: {n}" for name, n in counters.items()]
+        self.statusBar().setToolTip("\n".join(details))
+
+    def on_student_id_edited(self, row):
+        # User edited the ID (col 1): regenerate new name (the model refreshes the row)
+        record = self.files_data[row]
+        
+        # Regenerate name
+        record.new_name = compile_template(self.files_data.fmt_str).render(record.meta())
     
-    def on_item_double_clicked(self, item, column):
-        """Handle double-click on tree items - add Name to Ignored Words if column 2"""
-        if column == 2:  # Name column
-            name = item.text(2).strip()
+    def on_item_double_clicked(self, index):
+        """Handle double-click on table cells - add Name to Ignored Words if column 2"""
+        if index.column() == PreviewModel.COL_NAME:
+            name = self.preview_model.cell_text(index.row(), index.column()).strip()
             if name and name != "NoID":
                 # Add to ignored words
                 current = self.ignore_input.text().strip()
@@ -761,13 +1230,13 @@ class MainWindow(QMainWindow):
                     existing_lower = [w.lower() for w in existing]
                     if name.lower() not in existing_lower:
                         self.ignore_input.setText(current + ' ' + name)
-                        print(f"[DOUBLE-CLICK] Added '{name}' to Ignored Words")
+                        logger.info("Added ignored word from the table: '%s'", name)
                         # Trigger preview to apply
                         if self.proj_name_input.text().strip():
                             self.run_preview()
                 else:
                     self.ignore_input.setText(name)
-                    print(f"[DOUBLE-CLICK] Added '{name}' to Ignored Words")
+                    logger.info("Added ignored word from the table: '%s'", name)
                     # Trigger preview to apply
                     if self.proj_name_input.text().strip():
                         self.run_preview()
@@ -775,93 +1244,92 @@ class MainWindow(QMainWindow):
     def run_rename(self):
         if not self.files_data: return
         self.rename_btn.setEnabled(False)
+        self.preview_inputs = None # Statuses and names change
         
-        # Save current rename operation to history
-        current_operation = []
-        for item_data in self.files_data:
-            current_operation.append({
-                'old_path': item_data['old_path'],
-                'new_path': item_data['new_path']
-            })
-        
-        self.worker = WorkerThread(self.files_data)
+        self.worker = WorkerThread(self.files_data, self.conflict_combo.currentData(),
+                                   journal=self.journal, description=self.root_dir)
         self.worker.progress.connect(self.progress_bar.setValue)
-        self.worker.finished.connect(lambda success_count: self.on_rename_finished(success_count, current_operation))
+        self.worker.finished.connect(self.on_rename_finished)
         self.worker.start()
 
-    def on_rename_finished(self, success_count, operation_history):
+    def on_rename_finished(self, success_count):
         self.rename_btn.setEnabled(True)
         self.progress_bar.setValue(100)
         
-        # Save to rename history for undo
-        if success_count > 0:
-            self.rename_history.append(operation_history)
-            self.undo_btn.setEnabled(True)
-            print(f"[RENAME] Saved {len(operation_history)} operations to history")
-        
-        self.tree.blockSignals(True)
-        self.tree.clear()
-        for item_data in self.files_data:
-            meta = item_data["meta"]
-            item = QTreeWidgetItem([
-                meta["original_name"],
-                meta["student_id"],
-                meta["name"],
-                meta["project"],
-                item_data["new_name"],
-                item_data["status"]
-            ])
-            self.tree.addTopLevelItem(item)
-        self.tree.blockSignals(False)
+        if any(r.status == STATUS_DONE and r.new_name != r.original_name for r in self.files_data):
+            self.snapshot = None # Paths on disk have changed
+        self.update_undo_button()
+        
+        # Only the new name (conflict suffixes) and status columns changed
+        self.preview_model.rows_changed(0, len(self.files_data) - 1, PreviewModel.COL_NEW_NAME, PreviewModel.COL_STATUS)
         QMessageBox.information(self, "完成", f"已重命名 {success_count}/{len(self.files_data)} 个文件。")
-    
+
+    def update_undo_button(self):
+        """Re-read the journal off the GUI thread; on_journal_read then updates the undo button"""
+        self.undo_btn.setEnabled(False) # undoable_batches is out of date until then
+        if self.journal_worker is not None:
+            self.journal_stale = True
+            return
+        self.journal_worker = JournalWorker(self.journal)
+        self.journal_worker.finished.connect(self.on_journal_read)
+        self.journal_worker.start()
+
+    def on_journal_read(self, undoable, incomplete):
+        self.journal_worker = None
+        if self.journal_stale:
+            self.journal_stale = False
+            self.update_undo_button()
+            return
+        self.undoable_batches = undoable
+        self.undo_btn.setEnabled(bool(undoable) and self.undo_worker is None)
+        if not self.crash_checked:
+            self.crash_checked = True
+            self.check_incomplete_batches(incomplete)
+
+    @staticmethod
+    def describe_batch(batch):
+        started = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(batch.started))
+        folder = os.path.basename(batch.description.rstrip("/\\")) or batch.description
+        return f"{started}  {folder}（{batch.file_count} 个文件）"
+
     def run_undo(self):
-        """Undo the last rename operation"""
-        if not self.rename_history:
+        """Undo a journaled rename batch (the latest one by default)"""
+        batches = self.undoable_batches
+        if not batches:
             QMessageBox.warning(self, "无历史记录", "没有可以撤回的重命名操作。")
             return
         
-        # Get the last operation
-        last_operation = self.rename_history.pop()
-        
-        # Ask for confirmation
-        reply = QMessageBox.question(
-            self,
-            "确认撤回",
-            f"是否撤回上一次的重命名操作（{len(last_operation)} 个文件）？",
-            QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No
-        )
-        
-        if reply != QMessageBox.StandardButton.Yes:
-            # Put it back if user cancels
-            self.rename_history.append(last_operation)
+        # Choosing a batch doubles as the confirmation
+        labels = [self.describe_batch(b) for b in batches]
+        label, ok = QInputDialog.getItem(self, "确认撤回", "选择要撤回的重命名操作：", labels, 0, False)
+        if not ok:
             return
-        
-        # Perform undo
-        success_count = 0
-        failed_files = []
-        
-        for op in last_operation:
-            try:
-                if os.path.exists(op['new_path']):
-                    os.rename(op['new_path'], op['old_path'])
-                    success_count += 1
-                    print(f"[UNDO] Restored: {os.path.basename(op['new_path'])} -> {os.path.basename(op['old_path'])}")
-                else:
-                    failed_files.append(os.path.basename(op['new_path']))
-            except Exception as e:
-                failed_files.append(f"{os.path.basename(op['new_path'])}: {str(e)}")
-        
-        # Update undo button state
-        if not self.rename_history:
-            self.undo_btn.setEnabled(False)
+        self.start_undo(batches[labels.index(label)])
+
+    def start_undo(self, batch):
+        # Replayed backwards from the journal, off the GUI thread
+        self.undo_btn.setEnabled(False)
+        self.rename_btn.setEnabled(False)
+        self.undo_worker = UndoWorker(self.journal, batch)
+        self.undo_worker.progress.connect(self.progress_bar.setValue)
+        self.undo_worker.finished.connect(self.on_undo_finished)
+        self.undo_worker.start()
+
+    def on_undo_finished(self, success_count, failed_paths):
+        self.undo_worker = None
+        self.progress_bar.setValue(100)
+        self.rename_btn.setEnabled(bool(self.files_data))
+        self.update_undo_button()
+        self.snapshot = None # Paths on disk have changed
+        logger.info("Undo: restored %d files, %d failed", success_count, len(failed_paths))
         
         # Show result
+        failed_files = [os.path.basename(path) for path in failed_paths]
         if failed_files:
             QMessageBox.warning(
                 self,
                 "撤回完成（有错误）",
-                f"已恢复 {success_count}/{len(last_operation)} 个文件。\n\n失败的文件：\n" + "\n".join(failed_files[:5])
+                f"已恢复 {success_count}/{success_count + len(failed_files)} 个文件。\n\n失败的文件：\n" + "\n".join(failed_files[:5])
             )
         else:
             QMessageBox.information(
@@ -872,9 +1340,30 @@ class MainWindow(QMainWindow):
         
         # Refresh the view
         if self.root_dir:
-            self.run_preview()
+            self.refresh_preview()
+
+    def check_incomplete_batches(self, batches):
+        """Offers to roll back rename batches that were interrupted by a crash (newest first)"""
+        if not batches:
+            return
+        batch = batches[0]
+        reply = QMessageBox.question(
+            self,
+            "恢复未完成的重命名",
+            f"上次的重命名操作没有完成：\n{self.describe_batch(batch)}\n\n是否撤回已经执行的部分？",
+            QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No
+        )
+        # Older interrupted batches are closed as they are; only the latest is offered
+        for other in batches[1:]:
+            self.journal.end_batch(other.id, complete=False)
+        if reply == QMessageBox.StandardButton.Yes:
+            self.start_undo(batch)
+        else:
+            self.journal.end_batch(batch.id, complete=False)
+            self.update_undo_button()
 
 def main():
+    setup_logging()
     app = QApplication(sys.argv)
     window = MainWindow()
     window.show()